@@ -18,18 +18,19 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView
-)
+from core.views import CachedSchemaView, DatabasePoolView, MetricsView
+
+from drf_spectacular.views import SpectacularSwaggerView
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    path('api/schema/', CachedSchemaView.as_view(), name='api-schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='api-schema'), name='api-docs'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    path('api/health/db-pool/', DatabasePoolView.as_view(), name='db-pool'),
+    path('api/health/metrics/', MetricsView.as_view(), name='metrics'),
 ]
 
 if settings.DEBUG:
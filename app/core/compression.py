@@ -0,0 +1,133 @@
+'''
+    gzip and brotli for API responses, gzip for the collected static files
+
+    core.middleware.CompressionMiddleware compresses responses on the fly,
+    with brotli if the brotli package is installed. CompressedStaticFilesStorage
+    writes .gz siblings of the static files at collectstatic, which nginx's
+    gzip_static sends as they are
+'''
+import gzip
+import os
+import re
+import zlib
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import StaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULTS = {
+    # smaller bodies gain less than the headers and CPU cost
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    # content type prefixes worth compressing, images are compressed already
+    'TYPES': (
+        'application/json', 'application/x-ndjson', 'application/vnd.oai.openapi',
+        'application/javascript', 'image/svg+xml', 'text/',
+    ),
+    # static files are compressed once, at the highest level
+    'STATIC_EXTENSIONS': (
+        '.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ttf', '.eot',
+    ),
+}
+
+_QUALITY = re.compile(r'q\s*=\s*([0-9.]+)')
+
+
+def compression_options():
+    return {**DEFAULTS, **getattr(settings, 'COMPRESSION', {})}
+
+
+def encodings():
+    ''' the encodings offered, preferred first '''
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding):
+    ''' the encoding of the highest q value the client accepts, or None '''
+    qualities = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.partition(';')
+        match = _QUALITY.search(params)
+        try:
+            qualities[coding.strip()] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            qualities[coding.strip()] = 0.0
+
+    best, best_quality = None, 0.0
+    for coding in encodings():
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compressible_type(content_type, options):
+    return content_type.lower().startswith(tuple(options['TYPES']))
+
+
+def compress(data, encoding, options):
+    if encoding == 'br':
+        return brotli.compress(data, quality=options['BROTLI_QUALITY'])
+    return gzip.compress(data, options['GZIP_LEVEL'], mtime=0)
+
+
+def compress_stream(parts, encoding, options):
+    ''' flushed after every part, so streamed content still arrives as produced '''
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=options['BROTLI_QUALITY'])
+        for part in parts:
+            data = compressor.process(part) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(options['GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for part in parts:
+        data = compressor.compress(part) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressedStaticFilesStorage(StaticFilesStorage):
+    '''
+        next to every collected file of STATIC_EXTENSIONS writes a .gz copy
+        for nginx's gzip_static. The stock nginx image has no brotli module,
+        so there are no .br copies. Copies that would not be smaller are
+        left out, up to date ones are kept
+    '''
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        config = compression_options()
+        for name in paths:
+            processed = False
+            if name.endswith(tuple(config['STATIC_EXTENSIONS'])):
+                processed = self._compress(self.path(name), config)
+            yield name, name, processed
+
+    def _compress(self, path, config):
+        ''' whether a copy was written '''
+        if os.path.getsize(path) < config['MIN_SIZE']:
+            return False
+        target = path + '.gz'
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            return False
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        compressed = gzip.compress(data, 9, mtime=0)
+        if len(compressed) < len(data):
+            with open(target, 'wb') as fp:
+                fp.write(compressed)
+            return True
+        if os.path.exists(target):
+            os.remove(target)
+        return False
@@ -0,0 +1,127 @@
+'''
+    the stock PostgreSQL backend plus
+
+    CONN_HEALTH_CHECKS: a connection kept open across requests (CONN_MAX_AGE)
+    is pinged before its first use in each request and replaced if the
+    server dropped it, instead of failing that request
+
+    POOL: with POOL['SIZE'] > 0, connections are checked out of a pool
+    shared by every thread of the process and returned to it when Django
+    closes them, at the end of each request
+'''
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import ConnectionPool
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _reset(connection):
+    # leave nothing of the last request behind: an open or failed
+    # transaction, or a connection the server closed
+    if connection.closed:
+        raise ValueError('connection closed')
+    if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+def _is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Exception:
+        return False
+    return True
+
+
+def pool_stats():
+    ''' stats of every pool of this process, by database alias '''
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {alias: pool.stats() for (alias, _), pool in pools}
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.pooled_from = None
+
+    @property
+    def health_checks(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def _pool(self, conn_params):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('SIZE'):
+            return None
+        # one pool per alias and connection parameters, the test runner
+        # points the same alias at another database
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(
+                    partial(super().get_new_connection, conn_params),
+                    max_size=options['SIZE'],
+                    timeout=options.get('TIMEOUT', 10),
+                    is_usable=_is_usable,
+                    reset=_reset,
+                    check_interval=options.get('CHECK_INTERVAL', 30),
+                )
+            return _pools[key]
+
+    @contextmanager
+    def _nodb_cursor(self):
+        # used to create and drop databases, which idle pooled connections
+        # to them would block
+        close_pools()
+        with super()._nodb_cursor() as cursor:
+            yield cursor
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        self.pooled_from = pool
+        return pool.acquire()
+
+    def _close(self):
+        pool, self.pooled_from = self.pooled_from, None
+        if pool is None:
+            return super()._close()
+        pool.release(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # runs when a request starts and ends, the connection kept for the
+        # next request gets checked before that request uses it
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        reused = self.connection is not None and not self.health_check_done
+        if reused and self.health_checks and not self.in_atomic_block:
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def connect(self):
+        # a brand new connection needs no ping, set before connecting as
+        # connect() itself goes through ensure_connection()
+        self.health_check_done = True
+        super().connect()
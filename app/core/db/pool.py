@@ -0,0 +1,141 @@
+'''
+    in-process pool of DB-API connections shared by the threads of one
+    worker process, for deployments without a pooler like PgBouncer in
+    front of Postgres
+'''
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    '''
+    raised when no connection became free within the pool timeout
+    '''
+
+
+class ConnectionPool:
+    '''
+        hands out at most `max_size` connections made by `connect`. Idle
+        connections are reused most recently released first, checked with
+        `is_usable` when they sat idle for `check_interval` seconds or more,
+        and `reset` before they go back to the pool. A connection that fails
+        either is discarded
+    '''
+
+    def __init__(self, connect, max_size, timeout=10, is_usable=None,
+                 reset=None, check_interval=30):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.is_usable = is_usable
+        self.reset = reset
+        self.check_interval = check_interval
+
+        self._idle = []
+        self._size = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+        self._counters = {
+            'acquired': 0,
+            'created': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_seconds': 0.0,
+            'peak_in_use': 0,
+        }
+
+    def acquire(self):
+        deadline = None
+        with self._condition:
+            while not self._idle and self._size >= self.max_size:
+                if deadline is None:
+                    deadline = time.monotonic() + self.timeout
+                    self._counters['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'no connection free within {self.timeout}s '
+                        f'({self.max_size} in use)'
+                    )
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            if deadline is not None:
+                waited = self.timeout - (deadline - time.monotonic())
+                self._counters['wait_seconds'] += max(waited, 0.0)
+
+            idle = self._idle.pop() if self._idle else None
+            if idle is None:
+                # reserve the slot, the connection is made outside the lock
+                self._size += 1
+            self._counters['acquired'] += 1
+            in_use = self._size - len(self._idle)
+            self._counters['peak_in_use'] = max(self._counters['peak_in_use'], in_use)
+
+        if idle is not None:
+            connection, released_at = idle
+            stale = time.monotonic() - released_at >= self.check_interval
+            if not stale or self.is_usable is None or self.is_usable(connection):
+                return connection
+            self._close(connection)
+            with self._condition:
+                self._counters['discarded'] += 1
+        return self._create()
+
+    def _create(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._counters['created'] += 1
+        return connection
+
+    def release(self, connection, discard=False):
+        if not discard and self.reset is not None:
+            try:
+                self.reset(connection)
+            except Exception:
+                discard = True
+        if discard:
+            self._close(connection)
+        with self._condition:
+            if discard:
+                self._size -= 1
+                self._counters['discarded'] += 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_idle(self):
+        ''' closes every idle connection, the ones in use are left alone '''
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._condition:
+            idle = len(self._idle)
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'waiting': self._waiting,
+                **self._counters,
+            }
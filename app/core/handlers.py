@@ -0,0 +1,61 @@
+'''
+    Django 3.2's ASGI handler with two fixes from later Django releases
+
+    every request runs its sync code (sync views, middleware, closing the
+    response) on a thread of its own instead of on the one thread shared
+    by the whole process (Django 4.0)
+
+    streaming responses are iterated on that thread too, rather than on the
+    event loop where their database queries are refused (Django 4.2)
+'''
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.handlers import asgi
+
+
+_END = object()
+
+
+class ASGIHandler(asgi.ASGIHandler):
+
+    async def __call__(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # head as sent by the stock handler
+        headers = [
+            (header.encode('ascii') if isinstance(header, str) else header,
+             value.encode('latin1') if isinstance(value, str) else value)
+            for header, value in response.items()
+        ]
+        headers += [
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        ]
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+
+        next_part = sync_to_async(next, thread_sensitive=True)
+        parts = iter(response)
+        while True:
+            part = await next_part(parts, _END)
+            if part is _END:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    ''' django.core.asgi.get_asgi_application() returning the handler above '''
+    import django
+
+    django.setup(set_prefix=False)
+    return ASGIHandler()
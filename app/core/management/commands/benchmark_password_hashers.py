@@ -0,0 +1,39 @@
+'''
+time a password check with every hasher of PASSWORD_HASHERS at the costs
+of PASSWORD_HASHING, to tune them to the CPUs of the deployment
+'''
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    '''
+    a login verifies one hash, so the best time of --repeat checks bounds
+    the logins a worker process serves per second. Hashers whose library
+    is not installed are reported and skipped
+    '''
+    help = 'time password checks with the configured hashers and costs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='timed checks per hasher')
+
+    def handle(self, *args, **options):
+        for position, hasher in enumerate(get_hashers()):
+            label = f'{hasher.algorithm}{" (preferred)" if position == 0 else ""}'
+            try:
+                encoded = hasher.encode('benchmark password', hasher.salt())
+            except ValueError as exc:
+                self.stdout.write(f'{label:<28}skipped, {exc}')
+                continue
+
+            times = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                hasher.verify('benchmark password', encoded)
+                times.append(time.perf_counter() - start)
+            best = min(times)
+            self.stdout.write(
+                f'{label:<28}{best * 1000:8.1f} ms  {1 / best:8.0f} checks/s per process'
+            )
@@ -0,0 +1,99 @@
+'''
+time the recipe list serialization through RecipeSerializer and through
+the values() rows of recipe.fast, on throwaway recipes
+'''
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.fast import fast_list_serializer
+from recipe.serializers import RecipeSerializer
+
+
+class Rollback(Exception):
+    '''
+    raised to throw away the seeded data
+    '''
+
+
+class Command(BaseCommand):
+    '''
+    seeds a user per --recipes count inside a transaction, serializes all of
+    their recipes both ways and prints the best time of --repeat runs, then
+    rolls everything back. The rendered JSON of the two paths is compared
+    '''
+    help = 'compare the serializer and values() recipe list paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--repeat', type=int, default=5, help='timed runs per path')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                for count in options['recipes']:
+                    self._compare(self._seed(count), count, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, count):
+        user = get_user_model().objects.create_user(f'list-bench-{count}@example.com')
+        Tag.objects.bulk_create(Tag(user=user, name=f'tag {i}') for i in range(20))
+        Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'ingredient {i}') for i in range(50)
+        )
+        Recipe.objects.bulk_create(
+            (Recipe(user=user, title=f'recipe {i}', time_minutes=i % 120,
+                    price=Decimal(i % 10000) / 100, link=f'https://example.com/{i}')
+             for i in range(count)),
+            batch_size=5000
+        )
+        ids = list(Recipe.objects.filter(user=user).values_list('id', flat=True))
+        tags = list(Tag.objects.filter(user=user).values_list('id', flat=True))
+        ingredients = list(Ingredient.objects.filter(user=user).values_list('id', flat=True))
+        Recipe.tags.through.objects.bulk_create(
+            (Recipe.tags.through(recipe_id=recipe_id, tag_id=tags[(recipe_id + i) % len(tags)])
+             for recipe_id in ids for i in range(3)),
+            batch_size=5000
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            (Recipe.ingredients.through(
+                recipe_id=recipe_id,
+                ingredient_id=ingredients[(recipe_id * 7 + i) % len(ingredients)])
+             for recipe_id in ids for i in range(5)),
+            batch_size=5000
+        )
+        return user
+
+    def _compare(self, user, count, repeat):
+        queryset = Recipe.objects.filter(user=user).order_by('-id')
+        fast = fast_list_serializer(RecipeSerializer)
+        paths = {
+            'serializer': lambda: RecipeSerializer(
+                RecipeSerializer.setup_eager_loading(queryset), many=True
+            ).data,
+            'values()': lambda: fast.serialize(fast.values(queryset)),
+        }
+
+        rendered, best = {}, {}
+        for name, serialize in paths.items():
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = serialize()
+                times.append(time.perf_counter() - start)
+            best[name] = min(times)
+            rendered[name] = JSONRenderer().render(data)
+
+        same = 'identical' if rendered['serializer'] == rendered['values()'] else 'DIFFERENT'
+        self.stdout.write(f'{count} recipes:')
+        for name, seconds in best.items():
+            self.stdout.write(f'  {name:<12}{seconds * 1000:10.1f} ms')
+        speedup = best['serializer'] / best['values()']
+        self.stdout.write(f'  speedup {speedup:.1f}x, JSON {same}')
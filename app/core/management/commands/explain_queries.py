@@ -0,0 +1,127 @@
+'''
+benchmark the per user recipe, tag and ingredient queries against the
+indexes they were built for and against the old single column user indexes
+'''
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+
+from core.models import Recipe, Tag, Ingredient
+
+
+def _named(items, name):
+    return next(item for item in items if item.name == name)
+
+
+class Rollback(Exception):
+    '''
+    raised to throw away the seeded data and schema changes
+    '''
+
+
+class Command(BaseCommand):
+    '''
+    seeds throwaway data inside a transaction, prints the plan and timing of
+    each hot query, swaps the composite indexes for the previous schema's
+    user_id indexes and prints them again, then rolls everything back
+    '''
+    help = 'compare query plans with and without the per user indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=2000,
+                            help='recipes per user')
+        parser.add_argument('--names', type=int, default=300,
+                            help='tags and ingredients per user')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='timed runs per query')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('query plans are only meaningful on PostgreSQL')
+
+        try:
+            with transaction.atomic():
+                user = self._seed(options['users'], options['recipes'], options['names'])
+                queries = self._queries(user, options['recipes'], options['names'])
+                self._report('composite indexes', queries, options['repeat'])
+                self._use_previous_indexes()
+                self._report('user_id indexes only', queries, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, users, recipes, names):
+        self.stdout.write(f'seeding {users} users x {recipes} recipes...')
+        user_model = get_user_model()
+        user_model.objects.bulk_create(
+            user_model(email=f'bench-{i}@example.com', password='!')
+            for i in range(users)
+        )
+        seeded = list(user_model.objects.filter(email__startswith='bench-'))
+
+        for user in seeded:
+            Recipe.objects.bulk_create(
+                (Recipe(user=user, title=f'recipe {i}', time_minutes=i % 120,
+                        price=Decimal('9.99')) for i in range(recipes)),
+                batch_size=5000
+            )
+            for model in (Tag, Ingredient):
+                model.objects.bulk_create(
+                    model(user=user, name=f'name {i:05}') for i in range(names)
+                )
+        with connection.cursor() as cursor:
+            # run the deferred foreign key checks now, tables with pending
+            # trigger events can't be altered later in the transaction
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        self._analyze()
+        return seeded[len(seeded) // 2]
+
+    def _queries(self, user, recipes, names):
+        recipe_ids = Recipe.objects.filter(user=user).order_by('-id')
+        deep_cursor = recipe_ids.values_list('id', flat=True)[max(recipes - 50, 0)]
+        lookup = [f'name {i:05}' for i in range(0, names, max(names // 10, 1))]
+        return [
+            ('recipe list, first page',
+             Recipe.objects.filter(user=user).order_by('-id')[:25]),
+            ('recipe list, deep cursor page',
+             Recipe.objects.filter(user=user, id__lt=deep_cursor).order_by('-id')[:25]),
+            ('tag list, first page',
+             Tag.objects.filter(user=user).order_by('-name')[:25]),
+            ('ingredient list, first page',
+             Ingredient.objects.filter(user=user).order_by('-name')[:25]),
+            ('tag get-or-create lookup',
+             Tag.objects.filter(user=user, name__in=lookup)),
+        ]
+
+    def _report(self, title, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {title} =='))
+        for label, queryset in queries:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - start) / repeat * 1000
+
+            self.stdout.write(self.style.SUCCESS(f'\n{label}: {elapsed:.2f} ms'))
+            self.stdout.write(queryset.explain(analyze=True, buffers=True))
+
+    def _use_previous_indexes(self):
+        with connection.schema_editor() as editor:
+            for index in ('recipe_user_id_desc_idx', 'recipe_user_updated_idx'):
+                editor.remove_index(Recipe, _named(Recipe._meta.indexes, index))
+            for model in (Tag, Ingredient):
+                constraint = f'unique_{model._meta.model_name}_name_per_user'
+                editor.remove_constraint(model, _named(model._meta.constraints, constraint))
+            for model in (Recipe, Tag, Ingredient):
+                editor.add_index(model, models.Index(
+                    fields=['user'], name=f'bench_{model._meta.model_name}_user'
+                ))
+        self._analyze()
+
+    def _analyze(self):
+        with connection.cursor() as cursor:
+            for model in (Recipe, Tag, Ingredient):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
@@ -0,0 +1,31 @@
+'''
+generate the resized copies of recipe images uploaded before variants
+existed, or of every image with --all
+'''
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from recipe.images import generate_variants
+
+
+class Command(BaseCommand):
+    '''
+    runs the variant generation of the upload worker inline for every
+    recipe image that has no variants yet
+    '''
+    help = 'generate missing resized copies of recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='regenerate variants that already exist')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+
+        done = 0
+        for recipe_id, image_name in recipes.values_list('id', 'image').iterator():
+            generate_variants(recipe_id, image_name)
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f'processed {done} images'))
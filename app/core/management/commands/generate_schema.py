@@ -0,0 +1,46 @@
+'''
+render the OpenAPI schema to the files the api/schema/ view serves, at
+deploy time next to collectstatic
+'''
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from drf_spectacular.drainage import GENERATOR_STATS
+from drf_spectacular.validation import validate_schema
+
+from core import schema
+
+
+class Command(BaseCommand):
+    '''
+    generates the schema as the live view would and writes it in every
+    format to --directory, API_SCHEMA_DIR by default
+    '''
+    help = 'generate the OpenAPI schema files served by api/schema/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', help='where to write, API_SCHEMA_DIR by default')
+        parser.add_argument('--validate', action='store_true',
+                            help='check the schema against the OpenAPI specification')
+        parser.add_argument('--fail-on-warn', action='store_true',
+                            help='fail when views or serializers could not be resolved')
+
+    def handle(self, *args, **options):
+        directory = options['directory'] or settings.API_SCHEMA_DIR
+        if not directory:
+            raise CommandError('no --directory and API_SCHEMA_DIR is not set')
+
+        start = time.perf_counter()
+        generated = schema.generate()
+        GENERATOR_STATS.emit_summary()
+        if options['fail_on_warn'] and GENERATOR_STATS:
+            raise CommandError('schema generation had warnings')
+        if options['validate']:
+            validate_schema(generated)
+
+        paths = schema.write(generated, directory)
+        seconds = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'wrote {", ".join(paths)} in {seconds * 1000:.0f} ms'
+        ))
@@ -0,0 +1,28 @@
+'''
+recompute the recipe_count of tags and ingredients from the recipe links
+and fix the ones that drifted
+'''
+from django.core.management.base import BaseCommand
+
+from recipe.counts import COUNTED, recount
+
+
+class Command(BaseCommand):
+    '''
+    the signals of recipe.signals keep the counts current for writes made
+    through the ORM, this repairs them after raw SQL, restores or anything
+    else that wrote the link tables directly
+    '''
+    help = 'fix drifted recipe counts of tags and ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int,
+                            help='only the tags and ingredients of this user id')
+
+    def handle(self, *args, **options):
+        for model, field_name in COUNTED.items():
+            queryset = model.objects.all()
+            if options['user'] is not None:
+                queryset = queryset.filter(user_id=options['user'])
+            fixed = recount(model, queryset)
+            self.stdout.write(f'{field_name}: fixed {fixed} of {queryset.count()}')
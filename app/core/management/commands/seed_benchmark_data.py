@@ -0,0 +1,145 @@
+'''
+seed users with realistic recipe volumes for scripts/loadtest.py and print
+their credentials as JSON, the --seed-file of the load test
+'''
+import json
+import random
+import secrets
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.counts import recount
+
+
+EMAIL_PREFIX = 'seeded-'
+
+# the users a seed created are members, the only users a later seed deletes
+SEED_GROUP = 'seed_benchmark_data'
+
+# ids per user written to the seed file, for detail, filter and upload requests
+SAMPLE_IDS = 1000
+
+
+def _bulk_create(model, objects, batch_size=5000):
+    # batch by batch, bulk_create() would hold every object in memory
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        model.objects.bulk_create(batch)
+
+
+class Command(BaseCommand):
+    '''
+    replaces the users of an earlier seed with one user per --recipes count,
+    each with --tags tags and --ingredients ingredients of which every recipe
+    gets a few, plus an admin whose token reads the metrics endpoint. Only
+    runs with --force, the users share a password generated per run
+    '''
+    help = 'seed load test users with recipes, tags and ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, nargs='+', default=[10, 1000, 100_000],
+                            help='one user per count, with that many recipes')
+        parser.add_argument('--tags', type=int, default=200, help='tags per user')
+        parser.add_argument('--ingredients', type=int, default=500,
+                            help='ingredients per user')
+        parser.add_argument('--per-recipe', type=int, default=4,
+                            help='tags and ingredients of each recipe')
+        parser.add_argument('--password', help='password of the users, random by default')
+        parser.add_argument('--seed', type=int, default=0, help='random seed')
+        parser.add_argument('--output', help='file for the credentials, stdout by default')
+        parser.add_argument('--force', action='store_true',
+                            help='seed anyway, the database should be a throwaway one')
+
+    def handle(self, *args, **options):
+        if not options['force']:
+            raise CommandError(
+                'seeding adds a superuser and deletes the users of an earlier seed, '
+                'pass --force to run it against this database'
+            )
+        rng = random.Random(options['seed'])
+        password = options['password'] or secrets.token_urlsafe(16)
+        user_model = get_user_model()
+        group, _ = Group.objects.get_or_create(name=SEED_GROUP)
+        taken = user_model.objects.filter(email__startswith=EMAIL_PREFIX).exclude(
+            groups=group
+        ).values_list('email', flat=True)
+        if taken:
+            raise CommandError(
+                f'{", ".join(taken)} not created by an earlier seed, not replacing them'
+            )
+        user_model.objects.filter(groups=group).delete()
+
+        admin = user_model.objects.create_superuser(f'{EMAIL_PREFIX}admin@example.com', password)
+        admin.groups.add(group)
+        seeded = {
+            'admin': {
+                'email': admin.email,
+                'password': password,
+                'token': Token.objects.create(user=admin).key,
+            },
+            'users': [],
+        }
+        self.stderr.write(f'seeded {admin.email}, password {password}')
+        for count in options['recipes']:
+            user = user_model.objects.create_user(
+                f'{EMAIL_PREFIX}{count}@example.com', password, name=f'{count} recipes'
+            )
+            user.groups.add(group)
+            with transaction.atomic():
+                ids, tag_ids, ingredient_ids = self._seed(user, count, options, rng)
+            seeded['users'].append({
+                'email': user.email,
+                'password': password,
+                'token': Token.objects.create(user=user).key,
+                'recipes': count,
+                'recipe_ids': rng.sample(ids, min(len(ids), SAMPLE_IDS)),
+                'tag_ids': rng.sample(tag_ids, min(len(tag_ids), SAMPLE_IDS)),
+                'ingredient_ids': rng.sample(ingredient_ids, min(len(ingredient_ids), SAMPLE_IDS)),
+            })
+            self.stderr.write(f'seeded {user.email}')
+
+        report = json.dumps(seeded, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                fp.write(report)
+        else:
+            self.stdout.write(report)
+
+    def _seed(self, user, count, options, rng):
+        names = {}
+        for model, number in ((Tag, options['tags']), (Ingredient, options['ingredients'])):
+            model.objects.bulk_create(
+                model(user=user, name=f'{model.__name__.lower()} {i:05}') for i in range(number)
+            )
+            names[model] = list(model.objects.filter(user=user).values_list('id', flat=True))
+
+        _bulk_create(Recipe, (
+            Recipe(user=user, title=f'recipe {i}', description=f'seeded recipe {i} ' * 8,
+                   time_minutes=rng.randint(5, 240),
+                   price=Decimal(rng.randint(100, 9999)) / 100)
+            for i in range(count)
+        ))
+        ids = list(Recipe.objects.filter(user=user).values_list('id', flat=True))
+
+        for field, model in (('tags', Tag), ('ingredients', Ingredient)):
+            through = getattr(Recipe, field).through
+            column = f'{model.__name__.lower()}_id'
+            per_recipe = min(options['per_recipe'], len(names[model]))
+            _bulk_create(through, (
+                through(recipe_id=recipe_id, **{column: name_id})
+                for recipe_id in ids
+                for name_id in rng.sample(names[model], per_recipe)
+            ))
+            # the through rows went in without m2m_changed
+            recount(model, model.objects.filter(user=user))
+        return ids, names[Tag], names[Ingredient]
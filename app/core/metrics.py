@@ -0,0 +1,409 @@
+'''
+    request metrics of the worker processes, exported in the Prometheus
+    text format by core.views.MetricsView
+
+    every process adds to a file of its own in METRICS['DIRECTORY'] through
+    mmap, without locks between processes. An export sums the files, so the
+    worker that serves the scrape reports for all of them. Without a
+    directory the values stay in the memory of the process
+'''
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from rest_framework.fields import empty
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DIRECTORY': None,
+}
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HISTOGRAMS = {
+    'app_request_duration_seconds': ('time to respond, streamed content included', SECONDS),
+    'app_request_db_queries': (
+        'SQL queries per request', (0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+    ),
+    'app_request_db_seconds': ('time in SQL queries per request', SECONDS),
+    'app_request_serializer_seconds': (
+        'time in serializers per request, queries they make included', SECONDS,
+    ),
+    'app_response_size_bytes': (
+        'size of the response body', tuple(4 ** power for power in range(4, 12)),
+    ),
+}
+
+COUNTERS = {
+    'app_requests_total': 'requests by view, action and status class',
+    'app_upload_rejections_total': 'image uploads refused by the upload guards',
+    'app_throttled_total': 'requests refused by rate limits and concurrency caps, by scope',
+    'app_db_pool_acquired_total': 'connections handed out by the pool',
+    'app_db_pool_created_total': 'connections the pool opened',
+    'app_db_pool_discarded_total': 'connections the pool closed as unusable',
+    'app_db_pool_waits_total': 'acquires that waited for a free connection',
+    'app_db_pool_timeouts_total': 'acquires that gave up waiting',
+    'app_db_pool_wait_seconds_total': 'time spent waiting for a free connection',
+}
+
+# only the values of live processes count for gauges
+GAUGES = {
+    'app_db_pool_size': 'connections open, idle or in use',
+    'app_db_pool_in_use': 'connections in use',
+    'app_db_pool_waiting': 'threads waiting for a free connection',
+}
+
+# pool stats are published by the requests of a process at most this often
+POOL_STATS_INTERVAL = 1.0
+
+_HEADER = struct.Struct('<Q')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+_INITIAL_SIZE = 64 * 1024
+
+
+def metrics_options():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class RequestStats:
+    ''' what a request spent, added to by the query and serializer hooks '''
+    __slots__ = ('queries', 'db_seconds', 'serializer_seconds', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+
+# a context variable, asgiref carries it into the threads the ASGI handler
+# runs sync code on
+current_stats = ContextVar('request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    ''' execute wrapper that counts the queries of the current request '''
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def instrument_connection(sender, connection, **kwargs):
+    ''' connection_created receiver, once per connection wrapper '''
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_serialization(method, data):
+    '''
+        method(data), its time added to the serializer time of the request
+        unless an outer serialization already counts it
+    '''
+    stats = current_stats.get()
+    if stats is None or stats.serializing:
+        return method(data)
+    stats.serializing = True
+    start = time.perf_counter()
+    try:
+        return method(data)
+    finally:
+        stats.serializer_seconds += time.perf_counter() - start
+        stats.serializing = False
+
+
+class TimedSerializerMixin:
+    '''
+        counts the outermost to_representation and run_validation calls as
+        serializer time. Nested serializers and the items of many=True run
+        inside such a call or as one each
+    '''
+
+    def to_representation(self, instance):
+        return timed_serialization(super().to_representation, instance)
+
+    def run_validation(self, data=empty):
+        return timed_serialization(super().run_validation, data)
+
+
+class _MemoryStore:
+
+    def __init__(self):
+        self._values = {}
+
+    def add(self, key, amount):
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        self._values[key] = value
+
+    def items(self):
+        return list(self._values.items())
+
+
+class _FileStore:
+    '''
+        key/value doubles in a file: the used length, then entries of key
+        length, key padded to 8 bytes and value. The used length is written
+        after the entry, readers never see half an entry
+    '''
+
+    def __init__(self, path):
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            size = _INITIAL_SIZE
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        self._positions = {key: position for key, position in _entries(self._map, self._used)}
+
+    def _position(self, key):
+        position = self._positions.get(key)
+        if position is None:
+            encoded = key.encode()
+            padded = (_KEY_LENGTH.size + len(encoded) + 7) // 8 * 8
+            if self._used + padded + _VALUE.size > len(self._map):
+                self._grow(2 * len(self._map))
+            _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+            start = self._used + _KEY_LENGTH.size
+            self._map[start:start + len(encoded)] = encoded
+            position = self._used + padded
+            _VALUE.pack_into(self._map, position, 0.0)
+            self._used = position + _VALUE.size
+            _HEADER.pack_into(self._map, 0, self._used)
+            self._positions[key] = position
+        return position
+
+    def _grow(self, size):
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    def add(self, key, amount):
+        position = self._position(key)
+        _VALUE.pack_into(self._map, position, _VALUE.unpack_from(self._map, position)[0] + amount)
+
+    def set(self, key, value):
+        _VALUE.pack_into(self._map, self._position(key), value)
+
+    def items(self):
+        return [
+            (key, _VALUE.unpack_from(self._map, position)[0])
+            for key, position in self._positions.items()
+        ]
+
+
+def _entries(data, used):
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(data, position)[0]
+        start = position + _KEY_LENGTH.size
+        key = bytes(data[start:start + length]).decode()
+        position += (_KEY_LENGTH.size + length + 7) // 8 * 8
+        yield key, position
+        position += _VALUE.size
+
+
+def _read_file(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < _HEADER.size:
+        return []
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    return [(key, _VALUE.unpack_from(data, position)[0]) for key, position in _entries(data, used)]
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+_pool_stats_published = 0.0
+
+
+def _get_store():
+    # opened on first use and again in forked children, after uwsgi forked
+    # its workers every one writes to a file of its own
+    global _store, _store_pid
+    pid = os.getpid()
+    if _store_pid != pid:
+        directory = metrics_options()['DIRECTORY']
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            _store = _FileStore(os.path.join(directory, f'{pid}.db'))
+        else:
+            _store = _MemoryStore()
+        _store_pid = pid
+    return _store
+
+
+def _reset_store(setting, **kwargs):
+    global _store, _store_pid, _pool_stats_published
+    if setting == 'METRICS':
+        with _store_lock:
+            _store = _store_pid = None
+            _pool_stats_published = 0.0
+
+
+setting_changed.connect(_reset_store)
+
+
+@lru_cache(maxsize=4096)
+def _key(name, labels, le=None):
+    return json.dumps([name, labels, le])
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    key = _key(name, _labels(labels))
+    with _store_lock:
+        _get_store().add(key, amount)
+
+
+def set_value(name, value, **labels):
+    key = _key(name, _labels(labels))
+    with _store_lock:
+        _get_store().set(key, value)
+
+
+def observe(name, value, **labels):
+    '''
+        adds value to a histogram. Only the bucket it falls in is counted,
+        export() makes the buckets cumulative
+    '''
+    labels = _labels(labels)
+    buckets = HISTOGRAMS[name][1]
+    index = bisect_left(buckets, value)
+    le = buckets[index] if index < len(buckets) else None
+    with _store_lock:
+        store = _get_store()
+        store.add(_key(name + '_bucket', labels, le), 1)
+        store.add(_key(name + '_sum', labels), value)
+
+
+def record_request(view, action, status, stats, seconds, size):
+    ''' the histograms and counters of one request '''
+    global _pool_stats_published
+    labels = {'view': view, 'action': action}
+    increment('app_requests_total', view=view, action=action, status=f'{status // 100}xx')
+    observe('app_request_duration_seconds', seconds, **labels)
+    observe('app_request_db_queries', stats.queries, **labels)
+    observe('app_request_db_seconds', stats.db_seconds, **labels)
+    observe('app_request_serializer_seconds', stats.serializer_seconds, **labels)
+    if size is not None:
+        observe('app_response_size_bytes', size, **labels)
+
+    now = time.monotonic()
+    if now - _pool_stats_published >= POOL_STATS_INTERVAL:
+        _pool_stats_published = now
+        publish_pool_stats()
+
+
+def publish_pool_stats():
+    from core.db.backends.postgresql.base import pool_stats
+
+    for alias, stats in pool_stats().items():
+        for name in GAUGES:
+            set_value(name, stats[name[len('app_db_pool_'):]], alias=alias)
+        for name in COUNTERS:
+            if name.startswith('app_db_pool_'):
+                set_value(name, stats[name[len('app_db_pool_'):-len('_total')]], alias=alias)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    ''' values of all the worker processes, summed by key '''
+    directory = metrics_options()['DIRECTORY']
+    if not directory:
+        with _store_lock:
+            return dict(_get_store().items())
+
+    totals = {}
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        stem, extension = os.path.splitext(name)
+        if extension != '.db' or not stem.isdigit():
+            continue
+        alive = _alive(int(stem))
+        for key, value in _read_file(os.path.join(directory, name)):
+            if not alive and json.loads(key)[0] in GAUGES:
+                continue
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def export():
+    ''' every metric in the Prometheus text format, version 0.0.4 '''
+    samples = {}
+    for key, value in collect().items():
+        name, labels, le = json.loads(key)
+        samples.setdefault(name, []).append((tuple(map(tuple, labels)), le, value))
+
+    lines = []
+    for name, help_text in {**COUNTERS, **GAUGES}.items():
+        if name not in samples:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {"gauge" if name in GAUGES else "counter"}')
+        for labels, _, value in sorted(samples[name]):
+            lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        if name + '_bucket' not in samples:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        counts = {}
+        for labels, le, value in samples[name + '_bucket']:
+            counts.setdefault(labels, {})[le] = value
+        sums = {labels: value for labels, _, value in samples.get(name + '_sum', [])}
+        for labels in sorted(counts):
+            total = 0
+            for le in (*buckets, None):
+                total += counts[labels].get(le, 0)
+                bucket_labels = labels + (('le', _number(float('inf') if le is None else le)),)
+                lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {_number(total)}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_number(sums.get(labels, 0))}')
+            lines.append(f'{name}_count{_format_labels(labels)} {_number(total)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,190 @@
+'''
+    project wide middleware
+'''
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+from core import compression, metrics
+from core.db.routers import replica_reads
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_END = object()
+
+
+def _on_replica(content, alias):
+    # streamed content is produced after the middleware returned
+    parts = iter(content)
+    while True:
+        with replica_reads(alias=alias):
+            part = next(parts, _END)
+        if part is _END:
+            return
+        yield part
+
+
+class ReplicaRoutingMiddleware:
+    '''
+        serves safe-method requests from the replicas, except for clients
+        that wrote in the last DATABASE_REPLICA_PIN_SECONDS: they are pinned
+        to the primary so they read their own writes despite replica lag.
+        Clients are told apart by their Authorization header or session
+        cookie, the pins live in the cache shared by all workers. A login
+        pins the session cookie or API token it hands out
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _pin_key(self, credentials):
+        digest = hashlib.sha256(credentials.encode()).hexdigest()
+        return f'db-pin:{digest}'
+
+    def _credentials(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        return authorization or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+    def _issued(self, response):
+        ''' the credentials a login response hands out, as they'll be sent back '''
+        session = response.cookies.get(settings.SESSION_COOKIE_NAME)
+        if session:
+            yield session.value
+        # the user app's token endpoint answers {'token': key}
+        data = getattr(response, 'data', None)
+        if isinstance(data, dict) and isinstance(data.get('token'), str):
+            yield f'Token {data["token"]}'
+
+    def __call__(self, request):
+        credentials = self._credentials(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            # pinned whatever the outcome, a failed request may have written
+            # before it failed. A login hands out new credentials, the
+            # client's next requests come with those, and a replica may not
+            # have the token or session row yet
+            for value in (credentials, *self._issued(response)):
+                if value:
+                    cache.set(self._pin_key(value), True, settings.DATABASE_REPLICA_PIN_SECONDS)
+            return response
+
+        if credentials and cache.get(self._pin_key(credentials), False):
+            return self.get_response(request)
+
+        with replica_reads() as alias:
+            response = self.get_response(request)
+        if response.streaming and alias is not None:
+            response.streaming_content = _on_replica(response.streaming_content, alias)
+        return response
+
+
+class MetricsMiddleware:
+    '''
+        records per view and action the duration, SQL queries and their
+        time, serializer time and response size of every request, see
+        core.metrics. Streamed responses are recorded once fully sent
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _endpoint(self, request):
+        method = request.method.lower()
+        match = request.resolver_match
+        if match is None:
+            return 'unmatched', method
+        # viewsets name the action of each method
+        actions = getattr(match.func, 'actions', None) or {}
+        return match.view_name, actions.get(method, method)
+
+    def __call__(self, request):
+        if not metrics.metrics_options()['ENABLED']:
+            return self.get_response(request)
+
+        stats = metrics.RequestStats()
+        start = time.perf_counter()
+        token = metrics.current_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_stats.reset(token)
+
+        def record(size):
+            metrics.record_request(
+                *self._endpoint(request), response.status_code, stats,
+                time.perf_counter() - start, size,
+            )
+
+        if response.streaming:
+            response.streaming_content = self._streamed(response.streaming_content, stats, record)
+        else:
+            record(len(response.content))
+        return response
+
+    def _streamed(self, content, stats, record):
+        size = 0
+        parts = iter(content)
+        try:
+            while True:
+                token = metrics.current_stats.set(stats)
+                try:
+                    part = next(parts, _END)
+                finally:
+                    metrics.current_stats.reset(token)
+                if part is _END:
+                    break
+                size += len(part)
+                yield part
+        finally:
+            # also when the client went away before the end
+            record(size)
+
+
+class CompressionMiddleware:
+    '''
+        compresses responses of COMPRESSION['TYPES'] from MIN_SIZE bytes up
+        with the encoding the client's Accept-Encoding prefers, brotli or
+        gzip. Streamed responses are compressed as they are produced
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        options = compression.compression_options()
+        if response.has_header('Content-Encoding'):
+            return response
+        if not compression.compressible_type(response.get('Content-Type', ''), options):
+            return response
+        if not response.streaming and len(response.content) < options['MIN_SIZE']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compression.compress_stream(
+                response.streaming_content, encoding, options
+            )
+            del response['Content-Length']
+        else:
+            compressed = compression.compress(response.content, encoding, options)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # the compressed bytes differ, a strong validator would claim otherwise
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,76 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def merge_duplicate_names(apps, schema_editor):
+    '''
+        folds duplicate (user, name) tags and ingredients into the oldest
+        row, moving their recipe links over, so the unique constraints can
+        be added
+    '''
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field_name).through
+        target = f'{model_name.lower()}_id'
+        
+        duplicates = model.objects.values('user_id', 'name').annotate(
+            keep=Min('id'), rows=Count('id')
+        ).filter(rows__gt=1)
+        for duplicate in duplicates:
+            keep = duplicate['keep']
+            extra_ids = list(model.objects.filter(
+                user_id=duplicate['user_id'], name=duplicate['name']
+            ).exclude(id=keep).values_list('id', flat=True))
+            for extra_id in extra_ids:
+                linked = through.objects.filter(**{target: keep}).values('recipe_id')
+                links = through.objects.filter(**{target: extra_id})
+                links.filter(recipe_id__in=linked).delete()
+                links.update(**{target: keep})
+            model.objects.filter(id__in=extra_ids).delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # run the deferred foreign key checks of the rows changed above,
+        # tables with pending trigger events can't be altered below
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_ingredient_name_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_name_per_user'),
+        ),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
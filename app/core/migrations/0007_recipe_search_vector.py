@@ -0,0 +1,56 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_TRIGGER_SQL = """
+CREATE FUNCTION core_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+    FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_vector_update();
+
+UPDATE core_recipe SET title = title;
+
+CREATE INDEX recipe_search_vector_idx ON core_recipe USING gin (search_vector);
+"""
+
+DROP_SEARCH_TRIGGER_SQL = """
+DROP INDEX IF EXISTS recipe_search_vector_idx;
+DROP TRIGGER IF EXISTS core_recipe_search_vector_trigger ON core_recipe;
+DROP FUNCTION IF EXISTS core_recipe_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    # the trigger and GIN index are PostgreSQL only and kept out of the
+    # model state, other backends just get the nullable column
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_TRIGGER_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_TRIGGER_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_name_constraints_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConcurrencyLease',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('holder', models.CharField(db_index=True, max_length=32)),
+                ('expires', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated', models.FloatField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    for name, field in (('Tag', 'tag'), ('Ingredient', 'ingredient')):
+        model = apps.get_model('core', name)
+        recipe = apps.get_model('core', 'Recipe')
+        through = recipe._meta.get_field(f'{field}s').remote_field.through
+        model.objects.update(recipe_count=Coalesce(Subquery(
+            through.objects.filter(**{f'{field}_id': OuterRef('pk')})
+            .values(f'{field}_id').annotate(total=Count('*')).values('total')
+        ), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_throttle_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name'], name='ingredient_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name'], name='tag_assigned_idx'),
+        ),
+    ]
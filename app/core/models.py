@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 import uuid, os
 
 from django.contrib.auth.models import (
@@ -46,16 +47,37 @@ class User(AbstractBaseUser, PermissionsMixin):
 class Tag(models.Model):
       ''' tag for filtering the recipe '''
       name = models.CharField(max_length=255)
-      user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+      # the (user, name) unique index covers lookups by user alone
+      user = models.ForeignKey(
+          settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False
+      )
+      # recipes linked to the tag, kept up to date by recipe.signals
+      recipe_count = models.PositiveIntegerField(default=0, editable=False)
+      
+      class Meta:
+          constraints = [
+              models.UniqueConstraint(
+                  fields=['user', 'name'], name='unique_tag_name_per_user'
+              ),
+          ]
+          indexes = [
+              # assigned_only listings, in their default order
+              models.Index(
+                  fields=['user', '-name'], condition=models.Q(recipe_count__gt=0),
+                  name='tag_assigned_idx'
+              ),
+          ]
       
       def __str__(self):
           return self.name
 
 class Recipe(models.Model):
     
+    # the (user, -id) index covers lookups by user alone
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -65,6 +87,24 @@ class Recipe(models.Model):
     tags = models.ManyToManyField(Tag)
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # variant name -> storage path of the resized copies of image, filled
+    # in by the background worker (see recipe.images)
+    image_variants = models.JSONField(default=dict, editable=False)
+    # weighted title (A) + description (B) document, written by a database
+    # trigger and searched through a GIN index (see migration 0007)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # last change of anything the recipe's representation shows, its tag
+    # and ingredient links and their names included (see recipe.signals)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # every recipe query filters by user and orders/pages by -id
+            models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+            # the Last-Modified of the user's recipe list
+            models.Index(fields=['user', 'updated_at'], name='recipe_user_updated_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -73,8 +113,43 @@ class Recipe(models.Model):
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=255)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # the (user, name) unique index covers lookups by user alone
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False
+    )
+    # recipes linked to the ingredient, kept up to date by recipe.signals
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='unique_ingredient_name_per_user'
+            ),
+        ]
+        indexes = [
+            # assigned_only listings, in their default order
+            models.Index(
+                fields=['user', '-name'], condition=models.Q(recipe_count__gt=0),
+                name='ingredient_assigned_idx'
+            ),
+        ]
     
     def __str__(self):
         return self.name
     
+
+
+class ThrottleBucket(models.Model):
+    ''' token bucket of a rate limit, see core.throttling '''
+    key = models.CharField(max_length=255, primary_key=True)
+    tokens = models.FloatField()
+    # unix time tokens was last refilled at
+    updated = models.FloatField()
+
+
+class ConcurrencyLease(models.Model):
+    ''' a taken slot of a concurrency cap, see core.throttling '''
+    key = models.CharField(max_length=255, primary_key=True)
+    holder = models.CharField(max_length=32, db_index=True)
+    # unix time another request may take the slot at
+    expires = models.FloatField()
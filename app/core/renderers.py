@@ -0,0 +1,85 @@
+'''
+    JSON renderer and parser of the API on orjson when it is installed and
+    FAST_JSON is on, DRF's json module based ones otherwise
+
+    Both give the bytes and data DRF's would: types orjson does not know
+    (Decimal, lazy strings, generators) and the datetimes it formats its
+    own way go through DRF's encoder, U+2028 and U+2029 are escaped, and
+    whatever orjson refuses or would read differently is handed to the
+    stdlib, so errors and their messages stay DRF's. NaN and Infinity,
+    which orjson writes as null, go to the stdlib too: it raises under
+    STRICT_JSON and writes them out otherwise. The difference left is in
+    float exponents, written without '+' (1e16, not 1e+16), the same number
+'''
+import math
+import re
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# past 64 bits orjson reads integers as floats, the stdlib keeps them exact
+_LONG_NUMBER = re.compile(rb'\d{19}')
+
+
+def fast_json():
+    ''' whether orjson renders and parses '''
+    return orjson is not None and settings.FAST_JSON
+
+
+def _non_finite(data):
+    ''' whether the lists and dicts of data hold a NaN or an infinity '''
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_non_finite(value) for value in data)
+    return False
+
+
+class JSONRenderer(renderers.JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not fast_json() or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except orjson.JSONEncodeError:
+            # integers past 64 bits, keys that are not strings, or the
+            # encoder's own error, raised again by the stdlib
+            return super().render(data, accepted_media_type, renderer_context)
+        # orjson writes them as null, only a body with a null can hold one
+        if b'null' in ret and _non_finite(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class JSONParser(parsers.JSONParser):
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not fast_json() or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if not _LONG_NUMBER.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(BytesIO(body), media_type, parser_context)
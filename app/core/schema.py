@@ -0,0 +1,67 @@
+'''
+    the OpenAPI schema rendered ahead of time by manage.py generate_schema,
+    one file per format in API_SCHEMA_DIR, and served by
+    core.views.CachedSchemaView
+
+    generating walks every view and serializer, hundreds of milliseconds
+    on a cold worker, while the schema only changes with the code
+'''
+import hashlib
+import os
+
+from django.conf import settings
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+
+# renderer format -> file name
+FILES = {
+    'yaml': 'schema.yaml',
+    'json': 'schema.json',
+}
+
+RENDERERS = {
+    'yaml': OpenApiYamlRenderer,
+    'json': OpenApiJsonRenderer,
+}
+
+# path -> (modification time, content, etag)
+_loaded = {}
+
+
+def generate():
+    ''' the public schema, as the schema view generates it '''
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(
+        urlconf=spectacular_settings.SERVE_URLCONF
+    )
+    return generator.get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC)
+
+
+def write(schema, directory):
+    ''' renders the schema in every format, replacing the files atomically '''
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for format, name in FILES.items():
+        path = os.path.join(directory, name)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as fp:
+            fp.write(RENDERERS[format]().render(schema, renderer_context={}))
+        os.replace(temporary, path)
+        paths.append(path)
+    return paths
+
+
+def load(format):
+    ''' (content, etag) of the generated file of a format, None without one '''
+    path = os.path.join(settings.API_SCHEMA_DIR, FILES[format])
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _loaded.get(path)
+    if cached is None or cached[0] != modified:
+        with open(path, 'rb') as fp:
+            content = fp.read()
+        cached = (modified, content, f'"{hashlib.sha256(content).hexdigest()[:32]}"')
+        _loaded[path] = cached
+    return cached[1:]
@@ -2,11 +2,20 @@
     tests django management commands
 '''
 
+import json
+from io import StringIO
+from unittest import skipUnless
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -28,3 +37,76 @@ class CommandTest(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class ExplainQueriesTest(TestCase):
+    @skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+    def test_explain_queries_reports_both_schemas(self):
+        out = StringIO()
+        call_command(
+            'explain_queries', users=2, recipes=60, names=20, repeat=1,
+            stdout=out
+        )
+        output = out.getvalue()
+        self.assertIn('composite indexes', output)
+        self.assertIn('user_id indexes only', output)
+        self.assertIn('recipe_user_id_desc_idx', output)
+        self.assertEqual(Recipe.objects.count(), 0)
+
+    @skipUnless(connection.vendor != 'postgresql', 'checks the non PostgreSQL path')
+    def test_explain_queries_requires_postgres(self):
+        with self.assertRaises(CommandError):
+            call_command('explain_queries')
+
+
+class SeedBenchmarkDataTest(TestCase):
+
+    def test_seeds_users_with_recipes(self):
+        out = StringIO()
+        call_command('seed_benchmark_data', recipes=[3, 12], tags=5, ingredients=6,
+                     per_recipe=2, force=True, stdout=out, stderr=StringIO())
+        seeded = json.loads(out.getvalue())
+
+        admin = Token.objects.get(key=seeded['admin']['token']).user
+        self.assertTrue(admin.is_staff)
+        self.assertTrue(admin.check_password(seeded['admin']['password']))
+        self.assertNotEqual(seeded['admin']['password'], 'seeded-pass')
+        self.assertEqual([user['recipes'] for user in seeded['users']], [3, 12])
+        for user in seeded['users']:
+            owner = Token.objects.get(key=user['token']).user
+            recipes = Recipe.objects.filter(user=owner)
+            self.assertEqual(recipes.count(), user['recipes'])
+            self.assertCountEqual(user['recipe_ids'], recipes.values_list('id', flat=True))
+            self.assertEqual(len(user['tag_ids']), 5)
+            self.assertEqual(len(user['ingredient_ids']), 6)
+            for recipe in recipes:
+                self.assertEqual(recipe.tags.count(), 2)
+                self.assertEqual(recipe.ingredients.count(), 2)
+
+    def seed(self, **options):
+        out = StringIO()
+        call_command('seed_benchmark_data', recipes=[4], tags=2, ingredients=2,
+                     stdout=out, stderr=StringIO(), **options)
+        return json.loads(out.getvalue())
+
+    def test_requires_force(self):
+        with self.assertRaises(CommandError):
+            self.seed()
+
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_replaces_earlier_seed(self):
+        first = self.seed(force=True)
+        second = self.seed(force=True)
+
+        self.assertEqual(Recipe.objects.count(), 4)
+        self.assertEqual(get_user_model().objects.count(), 2)
+        self.assertNotEqual(first['users'][0]['password'], second['users'][0]['password'])
+
+    def test_keeps_users_it_did_not_create(self):
+        get_user_model().objects.create_user('seeded-4@example.com', 'testpass123')
+
+        with self.assertRaises(CommandError):
+            self.seed(force=True)
+
+        self.assertEqual(get_user_model().objects.get().email, 'seeded-4@example.com')
@@ -0,0 +1,175 @@
+'''
+    tests gzip and brotli of API responses and collected static files
+'''
+import gzip
+import os
+import shutil
+import tempfile
+import zlib
+from decimal import Decimal
+from unittest import skipIf
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import compression
+from core.compression import CompressedStaticFilesStorage, negotiate
+from core.models import Recipe
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+ME_URL = reverse('user:me')
+
+
+class NegotiateTests(SimpleTestCase):
+
+    def test_prefers_brotli(self):
+        expected = 'br' if compression.brotli is not None else 'gzip'
+
+        self.assertEqual(negotiate('gzip, deflate, br'), expected)
+
+    def test_quality_values(self):
+        self.assertEqual(negotiate('br;q=0.5, gzip;q=0.8'), 'gzip')
+        self.assertEqual(negotiate('gzip;q=0, deflate'), None)
+        self.assertEqual(negotiate('*;q=0'), None)
+        self.assertEqual(negotiate('identity'), None)
+        self.assertEqual(negotiate(''), None)
+
+    def test_wildcard(self):
+        self.assertIn(negotiate('*'), compression.encodings())
+        self.assertEqual(negotiate('br;q=0, *'), 'gzip')
+
+
+class CompressionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for i in range(30):
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=i, price=Decimal('5.00')
+            )
+
+    def get(self, url, accept_encoding):
+        cache.clear()
+        return self.client.get(url, HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def test_gzip(self):
+        plain = self.get(RECIPE_URL, '')
+
+        res = self.get(RECIPE_URL, 'gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertLess(len(res.content), len(plain.content))
+        self.assertEqual(res['Content-Length'], str(len(res.content)))
+
+    @skipIf(compression.brotli is None, 'needs brotli')
+    def test_brotli(self):
+        plain = self.get(RECIPE_URL, '')
+
+        res = self.get(RECIPE_URL, 'gzip, br')
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(res.content), plain.content)
+
+    def test_not_accepted(self):
+        res = self.get(RECIPE_URL, 'identity')
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+    def test_small_responses_left_alone(self):
+        res = self.get(ME_URL, 'gzip')
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res.json()['email'], 'user@example.com')
+
+    @override_settings(COMPRESSION={'MIN_SIZE': 10})
+    def test_min_size_setting(self):
+        self.user.name = 'Name ' * 40
+        self.user.save()
+
+        res = self.get(ME_URL, 'gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+
+    @override_settings(COMPRESSION={'TYPES': ('text/',)})
+    def test_types_setting(self):
+        res = self.get(RECIPE_URL, 'gzip')
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_streamed_export(self):
+        plain = b''.join(self.get(BULK_URL, '').streaming_content)
+
+        res = self.get(BULK_URL, 'gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertFalse(res.has_header('Content-Length'))
+        body = b''.join(res.streaming_content)
+        self.assertEqual(zlib.decompress(body, 16 + zlib.MAX_WBITS), plain)
+
+
+class CompressedStaticFilesStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = CompressedStaticFilesStorage(location=self.root)
+        self.write('app.js', b'function f() { return 1; }\n' * 200)
+        self.write('tiny.css', b'a{}')
+        self.write('logo.png', b'\x89PNG' * 1000)
+        self.write('random.json', os.urandom(4096))
+
+    def write(self, name, data):
+        with open(os.path.join(self.root, name), 'wb') as fp:
+            fp.write(data)
+
+    def process(self):
+        paths = {name: (self.storage, name) for name in os.listdir(self.root)}
+        return {name: done for name, _, done in self.storage.post_process(paths)}
+
+    def test_writes_compressed_copies(self):
+        processed = self.process()
+
+        path = os.path.join(self.root, 'app.js')
+        with open(path, 'rb') as fp:
+            original = fp.read()
+        with open(path + '.gz', 'rb') as fp:
+            self.assertEqual(gzip.decompress(fp.read()), original)
+        # nginx has no brotli_static
+        self.assertFalse(os.path.exists(path + '.br'))
+        self.assertTrue(processed['app.js'])
+
+    def test_skips_small_other_and_incompressible_files(self):
+        processed = self.process()
+
+        files = set(os.listdir(self.root))
+        for name in ('tiny.css', 'logo.png', 'random.json'):
+            self.assertFalse(processed[name])
+            self.assertNotIn(f'{name}.gz', files)
+
+    def test_up_to_date_copies_kept(self):
+        self.process()
+        gz = os.path.join(self.root, 'app.js.gz')
+        os.utime(gz, (2 ** 31, 2 ** 31))
+
+        processed = self.process()
+
+        self.assertFalse(processed['app.js'])
+        self.assertEqual(os.path.getmtime(gz), 2 ** 31)
+
+    def test_dry_run(self):
+        paths = {'app.js': (self.storage, 'app.js')}
+
+        self.assertEqual(list(self.storage.post_process(paths, dry_run=True)), [])
+        self.assertNotIn('app.js.gz', os.listdir(self.root))
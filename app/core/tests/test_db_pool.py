@@ -0,0 +1,178 @@
+'''
+    tests the connection pool with sqlite3 standing in for Postgres and
+    the pooling, health checking backend against Postgres itself
+'''
+import os
+import sqlite3
+import threading
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db.backends.postgresql.base import DatabaseWrapper, close_pools, pool_stats
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+def sqlite_connect():
+    return sqlite3.connect(':memory:', check_same_thread=False)
+
+
+def sqlite_is_usable(conn):
+    try:
+        conn.execute('SELECT 1')
+    except sqlite3.Error:
+        return False
+    return True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def test_released_connection_reused(self):
+        pool = ConnectionPool(sqlite_connect, max_size=2)
+
+        first = pool.acquire()
+        pool.release(first)
+        second = pool.acquire()
+
+        self.assertIs(first, second)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['acquired'], 2)
+
+    def test_saturated_pool_times_out(self):
+        pool = ConnectionPool(sqlite_connect, max_size=1, timeout=0.05)
+        pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        stats = pool.stats()
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = ConnectionPool(sqlite_connect, max_size=1, timeout=5)
+        held = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+
+        waiter.start()
+        while not pool.stats()['waiting']:
+            pass
+        pool.release(held)
+        waiter.join()
+
+        self.assertEqual(acquired, [held])
+        self.assertGreater(pool.stats()['wait_seconds'], 0)
+
+    def test_stale_unusable_connection_replaced(self):
+        pool = ConnectionPool(
+            sqlite_connect, max_size=1, is_usable=sqlite_is_usable, check_interval=0
+        )
+        broken = pool.acquire()
+        pool.release(broken)
+        broken.close()
+
+        replacement = pool.acquire()
+
+        self.assertIsNot(replacement, broken)
+        self.assertTrue(sqlite_is_usable(replacement))
+        self.assertEqual(pool.stats()['discarded'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_connection_failing_reset_discarded(self):
+        def reset(conn):
+            raise sqlite3.OperationalError('server closed the connection')
+
+        pool = ConnectionPool(sqlite_connect, max_size=1, reset=reset)
+        pool.release(pool.acquire())
+
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle'], stats['discarded']), (0, 0, 1))
+
+    def test_failed_connect_frees_slot(self):
+        pool = ConnectionPool(sqlite_connect, max_size=1, timeout=0.05)
+
+        with patch.object(pool, 'connect', side_effect=sqlite3.OperationalError):
+            with self.assertRaises(sqlite3.OperationalError):
+                pool.acquire()
+
+        self.assertIsNotNone(pool.acquire())
+
+    def test_peak_in_use(self):
+        pool = ConnectionPool(sqlite_connect, max_size=3)
+        held = [pool.acquire() for _ in range(3)]
+        for conn in held:
+            pool.release(conn)
+
+        stats = pool.stats()
+        self.assertEqual((stats['peak_in_use'], stats['in_use'], stats['idle']), (3, 0, 3))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL backend')
+class PostgresBackendTests(TestCase):
+
+    def _wrapper(self, **settings):
+        wrapper = DatabaseWrapper({**connections['default'].settings_dict, **settings})
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def _backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_health_check_replaces_dropped_connection(self):
+        wrapper = self._wrapper(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+        pid = self._backend_pid(wrapper)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+        # what the request_started signal does
+        wrapper.close_if_unusable_or_obsolete()
+
+        self.assertNotEqual(self._backend_pid(wrapper), pid)
+
+    def test_pooled_connections_returned_on_close(self):
+        self.addCleanup(close_pools)
+        # other connection parameters than the suite's, so a pool of its own
+        options = {**connection.settings_dict['OPTIONS'], 'application_name': 'pool-test'}
+        first = self._wrapper(POOL={'SIZE': 2}, OPTIONS=options)
+        pid = self._backend_pid(first)
+        first.close()
+
+        second = self._wrapper(POOL={'SIZE': 2}, OPTIONS=options)
+
+        self.assertEqual(self._backend_pid(second), pid)
+        stats = second.pooled_from.stats()
+        self.assertEqual((stats['created'], stats['acquired'], stats['in_use']), (1, 2, 1))
+        self.assertIn('default', pool_stats())
+
+
+class DatabasePoolViewTests(TestCase):
+
+    def test_admin_only(self):
+        user = get_user_model().objects.create_user('user@example.com', 'pass123')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(reverse('db-pool'))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_reports_pools_of_the_process(self):
+        admin = get_user_model().objects.create_superuser('admin@example.com', 'pass123')
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        res = client.get(reverse('db-pool'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['pid'], os.getpid())
+        self.assertIn('pools', res.data)
@@ -0,0 +1,77 @@
+'''
+    tests the project's ASGI handler
+'''
+import asyncio
+import json
+import threading
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework.authtoken.models import Token
+
+from core.handlers import ASGIHandler
+from core.models import Recipe
+
+
+def call_asgi(path, headers=()):
+    '''
+        runs a GET through the handler on an event loop of its own, like a
+        server would, and returns the sent messages
+    '''
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+        'headers': [(b'host', b'testserver'), *headers],
+    }
+    asyncio.run(ASGIHandler()(scope, receive, send))
+    return messages
+
+
+class ASGIHandlerTests(TransactionTestCase):
+
+    def setUp(self):
+        # no connection of the request threads may outlive the request
+        settings_dict = connection.settings_dict
+        self.addCleanup(settings_dict.__setitem__, 'CONN_MAX_AGE', settings_dict['CONN_MAX_AGE'])
+        settings_dict['CONN_MAX_AGE'] = 0
+        self.user = get_user_model().objects.create_user('user@example.com', 'pass123')
+        self.token = Token.objects.create(user=self.user)
+
+    def test_streaming_response_queries_off_the_event_loop(self):
+        for i in range(3):
+            Recipe.objects.create(
+                user=self.user, title=f'recipe {i}', time_minutes=5, price=Decimal('1.00')
+            )
+        auth = (b'authorization', f'Token {self.token.key}'.encode())
+
+        messages = call_asgi('/api/recipe/recipe/bulk/', [auth])
+
+        self.assertEqual(messages[0]['status'], 200, messages)
+        body = b''.join(m.get('body', b'') for m in messages[1:]).decode()
+        titles = [json.loads(line)['title'] for line in body.splitlines()]
+        self.assertEqual(titles, ['recipe 2', 'recipe 1', 'recipe 0'])
+        self.assertNotIn('more_body', messages[-1])
+
+    def test_sync_code_runs_on_a_thread_per_request(self):
+        threads = set()
+
+        def record(**kwargs):
+            # idents get reused once a request's thread is gone, names don't
+            threads.add(threading.current_thread().name)
+
+        request_started.connect(record)
+        self.addCleanup(request_started.disconnect, record)
+        for _ in range(2):
+            call_asgi('/api/user/me')
+
+        self.assertEqual(len(threads), 2)
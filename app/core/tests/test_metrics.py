@@ -0,0 +1,194 @@
+'''
+    tests the request metrics: the per-process stores, summing them over
+    processes, the middleware and the Prometheus export
+'''
+import multiprocessing
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recipe
+
+
+def samples(text):
+    ''' value of every sample line of an export '''
+    return {
+        line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+        for line in text.splitlines() if line and not line.startswith('#')
+    }
+
+
+def increment_in_child():
+    metrics.increment('app_requests_total', view='child', action='list', status='2xx')
+
+
+class MetricsStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(METRICS={'DIRECTORY': self.directory})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_file_store_values_persist(self):
+        path = os.path.join(self.directory, '1.db')
+        store = metrics._FileStore(path)
+        store.add('a', 1)
+        store.add('a', 2.5)
+        store.set('b', 7)
+
+        self.assertEqual(dict(metrics._FileStore(path).items()), {'a': 3.5, 'b': 7})
+        self.assertEqual(dict(metrics._read_file(path)), {'a': 3.5, 'b': 7})
+
+    def test_file_store_grows(self):
+        path = os.path.join(self.directory, '1.db')
+        store = metrics._FileStore(path)
+        keys = [f'key-{number}' * 20 for number in range(1000)]
+        for key in keys:
+            store.add(key, 1)
+
+        self.assertGreater(os.path.getsize(path), metrics._INITIAL_SIZE)
+        self.assertEqual(dict(metrics._read_file(path)), {key: 1 for key in keys})
+
+    def test_processes_summed(self):
+        context = multiprocessing.get_context('fork')
+        for _ in range(2):
+            child = context.Process(target=increment_in_child)
+            child.start()
+            child.join()
+        increment_in_child()
+
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+        exported = samples(metrics.export())
+        self.assertEqual(
+            exported['app_requests_total{action="list",status="2xx",view="child"}'], 3
+        )
+
+    def test_gauges_of_dead_processes_ignored(self):
+        metrics.set_value('app_db_pool_size', 4, alias='default')
+        metrics.set_value('app_db_pool_created_total', 4, alias='default')
+
+        with patch('core.metrics._alive', return_value=False):
+            exported = samples(metrics.export())
+
+        self.assertNotIn('app_db_pool_size{alias="default"}', exported)
+        self.assertEqual(exported['app_db_pool_created_total{alias="default"}'], 4)
+
+    def test_histogram_export(self):
+        for value in (0, 1, 4, 500):
+            metrics.observe('app_request_db_queries', value, view='v', action='list')
+
+        exported = samples(metrics.export())
+        labels = 'action="list",view="v"'
+        self.assertEqual(exported[f'app_request_db_queries_bucket{{{labels},le="0"}}'], 1)
+        self.assertEqual(exported[f'app_request_db_queries_bucket{{{labels},le="3"}}'], 2)
+        self.assertEqual(exported[f'app_request_db_queries_bucket{{{labels},le="5"}}'], 3)
+        self.assertEqual(exported[f'app_request_db_queries_bucket{{{labels},le="200"}}'], 3)
+        self.assertEqual(exported[f'app_request_db_queries_bucket{{{labels},le="+Inf"}}'], 4)
+        self.assertEqual(exported[f'app_request_db_queries_count{{{labels}}}'], 4)
+        self.assertEqual(exported[f'app_request_db_queries_sum{{{labels}}}'], 505)
+
+    def test_label_values_escaped(self):
+        metrics.increment('app_requests_total', view='a"b\\c', action='x', status='2xx')
+
+        self.assertIn('view="a\\"b\\\\c"', metrics.export())
+
+
+class MetricsMiddlewareTests(TestCase):
+
+    def setUp(self):
+        # a store of its own for each test
+        settings_override = override_settings(METRICS={'DIRECTORY': None})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price='1.00')
+
+    def test_request_recorded_per_view_and_action(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        exported = samples(metrics.export())
+        labels = 'action="list",view="recipe:recipe-list"'
+        self.assertEqual(
+            exported['app_requests_total{action="list",status="2xx",view="recipe:recipe-list"}'],
+            1,
+        )
+        self.assertEqual(exported[f'app_request_db_queries_sum{{{labels}}}'], len(queries))
+        self.assertGreater(exported[f'app_request_db_seconds_sum{{{labels}}}'], 0)
+        self.assertGreater(exported[f'app_request_serializer_seconds_sum{{{labels}}}'], 0)
+        self.assertEqual(exported[f'app_response_size_bytes_sum{{{labels}}}'], len(res.content))
+
+    def test_streamed_response_recorded_when_sent(self):
+        res = self.client.get(reverse('recipe:recipe-bulk'))
+
+        labels = 'action="bulk",view="recipe:recipe-bulk"'
+        self.assertNotIn(f'app_request_db_queries_count{{{labels}}}', metrics.export())
+        # the test client closes the response at the end of the content
+        body = b''.join(res.streaming_content)
+
+        exported = samples(metrics.export())
+        self.assertEqual(exported[f'app_request_db_queries_count{{{labels}}}'], 1)
+        self.assertGreater(exported[f'app_request_db_queries_sum{{{labels}}}'], 0)
+        self.assertEqual(exported[f'app_response_size_bytes_sum{{{labels}}}'], len(body))
+
+    def test_unmatched_and_failed_requests(self):
+        self.client.get('/api/no-such-page/')
+        self.client.post(reverse('recipe:recipe-list'), {})
+
+        exported = samples(metrics.export())
+        self.assertEqual(
+            exported['app_requests_total{action="get",status="4xx",view="unmatched"}'], 1
+        )
+        self.assertEqual(
+            exported[
+                'app_requests_total{action="create",status="4xx",view="recipe:recipe-list"}'
+            ],
+            1,
+        )
+
+    @override_settings(METRICS={'ENABLED': False})
+    def test_disabled(self):
+        self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertNotIn('app_requests_total', metrics.export())
+
+    def test_endpoint_requires_admin(self):
+        res = self.client.get(reverse('metrics'))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_endpoint_exports_text_format(self):
+        admin = get_user_model().objects.create_superuser('admin@example.com', 'pass123')
+        self.client.force_authenticate(admin)
+        self.client.get(reverse('recipe:recipe-list'))
+
+        res = self.client.get(reverse('metrics'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE app_request_duration_seconds histogram', res.content.decode())
+
+    def test_endpoint_accepts_admin_token(self):
+        admin = get_user_model().objects.create_superuser('admin@example.com', 'pass123')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=admin).key}')
+
+        res = client.get(reverse('metrics'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -0,0 +1,53 @@
+'''
+    tests the data steps of the core migrations on the rows they exist for
+'''
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicateNamesTests(TransactionTestCase):
+
+    migrate_from = [('core', '0005_recipe_image')]
+    migrate_to = [('core', '0006_user_name_constraints_and_indexes')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('core')
+        self.addCleanup(self.migrate, latest)
+        apps = self.migrate(self.migrate_from)
+
+        User = apps.get_model('core', 'User')
+        Recipe = apps.get_model('core', 'Recipe')
+        user = User.objects.create(email='user@example.com', password='!')
+        self.recipes = []
+        for model_name, field_name in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+            model = apps.get_model('core', model_name)
+            first, second = (model.objects.create(user=user, name='Dinner') for _ in range(2))
+            soup, stew = (
+                Recipe.objects.create(user=user, title=title, time_minutes=5, price='1.00')
+                for title in ('Soup', 'Stew')
+            )
+            getattr(soup, field_name).add(second)
+            getattr(stew, field_name).add(first, second)
+            self.recipes.append((model_name, field_name, first.id, soup.id, stew.id))
+
+    def test_duplicates_folded_into_oldest(self):
+        apps = self.migrate(self.migrate_to)
+
+        Recipe = apps.get_model('core', 'Recipe')
+        for model_name, field_name, kept, soup, stew in self.recipes:
+            model = apps.get_model('core', model_name)
+            self.assertEqual(list(model.objects.values_list('id', flat=True)), [kept])
+            for recipe_id in (soup, stew):
+                self.assertEqual(
+                    list(getattr(Recipe.objects.get(id=recipe_id), field_name).values_list(
+                        'id', flat=True
+                    )),
+                    [kept],
+                )
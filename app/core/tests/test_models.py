@@ -1,4 +1,5 @@
 from decimal import Decimal
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from unittest.mock import patch
@@ -79,6 +80,17 @@ class ModelTests(TestCase):
             name='ing1'
         )
         self.assertEqual(str(ingredient), ingredient.name)
+        
+    def test_tag_and_ingredient_names_unique_per_user(self):
+        user = create_user()
+        other = create_user(email='other@example.com')
+        
+        for model in (models.Tag, models.Ingredient):
+            model.objects.create(user=user, name='Salt')
+            model.objects.create(user=other, name='Salt')
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                model.objects.create(user=user, name='Salt')
+            
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_file_name_uuid(self, mock_uuid):
         uuid = 'test-uuid'
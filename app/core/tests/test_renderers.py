@@ -0,0 +1,227 @@
+'''
+    tests the orjson renderer and parser give the bytes and data of DRF's
+'''
+import datetime
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from io import BytesIO
+from unittest import skipIf
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from core import renderers as fast
+from core.models import Recipe, Tag
+
+
+def payloads():
+    ''' new each call, generators are used up by a render '''
+    return {
+        'none': None,
+        'empty': {},
+        'scalars': [True, False, None, 0, -1, 2 ** 63 - 1, -2 ** 63, 0.1, 1.5, -0.0, ''],
+        'big int': {'id': 2 ** 70},
+        'int keys': {1: 'one', 2: 'two'},
+        'decimal': {'price': Decimal('5.00'), 'tiny': Decimal('0.01'), 'big': Decimal('999.99')},
+        'unicode': {'title': 'Crème brûlée ☃ 🍰', 'quote': 'say "hi"\\n', 'ctrl': '\x00\t\x1f'},
+        'separators': {'text': 'line\u2028paragraph\u2029end'},
+        'urls': {'image': 'http://testserver/media/uploads/recipe/a b/é.jpg?x=1&y=<2>'},
+        'ordered': OrderedDict([('z', 1), ('a', [OrderedDict([('m', 2)])])]),
+        'return types': ReturnDict(
+            {'results': ReturnList([{'id': 1}], serializer=None)}, serializer=None
+        ),
+        'tuple': (1, (2, 3)),
+        'datetimes': {
+            'utc': datetime.datetime(2021, 6, 1, 12, 30, 5, 123456, tzinfo=datetime.timezone.utc),
+            'offset': datetime.datetime(2021, 6, 1, 12, 30, tzinfo=datetime.timezone(
+                datetime.timedelta(hours=5, minutes=30)
+            )),
+            'naive': datetime.datetime(2021, 6, 1, 12, 30, 5, 1),
+            'date': datetime.date(2021, 6, 1),
+            'time': datetime.time(8, 15, 0, 500),
+            'delta': datetime.timedelta(days=1, seconds=5),
+        },
+        'uuid': {'key': uuid.UUID('12345678-1234-5678-1234-567812345678')},
+        'lazy': {'message': gettext_lazy('This field is required.')},
+        'bytes': {'raw': b'abc'},
+        'generator': {'items': (i * i for i in range(4))},
+        'set': {'one': {1}},
+        'nested': [[[[{'deep': [1, {'deeper': None}]}]]]],
+    }
+
+
+@override_settings(FAST_JSON=True)
+@skipIf(fast.orjson is None, 'needs orjson')
+class RendererComplianceTests(SimpleTestCase):
+
+    def render_both(self, name, accepted_media_type=None, renderer_context=None):
+        expected = renderers.JSONRenderer().render(
+            payloads()[name], accepted_media_type, renderer_context
+        )
+        rendered = fast.JSONRenderer().render(
+            payloads()[name], accepted_media_type, renderer_context
+        )
+        return rendered, expected
+
+    def test_same_bytes(self):
+        for name in payloads():
+            with self.subTest(name):
+                rendered, expected = self.render_both(name)
+                self.assertEqual(rendered, expected)
+
+    def test_same_bytes_indented(self):
+        rendered, expected = self.render_both('unicode', 'application/json; indent=4')
+        self.assertEqual(rendered, expected)
+        rendered, expected = self.render_both('ordered', None, {'indent': 2})
+        self.assertEqual(rendered, expected)
+
+    def test_separators_escaped(self):
+        rendered, _ = self.render_both('separators')
+
+        self.assertIn(b'\\u2028', rendered)
+        self.assertNotIn('\u2028'.encode(), rendered)
+
+    def test_same_error(self):
+        for data in ({'object': object()}, {'aware': datetime.time(1, tzinfo=timezone.utc)}):
+            with self.assertRaises(Exception) as expected:
+                renderers.JSONRenderer().render(data)
+            with self.assertRaises(type(expected.exception)) as raised:
+                fast.JSONRenderer().render(data)
+            self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_float_exponent_same_number(self):
+        rendered = fast.JSONRenderer().render([1e16, 1e-7])
+
+        self.assertEqual(rendered, b'[1e16,1e-7]')
+        self.assertEqual(
+            parsers.JSONParser().parse(BytesIO(rendered)),
+            parsers.JSONParser().parse(BytesIO(renderers.JSONRenderer().render([1e16, 1e-7]))),
+        )
+
+    def test_non_finite_floats_as_drf(self):
+        for data in ({'nan': float('nan')}, [1.0, [float('inf')]], {'low': -float('inf')}):
+            with self.subTest(data):
+                with self.assertRaises(ValueError) as expected:
+                    renderers.JSONRenderer().render(data)
+                with self.assertRaises(ValueError) as raised:
+                    fast.JSONRenderer().render(data)
+                self.assertEqual(str(raised.exception), str(expected.exception))
+
+                # STRICT_JSON off, read into the class at import
+                lenient, expected = fast.JSONRenderer(), renderers.JSONRenderer()
+                lenient.strict = expected.strict = False
+                self.assertEqual(lenient.render(data), expected.render(data))
+
+    @override_settings(FAST_JSON=False)
+    def test_switched_off(self):
+        rendered = fast.JSONRenderer().render([1e16])
+
+        self.assertEqual(rendered, b'[1e+16]')
+
+
+@override_settings(FAST_JSON=True)
+@skipIf(fast.orjson is None, 'needs orjson')
+class ParserComplianceTests(SimpleTestCase):
+
+    bodies = [
+        b'{"title":"Cr\xc3\xa8me","price":"5.00","tags":[1,2,3]}',
+        b'  [1, 2.5, -0.0, 1e400, true, null, "\\u2028"]  ',
+        b'{"id": 123456789012345678901234567890}',
+        b'{"id": -9223372036854775809, "ok": 18446744073709551615}',
+        b'{"a": 1, "a": 2}',
+        b'"\\ud800"',
+        b'{"nan": NaN}',
+        b'[Infinity]',
+        b'{"unterminated": ',
+        b'',
+        b'\xef\xbb\xbf{}',
+        b'{"bad utf8": "\xff"}',
+        b'[1,]',
+    ]
+
+    def parse(self, parser, body, parser_context=None):
+        try:
+            return parser.parse(BytesIO(body), 'application/json', parser_context)
+        except ParseError as exc:
+            return ('error', str(exc.detail))
+        except UnicodeDecodeError as exc:
+            return ('decode error', str(exc))
+
+    def test_same_data(self):
+        for body in self.bodies:
+            with self.subTest(body):
+                expected = self.parse(parsers.JSONParser(), body)
+                parsed = self.parse(fast.JSONParser(), body)
+                self.assertEqual(repr(parsed), repr(expected))
+
+    def test_big_ints_exact(self):
+        parsed = fast.JSONParser().parse(BytesIO(self.bodies[2]))
+
+        self.assertEqual(parsed['id'], 123456789012345678901234567890)
+
+    def test_other_encodings(self):
+        body = '{"title": "Crème"}'.encode('latin-1')
+
+        parsed = fast.JSONParser().parse(BytesIO(body), None, {'encoding': 'latin-1'})
+
+        self.assertEqual(parsed, {'title': 'Crème'})
+
+
+@skipIf(fast.orjson is None, 'needs orjson')
+class ApiComplianceTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        recipe = Recipe.objects.create(
+            user=self.user, title='Crème brûlée\u2028', time_minutes=5, price=Decimal('12.30'),
+            link='http://example.com/a b', description='☃',
+        )
+        recipe.image.name = 'uploads/recipe/crème brûlée.jpg'
+        recipe.save()
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Dessert'))
+        self.detail_url = reverse('recipe:recipe-detail', args=[recipe.id])
+
+    def test_same_responses(self):
+        for url in (self.detail_url, reverse('recipe:recipe-list'), reverse('user:me')):
+            with self.subTest(url):
+                with override_settings(FAST_JSON=False):
+                    expected = self.client.get(url)
+                cache.clear()
+                with override_settings(FAST_JSON=True):
+                    res = self.client.get(url)
+                self.assertEqual(res.status_code, expected.status_code)
+                self.assertEqual(res.content, expected.content)
+
+    def test_image_url_and_price(self):
+        with override_settings(FAST_JSON=True):
+            res = self.client.get(self.detail_url)
+
+        self.assertIn(b'"image":"http://testserver/static/media/uploads/recipe/'
+                      b'cr%C3%A8me%20br%C3%BBl%C3%A9e.jpg"', res.content)
+        self.assertIn(b'"price":"12.30"', res.content)
+
+    def test_same_request_data(self):
+        payload = '{"title": "Soup ☃", "time_minutes": 5, "price": "1.50", "tags": []}'
+        created = []
+        for fast_json in (False, True):
+            with override_settings(FAST_JSON=fast_json):
+                res = self.client.post(
+                    reverse('recipe:recipe-list'), payload, content_type='application/json'
+                )
+            created.append((res.status_code, res.data['title'], res.data['price']))
+
+        self.assertEqual(created[0], created[1])
+        self.assertEqual(created[1], (201, 'Soup ☃', '1.50'))
@@ -0,0 +1,103 @@
+'''
+    tests the generated schema files and the view serving them
+'''
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.schema import FILES
+
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class GenerateSchemaTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        call_command('generate_schema', directory=cls.directory, stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        override = override_settings(API_SCHEMA_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def live(self, **headers):
+        with override_settings(DEBUG=True, API_SCHEMA_DIR=None):
+            return self.client.get(SCHEMA_URL, **headers)
+
+    def test_writes_every_format(self):
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted(FILES.values()))
+        with open(os.path.join(self.directory, 'schema.yaml')) as fp:
+            self.assertIn('/api/recipe/recipe/', fp.read())
+
+    def test_same_as_live_schema(self):
+        for headers in ({}, {'HTTP_ACCEPT': 'application/vnd.oai.openapi+json'}):
+            with self.subTest(headers):
+                expected = self.live(**headers)
+
+                res = self.client.get(SCHEMA_URL, **headers)
+
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(res.content, expected.content)
+                self.assertEqual(res['Content-Type'], expected['Content-Type'])
+
+    def test_format_parameter(self):
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(res['Content-Type'], 'application/vnd.oai.openapi+json')
+        self.assertIn('paths', res.json())
+
+    def test_etag_not_modified(self):
+        res = self.client.get(SCHEMA_URL)
+        etag = res['ETag']
+
+        again = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], etag)
+        self.assertEqual(again.content, b'')
+        other = self.client.get(SCHEMA_URL, {'format': 'json'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, 200)
+        self.assertNotEqual(other['ETag'], etag)
+
+    def test_regenerated_files_served(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        shutil.copytree(self.directory, directory, dirs_exist_ok=True)
+        path = os.path.join(directory, 'schema.yaml')
+        with override_settings(API_SCHEMA_DIR=directory):
+            before = self.client.get(SCHEMA_URL)
+            with open(path, 'ab') as fp:
+                fp.write(b'# regenerated\n')
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+
+            after = self.client.get(SCHEMA_URL)
+
+        self.assertTrue(after.content.endswith(b'# regenerated\n'))
+        self.assertNotEqual(after['ETag'], before['ETag'])
+
+    def test_missing_files(self):
+        with override_settings(API_SCHEMA_DIR=tempfile.gettempdir() + '/no-schema-here'):
+            with self.assertRaises(ImproperlyConfigured):
+                self.client.get(SCHEMA_URL)
+            with override_settings(DEBUG=True):
+                res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(res.has_header('ETag'))
@@ -0,0 +1,199 @@
+'''
+    tests the database token buckets and leases and the recipe write
+    limits built on them
+'''
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import metrics, throttling
+from core.models import ConcurrencyLease, Recipe
+from core.tests.test_metrics import samples
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def limited(**rates):
+    return {
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+    }
+
+
+class TokenBucketTests(TestCase):
+
+    def test_burst_then_refill(self):
+        with patch.object(throttling.time, 'time', return_value=1000.0) as now:
+            self.assertEqual(
+                [throttling.take_token('k', 3, 0.5) for _ in range(3)], [None, None, None]
+            )
+            self.assertAlmostEqual(throttling.take_token('k', 3, 0.5), 2.0)
+
+            now.return_value = 1001.0
+            self.assertAlmostEqual(throttling.take_token('k', 3, 0.5), 1.0)
+            now.return_value = 1002.0
+            self.assertIsNone(throttling.take_token('k', 3, 0.5))
+            self.assertIsNotNone(throttling.take_token('k', 3, 0.5))
+
+    def test_refill_capped_at_capacity(self):
+        with patch.object(throttling.time, 'time', return_value=1000.0) as now:
+            throttling.take_token('k', 2, 1.0)
+            now.return_value = 5000.0
+
+            self.assertEqual([throttling.take_token('k', 2, 1.0) for _ in range(2)], [None, None])
+            self.assertIsNotNone(throttling.take_token('k', 2, 1.0))
+
+    def test_keys_independent(self):
+        throttling.take_token('a', 1, 0.01)
+
+        self.assertIsNotNone(throttling.take_token('a', 1, 0.01))
+        self.assertIsNone(throttling.take_token('b', 1, 0.01))
+
+
+class LeaseTests(TestCase):
+
+    def test_slots_limit_holders(self):
+        first = throttling.acquire_lease('k', 2, 60)
+        second = throttling.acquire_lease('k', 2, 60)
+
+        self.assertIsNone(throttling.acquire_lease('k', 2, 60))
+        throttling.release_lease(first)
+        self.assertIsNotNone(throttling.acquire_lease('k', 2, 60))
+        self.assertNotEqual(first, second)
+
+    def test_expired_slot_taken_over(self):
+        with patch.object(throttling.time, 'time', return_value=1000.0) as now:
+            throttling.acquire_lease('k', 1, 60)
+            self.assertIsNone(throttling.acquire_lease('k', 1, 60))
+
+            now.return_value = 1061.0
+            self.assertIsNotNone(throttling.acquire_lease('k', 1, 60))
+
+    def test_released_after_error(self):
+        with self.assertRaises(ValueError):
+            with throttling.lease('k', 1, 60) as acquired:
+                self.assertTrue(acquired)
+                raise ValueError
+
+        self.assertFalse(ConcurrencyLease.objects.exists())
+
+
+class RecipeWriteLimitTests(TestCase):
+
+    def setUp(self):
+        settings_override = override_settings(
+            METRICS={'DIRECTORY': None},
+            REST_FRAMEWORK=limited(recipe_create='2/min', recipe_update='1/min'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, client=None):
+        return (client or self.client).post(
+            RECIPE_URL, {'title': 'Soup', 'time_minutes': 5, 'price': '1.00'}
+        )
+
+    def test_create_limited_per_user(self):
+        for _ in range(2):
+            self.assertEqual(self.create().status_code, status.HTTP_201_CREATED)
+
+        res = self.create()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+        self.assertEqual(Recipe.objects.count(), 2)
+        exported = samples(metrics.export())
+        self.assertEqual(exported['app_throttled_total{scope="recipe_create"}'], 1)
+
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user('other@example.com', 'x'))
+        self.assertEqual(self.create(other).status_code, status.HTTP_201_CREATED)
+
+    def test_put_and_patch_share_a_bucket(self):
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00')
+        )
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+
+        self.assertEqual(self.client.patch(url, {'title': 'Stew'}).status_code,
+                         status.HTTP_200_OK)
+        res = self.client.put(url, {'title': 'Stew', 'time_minutes': 5, 'price': '1.00'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_reads_not_limited(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(RECIPE_URL).status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=limited(recipe_bulk='1/hour'))
+    def test_bulk_import_limited(self):
+        line = b'{"title": "Soup", "time_minutes": 5, "price": "1.00"}'
+        url = reverse('recipe:recipe-bulk')
+
+        def post():
+            return self.client.post(url, line, content_type='application/x-ndjson')
+
+        res = post()
+        b''.join(res.streaming_content)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = post()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(Recipe.objects.count(), 1)
+        exported = samples(metrics.export())
+        self.assertEqual(exported['app_throttled_total{scope="recipe_bulk"}'], 1)
+        # the export shares the action, reads stay unlimited
+        export = self.client.get(url, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(export.status_code, status.HTTP_200_OK)
+        b''.join(export.streaming_content)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), RECIPE_IMAGES={
+    'WORKERS': 0, 'MAX_CONCURRENT_UPLOADS': 1, 'UPLOAD_LEASE_SECONDS': 60,
+})
+class UploadConcurrencyTests(TestCase):
+
+    def setUp(self):
+        settings_override = override_settings(METRICS={'DIRECTORY': None})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00')
+        )
+        self.url = reverse('recipe:recipe-upload-image', args=[recipe.id])
+
+    def upload(self):
+        return self.client.post(
+            self.url, {'image': SimpleUploadedFile('a.png', b'not an image')}, format='multipart'
+        )
+
+    def test_upload_refused_while_slots_taken(self):
+        holder = throttling.acquire_lease(f'upload:{self.user.pk}', 1, 60)
+
+        with patch('recipe.views.measure_upload') as measure:
+            res = self.upload()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        measure.assert_not_called()
+        exported = samples(metrics.export())
+        self.assertEqual(exported['app_throttled_total{scope="recipe_upload_concurrency"}'], 1)
+
+        throttling.release_lease(holder)
+        self.assertEqual(self.upload().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ConcurrencyLease.objects.exists())
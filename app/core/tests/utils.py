@@ -0,0 +1,29 @@
+'''
+    shared helpers for the test suites
+'''
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountMixin:
+    '''
+        assertions about how many SQL queries a block of code runs
+    '''
+
+    def assertConstantQueries(self, add_rows, func, rounds=3):
+        '''
+            calls add_rows then func `rounds` times and asserts func ran the
+            same number of queries each time, however many rows exist
+        '''
+        counts = []
+        for _ in range(rounds):
+            add_rows()
+            with CaptureQueriesContext(connection) as ctx:
+                func()
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(
+            len(set(counts)), 1,
+            f'query count grows with the number of rows: {counts}'
+        )
+        return counts[0]
@@ -0,0 +1,152 @@
+'''
+    rate limits and concurrency caps whose state lives in the database, so
+    every worker process and container counts against the same budget
+
+    a token bucket is one row, refilled and drawn from by a single upsert:
+    the rate of a scope ('60/min') refills it, the request count of the
+    rate is its capacity, the burst a client may send at once. A lease is
+    one row per slot of a concurrency cap, claimed by an upsert that only
+    takes over a free or expired slot
+'''
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.db import connection
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from core import metrics
+from core.models import ConcurrencyLease, ThrottleBucket
+
+
+# buckets untouched for this long have refilled under any DRF rate, up to
+# one a day, so deleting them changes nothing
+IDLE_SECONDS = 24 * 60 * 60
+
+# share of bucket draws that also delete the idle buckets
+PRUNE_PROBABILITY = 0.001
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def take_token(key, capacity, per_second):
+    '''
+        draws a token from the bucket of key, None if there was one, else
+        the seconds until there will be
+    '''
+    table = _table(ThrottleBucket)
+    smallest = 'LEAST' if connection.vendor == 'postgresql' else 'MIN'
+    refilled = (
+        f'{smallest}({table}.tokens + (EXCLUDED.updated - {table}.updated) * %s, %s)'
+    )
+    now = time.time()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ("key", tokens, updated) VALUES (%s, %s, %s) '
+            f'ON CONFLICT ("key") DO UPDATE SET '
+            f'tokens = {refilled} - 1, updated = EXCLUDED.updated '
+            f'WHERE {refilled} >= 1 RETURNING tokens',
+            [key, capacity - 1, now, per_second, capacity, per_second, capacity],
+        )
+        if cursor.fetchone() is not None:
+            if random.random() < PRUNE_PROBABILITY:
+                cursor.execute(f'DELETE FROM {table} WHERE updated < %s', [now - IDLE_SECONDS])
+            return None
+        cursor.execute(f'SELECT tokens, updated FROM {table} WHERE "key" = %s', [key])
+        tokens, updated = cursor.fetchone()
+    tokens = min(tokens + (now - updated) * per_second, capacity)
+    return max(1 - tokens, 0) / per_second
+
+
+def acquire_lease(key, slots, seconds):
+    ''' the holder id of a free slot of key, taken for seconds, or None '''
+    table = _table(ConcurrencyLease)
+    holder = uuid.uuid4().hex
+    now = time.time()
+    with connection.cursor() as cursor:
+        for slot in range(slots):
+            cursor.execute(
+                f'INSERT INTO {table} ("key", holder, expires) VALUES (%s, %s, %s) '
+                f'ON CONFLICT ("key") DO UPDATE SET holder = EXCLUDED.holder, '
+                f'expires = EXCLUDED.expires WHERE {table}.expires < %s RETURNING holder',
+                [f'{key}:{slot}', holder, now + seconds, now],
+            )
+            if cursor.fetchone() is not None:
+                return holder
+    return None
+
+
+def release_lease(holder):
+    ConcurrencyLease.objects.filter(holder=holder).delete()
+
+
+@contextmanager
+def lease(key, slots, seconds):
+    '''
+        whether one of the slots of key was free, held for the block. A
+        worker that dies in the block loses its slot after seconds
+    '''
+    holder = acquire_lease(key, slots, seconds)
+    try:
+        yield holder is not None
+    finally:
+        if holder is not None:
+            release_lease(holder)
+
+
+class CountedThrottleMixin:
+    ''' counts the requests a throttle refuses in app_throttled_total '''
+
+    def allow_request(self, request, view):
+        allowed = super().allow_request(request, view)
+        if not allowed:
+            metrics.increment('app_throttled_total', scope=self.scope)
+        return allowed
+
+
+class UserActionRateThrottle(SimpleRateThrottle):
+    '''
+        a token bucket per user and scope, the scope of the action of the
+        view in its throttle_scopes. Only writes are limited: reads, actions
+        without a scope, scopes without a rate in DEFAULT_THROTTLE_RATES and
+        anonymous requests pass
+    '''
+    retry_after = None
+
+    def __init__(self):
+        # the scope and its rate are only known once there is a view
+        pass
+
+    def get_rate(self):
+        # read per request, SimpleRateThrottle binds the rates at import
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        return f'{self.scope}:{request.user.pk}'
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        if self.scope is None or request.method in SAFE_METHODS:
+            return True
+        if not request.user.is_authenticated:
+            return True
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+
+        num_requests, duration = self.parse_rate(self.rate)
+        self.retry_after = take_token(
+            self.get_cache_key(request, view), num_requests, num_requests / duration
+        )
+        if self.retry_after is None:
+            return True
+        metrics.increment('app_throttled_total', scope=self.scope)
+        return False
+
+    def wait(self):
+        return self.retry_after
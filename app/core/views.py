@@ -0,0 +1,86 @@
+'''
+    operational endpoints of the project
+'''
+import os
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import metrics, schema
+from core.db.backends.postgresql.base import pool_stats
+from user.authentication import CachedTokenAuthentication
+
+
+# API tokens for scrapers and scripts, the logged in admin site session or
+# basic auth for a browser
+HEALTH_AUTHENTICATION = [
+    CachedTokenAuthentication, SessionAuthentication, BasicAuthentication,
+]
+
+
+class DatabasePoolView(APIView):
+    '''
+        saturation of the database connection pools of the worker process
+        that serves the request. waiting and timeouts growing means the
+        pool is too small for the threads that query at once
+    '''
+    authentication_classes = HEALTH_AUTHENTICATION
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses={200: OpenApiTypes.OBJECT})
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'pools': pool_stats()})
+
+
+class MetricsView(APIView):
+    '''
+        request metrics of all the worker processes in the Prometheus text
+        format, for a scraper with an admin's token (authorization type
+        Token in the Prometheus scrape config)
+    '''
+    authentication_classes = HEALTH_AUTHENTICATION
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses={(200, 'text/plain'): OpenApiTypes.STR})
+    def get(self, request):
+        return HttpResponse(
+            metrics.export(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+
+class CachedSchemaView(SpectacularAPIView):
+    '''
+        SpectacularAPIView answering from the files of generate_schema, with
+        an ETag for conditional requests. The files are in the default
+        language whatever lang asks for. Without them the schema is generated
+        per request in DEBUG and is a configuration error otherwise
+    '''
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        loaded = schema.load(renderer.format) if settings.API_SCHEMA_DIR else None
+        if loaded is None:
+            if settings.DEBUG:
+                return super().get(request, *args, **kwargs)
+            raise ImproperlyConfigured(
+                'No generated API schema in API_SCHEMA_DIR, run manage.py generate_schema'
+            )
+
+        content, etag = loaded
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        return get_conditional_response(request, etag=etag, response=response)
@@ -0,0 +1,157 @@
+'''
+    streaming NDJSON (one JSON document per line) import and export of recipes
+
+    both directions work on fixed size chunks so memory stays flat no matter
+    how many recipes are sent or stored
+'''
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+from core.models import Recipe, Tag, Ingredient
+from core.renderers import JSONRenderer
+from recipe.cache import bump_generation
+from recipe.counts import add_links
+from recipe.serializers import RecipeBulkSerializer, get_or_create_by_name
+
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+class NDJSONParser(BaseParser):
+    '''
+        lazily yields (line number, raw line) pairs instead of reading the
+        whole body, the import decodes and validates each line itself
+    '''
+    media_type = NDJSON_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            raise ParseError('Empty request body')
+        return enumerate(stream, 1)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = NDJSON_MEDIA_TYPE
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return JSONRenderer().render(data) + b'\n'
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _decode_line(raw):
+    try:
+        return json.loads(raw), None
+    except ValueError as exc:
+        return None, {'non_field_errors': [f'Invalid JSON: {exc}']}
+
+
+def _link(recipes, field_name, model, user, items_per_recipe):
+    '''
+        links every recipe of a chunk to its tags or ingredients with one
+        name lookup and one through table insert for the whole chunk
+    '''
+    items = [item for recipe_items in items_per_recipe for item in recipe_items]
+    by_name = {
+        obj.name: obj for obj in get_or_create_by_name(model, user, items)
+    }
+    through = getattr(Recipe, field_name).through
+    target = f'{model._meta.model_name}_id'
+    rows = {
+        (recipe.id, by_name[item['name']].id)
+        for recipe, recipe_items in zip(recipes, items_per_recipe)
+        for item in recipe_items
+    }
+    through.objects.bulk_create(
+        [through(recipe_id=recipe_id, **{target: obj_id}) for recipe_id, obj_id in rows]
+    )
+    # bulk_create() sends no m2m_changed
+    add_links(model, [obj_id for _, obj_id in rows])
+
+
+def _save_chunk(user, validated):
+    tags = [data.pop('tags', []) for data in validated]
+    ingredients = [data.pop('ingredients', []) for data in validated]
+    recipes = [Recipe(user=user, **data) for data in validated]
+
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        _link(recipes, 'tags', Tag, user, tags)
+        _link(recipes, 'ingredients', Ingredient, user, ingredients)
+        # bulk_create() sends no post_save either, and the chunks are saved
+        # after the response's own invalidation, while it streams
+        bump_generation(user.pk)
+
+    return recipes
+
+
+def import_recipes(lines, context, chunk_size):
+    '''
+        validates and inserts (line number, raw line) pairs chunk by chunk,
+        every chunk in its own transaction. Yields the per line errors of
+        each chunk once it is committed, then a summary of the import
+    '''
+    user = context['request'].user
+    created = failed = 0
+
+    for chunk in _chunks(lines, chunk_size):
+        validated = []
+        errors = []
+        for lineno, raw in chunk:
+            if not raw.strip():
+                continue
+            data, error = _decode_line(raw)
+            if error is None:
+                serializer = RecipeBulkSerializer(data=data, context=context)
+                if serializer.is_valid():
+                    validated.append(serializer.validated_data)
+                    continue
+                error = serializer.errors
+            errors.append({'line': lineno, 'errors': error})
+
+        if validated:
+            created += len(_save_chunk(user, validated))
+        failed += len(errors)
+        yield from errors
+
+    yield {'created': created, 'failed': failed}
+
+
+def export_recipes(queryset, context, chunk_size):
+    '''
+        yields one encoded line per recipe, reading the queryset in keyset
+        ordered chunks so only one chunk is held in memory at a time
+    '''
+    queryset = queryset.order_by('-id')
+    renderer = NDJSONRenderer()
+    last_id = None
+
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(id__lt=last_id)
+        recipes = list(chunk[:chunk_size])
+        if not recipes:
+            return
+        for recipe in recipes:
+            data = RecipeBulkSerializer(recipe, context=context).data
+            yield renderer.render(data)
+        last_id = recipes[-1].id
@@ -0,0 +1,179 @@
+'''
+    read-through response cache for the recipe app read endpoints
+
+    every cache key embeds a per user generation number, any write by the
+    user bumps it, which orphans all of their cached responses at once
+    instead of searching for keys to delete
+'''
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+
+def _options():
+    return {**DEFAULTS, **getattr(settings, 'RECIPE_RESPONSE_CACHE', {})}
+
+
+def _cache():
+    return caches[_options()['ALIAS']]
+
+
+def _generation_key(user_id):
+    return f'recipe-api:generation:{user_id}'
+
+
+def get_generation(user_id):
+    key = _generation_key(user_id)
+    cache = _cache()
+    generation = cache.get(key)
+    if generation is None:
+        # seeded from the clock rather than 1 so an evicted counter can't
+        # come back at a value older entries were stored under
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id):
+    '''
+        invalidates every cached response of the user, now and again when
+        the surrounding transaction commits so a read that raced the write
+        can't stay cached
+    '''
+    def bump():
+        cache = _cache()
+        try:
+            cache.incr(_generation_key(user_id))
+        except ValueError:
+            cache.add(_generation_key(user_id), time.time_ns(), None)
+
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def _deleted_key(user_id):
+    return f'recipe-api:deleted:{user_id}'
+
+
+def mark_deleted(user_id):
+    ''' records that a recipe of the user was deleted, now and on commit '''
+    def mark():
+        _cache().set(_deleted_key(user_id), time.time(), None)
+
+    mark()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(mark)
+
+
+def last_deleted(user_id):
+    '''
+        unix time a recipe of the user was last deleted, the current time
+        when the record was evicted, deletes leave no updated_at behind
+    '''
+    cache = _cache()
+    cache.add(_deleted_key(user_id), time.time(), None)
+    return cache.get(_deleted_key(user_id))
+
+
+def _not_modified(request, last_modified):
+    '''
+        If-Modified-Since covers last_modified. If-None-Match takes
+        precedence, it is only looked at without one
+    '''
+    if last_modified is None or 'If-None-Match' in request.headers:
+        return False
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(last_modified) <= since
+
+
+class CachedResponseMixin:
+    '''
+        caches the data of list and retrieve responses per user, generation
+        and normalized request, answering If-None-Match with 304 before
+        touching the database or the serializer. Views with a
+        get_last_modified() also send Last-Modified and answer
+        If-Modified-Since with 304 without running the serializer
+    '''
+    cached_actions = ('list', 'retrieve')
+
+    def get_last_modified(self, request):
+        ''' unix time the response of request last changed, None if unknown '''
+        return None
+
+    def _response_cache_key(self, request):
+        params = sorted(
+            (key, value) for key in request.query_params
+            for value in request.query_params.getlist(key)
+        )
+        parts = [
+            request.user.pk, get_generation(request.user.pk),
+            request.scheme, request.get_host(),
+            self.basename, self.action, self.kwargs.get('pk'), params,
+        ]
+        digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+        # v2 entries are (data, last modified) pairs
+        return f'recipe-api:response:v2:{digest}', digest
+
+    def _cached_response(self, request, *args, handler, **kwargs):
+        key, digest = self._response_cache_key(request)
+        etag = f'W/"{digest}"'
+
+        # weak comparison, clients may send the tag with or without W/
+        if f'"{digest}"' in request.headers.get('If-None-Match', ''):
+            response, last_modified = Response(status=status.HTTP_304_NOT_MODIFIED), None
+        else:
+            cache = _cache()
+            # the time is read before the data, a write in between makes
+            # it too old rather than too new
+            data, last_modified = cache.get(key) or (None, self.get_last_modified(request))
+            if _not_modified(request, last_modified):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            elif data is not None:
+                response = Response(data)
+            else:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, (response.data, last_modified), _options()['TIMEOUT'])
+
+        response['ETag'] = etag
+        # a second granular date is only a validator once that second is
+        # over, a later write in it would carry the same date
+        if last_modified is not None and time.time() - last_modified >= 1:
+            response['Last-Modified'] = http_date(last_modified)
+        # responses depend on who is asking, keep them out of shared caches
+        patch_vary_headers(response, ['Authorization'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # authenticated by now, route the action through the cache
+        if self.action in self.cached_actions:
+            method = request.method.lower()
+            handler = getattr(self, method)
+            setattr(self, method, partial(self._cached_response, handler=handler))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # any successful write (create, update, destroy, image upload, bulk
+        # import) may change what the user's reads return
+        succeeded = response.status_code < 400
+        if request.method not in SAFE_METHODS and succeeded and request.user.is_authenticated:
+            bump_generation(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,56 @@
+'''
+    recipe_count of tags and ingredients, the number of recipes linked to
+    each. recipe.signals keeps it up to date on link changes made through
+    the ORM's m2m managers and on recipe deletes, writers that insert
+    through rows in bulk call add_links() themselves. recount() repairs
+    drift from raw SQL or writes that bypassed both
+'''
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.cache import bump_generation
+
+
+# counted model -> Recipe m2m field linking to it
+COUNTED = {Tag: 'tags', Ingredient: 'ingredients'}
+
+
+def through_column(model):
+    ''' the through model of the links to model and its column for model '''
+    return getattr(Recipe, COUNTED[model]).through, f'{model._meta.model_name}_id'
+
+
+def add_links(model, pks, amount=1):
+    '''
+        adds amount to the count of every pk of model, as many times as it
+        occurs in pks, with one UPDATE per distinct total
+    '''
+    by_total = defaultdict(list)
+    for pk, occurrences in Counter(pks).items():
+        by_total[occurrences * amount].append(pk)
+    for total, group in by_total.items():
+        if total:
+            model.objects.filter(pk__in=group).update(recipe_count=F('recipe_count') + total)
+
+
+def recount(model, queryset=None):
+    '''
+        fixes the counts of queryset (every model row) that drifted and
+        drops the cached responses of their owners, returns how many
+    '''
+    through, column = through_column(model)
+    actual = Coalesce(Subquery(
+        through.objects.filter(**{column: OuterRef('pk')})
+        .values(column).annotate(total=Count('*')).values('total')
+    ), Value(0))
+    if queryset is None:
+        queryset = model.objects.all()
+    drifted = queryset.annotate(actual=actual).exclude(recipe_count=F('actual'))
+    owners = set(drifted.values_list('user_id', flat=True).distinct())
+    fixed = model.objects.filter(pk__in=drifted.values('pk')).update(recipe_count=actual)
+    for user_id in owners:
+        bump_generation(user_id)
+    return fixed
@@ -0,0 +1,178 @@
+'''
+    list responses of a recipe serializer assembled from values() rows, for
+    RECIPE_FAST_LIST
+
+    DRF builds a model instance per row and runs the to_representation of
+    every field on it, price going through a Decimal. Here the fields of
+    the serializer are compiled once into accessors on the row dicts:
+    values the database returns in their JSON form already are copied as
+    they are, nested tags and ingredients come from one query per relation.
+    The JSON is the same as the serializer's
+'''
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from rest_framework import fields as drf_fields, serializers
+from rest_framework.settings import api_settings
+
+from core.metrics import timed_serialization
+
+
+# serializer field -> model fields whose values it renders unchanged
+_PASSTHROUGH = {
+    drf_fields.CharField: {'CharField', 'TextField'},
+    drf_fields.IntegerField: {
+        'AutoField', 'BigAutoField', 'IntegerField', 'SmallIntegerField',
+        'BigIntegerField', 'PositiveIntegerField', 'PositiveSmallIntegerField',
+    },
+    drf_fields.BooleanField: {'BooleanField'},
+}
+
+
+def _decimal_as_text(field, vendor):
+    # the text of a numeric column on Postgres keeps the column's scale,
+    # '5.00' for 5 in a decimal_places=2 column, as DecimalField renders it
+    if vendor != 'postgresql' or type(field) is not drf_fields.DecimalField:
+        return False
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    return coerce_to_string and not field.localize
+
+
+class Unsupported(Exception):
+    ''' a field of the serializer can't be rendered from values() rows '''
+
+
+def _compile_field(field, model, vendor):
+    ''' (values() column, expression or None, convert or None) of a field '''
+    # file URLs are built from the request and method fields run on instances
+    if isinstance(field, drf_fields.FileField) or field.source == '*':
+        raise Unsupported(field.field_name)
+    model_field = model._meta.get_field(field.source)
+    if _decimal_as_text(field, vendor):
+        return f'_fast_{field.source}', Cast(field.source, TextField()), None
+    if model_field.get_internal_type() in _PASSTHROUGH.get(type(field), ()):
+        return model_field.attname, None, None
+    return model_field.attname, None, field.to_representation
+
+
+class FastListSerializer:
+    '''
+        serialize() of the values() rows of a queryset gives the data of
+        serializer_class(queryset, many=True). Fields may be model fields,
+        nested many=True serializers of many to many fields and many=True
+        primary key fields of them. Others raise Unsupported
+    '''
+
+    def __init__(self, serializer_class, vendor):
+        model = serializer_class.Meta.model
+        self.pk = model._meta.pk.attname
+        # (key, column, convert, relation) in the order of the output keys
+        self.fields = []
+        self.relations = {}
+        self.expressions = {}
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+                self.relations[name] = self._compile_relation(field, model, vendor)
+                self.fields.append((name, self.pk, None, name))
+                continue
+            column, expression, convert = _compile_field(field, model, vendor)
+            if expression is not None:
+                self.expressions[column] = expression
+            self.fields.append((name, column, convert, None))
+
+        self.columns = list(dict.fromkeys(
+            [self.pk] + [column for _, column, _, _ in self.fields
+                         if column not in self.expressions]
+        ))
+
+    def _compile_relation(self, field, model, vendor):
+        model_field = model._meta.get_field(field.source)
+        target = model_field.m2m_reverse_field_name()
+        if isinstance(field, serializers.ManyRelatedField):
+            # the ids straight from the m2m table, None for a bare id list
+            return model_field.remote_field.through, model_field.m2m_field_name(), target, None
+        child_model = field.child.Meta.model
+        child_fields = []
+        for name, child in field.child.fields.items():
+            if child.write_only:
+                continue
+            column, expression, convert = _compile_field(child, child_model, vendor)
+            if expression is not None:
+                # nested rows are read through the m2m table
+                column, convert = child.source, child.to_representation
+            child_fields.append((name, f'{target}__{column}', convert))
+        return (
+            model_field.remote_field.through,
+            model_field.m2m_field_name(),
+            target,
+            child_fields,
+        )
+
+    def values(self, queryset, *extra):
+        ''' the rows to serialize, extra columns stay out of the data '''
+        return queryset.values(*self.columns, *extra, **self.expressions)
+
+    def serialize(self, rows):
+        return timed_serialization(self._serialize, rows)
+
+    def _serialize(self, rows):
+        rows = list(rows)
+        ids = [row[self.pk] for row in rows]
+        related = {
+            name: self._related(relation, ids) for name, relation in self.relations.items()
+        }
+
+        data = []
+        for row in rows:
+            item = {}
+            for key, column, convert, relation in self.fields:
+                value = row[column]
+                if relation is not None:
+                    item[key] = related[relation].get(value, [])
+                elif convert is None or value is None:
+                    item[key] = value
+                else:
+                    item[key] = convert(value)
+            data.append(item)
+        return data
+
+    def _related(self, relation, ids):
+        ''' nested items by parent id, ordered by id like the eager loading prefetch '''
+        through, source, target, child_fields = relation
+        if not ids:
+            return {}
+        links = through.objects.filter(**{f'{source}_id__in': ids}).order_by(f'{target}_id')
+
+        grouped = {}
+        if child_fields is None:
+            for parent, target_id in links.values_list(f'{source}_id', f'{target}_id'):
+                grouped.setdefault(parent, []).append(target_id)
+            return grouped
+
+        links = links.values_list(f'{source}_id', *(column for _, column, _ in child_fields))
+        for parent, *values in links:
+            item = {}
+            for (key, _, convert), value in zip(child_fields, values):
+                item[key] = value if convert is None or value is None else convert(value)
+            grouped.setdefault(parent, []).append(item)
+        return grouped
+
+
+@lru_cache(maxsize=None)
+def _compiled(serializer_class, vendor):
+    try:
+        return FastListSerializer(serializer_class, vendor)
+    except Unsupported:
+        return None
+
+
+def fast_list_serializer(serializer_class):
+    '''
+        compiled once per serializer class and database vendor, None for
+        serializers with fields it can't render
+    '''
+    return _compiled(serializer_class, connection.vendor)
@@ -0,0 +1,177 @@
+'''
+    resized variants of uploaded recipe images, generated off the request
+    thread by an in-process worker pool so upload_image returns as soon as
+    the original is stored
+'''
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from core.models import Recipe
+from recipe.cache import bump_generation
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # 0 runs the work inline once the upload commits, for tests and
+    # environments that don't allow threads
+    'WORKERS': 2,
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'VARIANTS': {
+        'thumbnail': (200, 200),
+        'medium': (800, 800),
+    },
+    # upload guards, see recipe.uploads
+    'MAX_UPLOAD_SIZE': 10 * 1024 * 1024,
+    'MAX_PIXELS': 40_000_000,
+    # uploads a user may have in flight across all workers, and how long
+    # the slot of a worker that died mid upload stays taken
+    'MAX_CONCURRENT_UPLOADS': 2,
+    'UPLOAD_LEASE_SECONDS': 120,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def image_options():
+    return {**DEFAULTS, **getattr(settings, 'RECIPE_IMAGES', {})}
+
+
+def _get_executor():
+    # created on first use, after uwsgi has forked its workers
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=image_options()['WORKERS'],
+                thread_name_prefix='recipe-images'
+            )
+        return _executor
+
+
+def _reset_executor(setting, **kwargs):
+    global _executor
+    if setting == 'RECIPE_IMAGES':
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown(wait=True)
+            _executor = None
+
+
+setting_changed.connect(_reset_executor)
+
+
+def _output_format():
+    image_format = image_options()['FORMAT'].upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def _variant_path(image_name, variant, image_format):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    ext = 'jpg' if image_format == 'JPEG' else image_format.lower()
+    return os.path.join('uploads', 'recipe', 'variants', f'{stem}-{variant}.{ext}')
+
+
+def render_variants(source, variants, image_format, quality):
+    '''
+        yields (name, encoded bytes) for every variant of the image in
+        `source`. Nothing but pixels is written back, EXIF, XMP and ICC
+        metadata of the upload are dropped
+    '''
+    with Image.open(source) as img:
+        # JPEG can decode straight at a fraction of the size, big photos
+        # never get decoded at full resolution
+        img.draft('RGB', max(variants.values()))
+        # orientation lives in the EXIF data that's about to be stripped
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ('RGBA', 'LA') or 'transparency' in img.info
+        img = img.convert('RGBA' if has_alpha and image_format != 'JPEG' else 'RGB')
+
+        for name, size in variants.items():
+            variant = img.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            buffer = BytesIO()
+            variant.save(buffer, format=image_format, quality=quality, optimize=True)
+            yield name, buffer.getvalue()
+
+
+def generate_variants(recipe_id, image_name):
+    '''
+        writes every variant of the recipe's image and records their paths,
+        unless the recipe got another image in the meantime
+    '''
+    try:
+        options = image_options()
+        image_format = _output_format()
+        with default_storage.open(image_name) as source:
+            rendered = list(render_variants(
+                source, options['VARIANTS'], image_format, options['QUALITY']
+            ))
+
+        paths = {}
+        for name, data in rendered:
+            path = _variant_path(image_name, name, image_format)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            paths[name] = default_storage.save(path, ContentFile(data))
+
+        # update() rather than save() so a concurrent edit of other
+        # columns isn't overwritten, it sends no signal so bump explicitly
+        recipe = Recipe.objects.filter(pk=recipe_id, image=image_name)
+        user_id = recipe.values_list('user_id', flat=True).first()
+        if user_id is None or not recipe.update(image_variants=paths, updated_at=timezone.now()):
+            for path in paths.values():
+                default_storage.delete(path)
+            return
+        bump_generation(user_id)
+    except Exception:
+        logger.exception('image variants of recipe %s failed', recipe_id)
+
+
+def _run_in_worker(recipe_id, image_name):
+    # pool threads outlive requests, give them the same connection
+    # housekeeping the request cycle does
+    close_old_connections()
+    try:
+        generate_variants(recipe_id, image_name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(recipe):
+    '''
+        queues variant generation for the recipe's current image once the
+        surrounding transaction commits
+    '''
+    recipe_id, image_name = recipe.pk, recipe.image.name
+
+    def submit():
+        if image_options()['WORKERS']:
+            _get_executor().submit(_run_in_worker, recipe_id, image_name)
+        else:
+            generate_variants(recipe_id, image_name)
+
+    transaction.on_commit(submit)
+
+
+def variant_urls(recipe, request=None):
+    urls = {}
+    for name, path in (recipe.image_variants or {}).items():
+        url = default_storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,59 @@
+'''
+    keyset (cursor) pagination for the recipe app list endpoints
+
+    the cursor encodes the last seen value of the ordering column, so every
+    page is a `WHERE <column> < <cursor> ORDER BY ... LIMIT n` query and deep
+    pages cost the same as the first one
+'''
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad
+from rest_framework.pagination import CursorPagination
+
+
+class BaseCursorPagination(CursorPagination):
+    page_size = 25
+    page_size_query_param = 'page_size'
+    # hard upper bound on the rows loaded and serialized for a single page
+    max_page_size = 100
+
+
+class RecipeCursorPagination(BaseCursorPagination):
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        # ranked search results page on relevance, the cursor then carries
+        # the last rank and the offset among rows that share it
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(BaseCursorPagination):
+    '''
+        the cursor only filters on the first ordering column and skips the
+        rows sharing its value by OFFSET, which grows with every page of
+        ties. Counts tie a lot, so they page on count_position, the count
+        and the name in one string that is unique per user: the cursor is a
+        keyset on (recipe_count, name)
+    '''
+    ordering = '-name'
+    # ?ordering= values
+    orderings = {
+        'name': ('name',),
+        '-name': ('-name',),
+        'recipe_count': ('count_position',),
+        '-recipe_count': ('-count_position',),
+    }
+    # zero padded to sort as numbers, wide enough for any count
+    COUNT_DIGITS = 10
+
+    def get_ordering(self, request, queryset, view):
+        return self.orderings.get(request.query_params.get('ordering'), (self.ordering,))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if 'count_position' in self.get_ordering(request, queryset, view)[0]:
+            queryset = queryset.annotate(count_position=Concat(
+                LPad(Cast('recipe_count', CharField()), self.COUNT_DIGITS, Value('0')),
+                Value(' '), 'name', output_field=CharField(),
+            ))
+        return super().paginate_queryset(queryset, request, view)
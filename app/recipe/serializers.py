@@ -1,74 +1,181 @@
 
+from functools import lru_cache
+
+from django.db.models import Prefetch
 from rest_framework import serializers
+from core.metrics import TimedSerializerMixin
 from core.models import Recipe, Tag, Ingredient
+from recipe.images import variant_urls
+from recipe.uploads import GuardedImageField
+
+
+def get_or_create_by_name(model, user, items):
+    '''
+        batched get_or_create for tag like models: resolves every name with
+        one lookup and creates the missing rows with a single bulk insert.
+        Rows a concurrent writer inserted first are skipped by the
+        (user, name) unique constraint and picked up by the second lookup
+    '''
+    names = list(dict.fromkeys(item['name'] for item in items))
+    if not names:
+        return []
+    
+    queryset = model.objects.filter(user=user)
+    found = {obj.name: obj for obj in queryset.filter(name__in=names)}
+    missing = [name for name in names if name not in found]
+    if missing:
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True
+        )
+        found.update(
+            (obj.name, obj) for obj in queryset.filter(name__in=missing)
+        )
+    
+    return [found[name] for name in names]
+
+
+class EagerLoadingMixin:
+    '''
+        shapes a queryset for the serializer so that serializing any number
+        of rows costs a fixed number of queries: only() the model columns the
+        serializer reads and prefetch every nested many relation, of only
+        the ids for relations rendered as lists of ids
+    '''
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        only = ['user']
+        prefetches = []
+        for name in cls.Meta.fields:
+            field = cls._declared_fields.get(name)
+            if isinstance(field, serializers.ListSerializer):
+                child_meta = field.child.Meta
+                # ordered, so recipe.fast lists them the same way
+                prefetches.append(Prefetch(
+                    name,
+                    queryset=child_meta.model.objects.only(*child_meta.fields).order_by('id')
+                ))
+            elif isinstance(field, serializers.ManyRelatedField):
+                related = cls.Meta.model._meta.get_field(name).related_model
+                prefetches.append(Prefetch(
+                    name, queryset=related.objects.only('id').order_by('id')
+                ))
+            else:
+                only.append(name)
+        return queryset.only(*only).prefetch_related(*prefetches)
+
+
+@lru_cache(maxsize=None)
+def sparse_serializer(serializer_class, fields, expand):
+    '''
+        subclass of serializer_class with only fields, a tuple of its field
+        names. Nested many relations among them that aren't in expand
+        render as lists of ids
+    '''
+    nested = {
+        name for name, field in serializer_class._declared_fields.items()
+        if isinstance(field, serializers.ListSerializer)
+    }
+    declared = {
+        name: serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+        for name in fields if name in nested and name not in expand
+    }
+    meta = type('Meta', (serializer_class.Meta,), {'fields': list(fields)})
+    return type(
+        f'Sparse{serializer_class.__name__}', (serializer_class,), {**declared, 'Meta': meta}
+    )
 
 
+class UniqueNameMixin:
+    '''
+        refuses a name the user already gave another row, the (user, name)
+        unique constraint DRF builds no validator for. Nested in a recipe a
+        name picks or creates a row instead, so it is not checked there
+    '''
 
-class IngredientSerializer(serializers.ModelSerializer):
+    def validate_name(self, name):
+        if self.parent is not None:
+            return name
+        queryset = self.Meta.model.objects.filter(user=self.context['request'].user, name=name)
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if queryset.exists():
+            raise serializers.ValidationError(
+                f'{self.Meta.model._meta.verbose_name} with this name already exists.'
+            )
+        return name
+
+
+class IngredientSerializer(UniqueNameMixin, TimedSerializerMixin, serializers.ModelSerializer):
     
     class Meta:
         model = Ingredient
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
         
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(UniqueNameMixin, TimedSerializerMixin, serializers.ModelSerializer):
     
     class Meta:
         model = Tag
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
+
+# nested in recipes without recipe_count, which changes with other recipes
+class RecipeIngredientSerializer(IngredientSerializer):
+    
+    class Meta(IngredientSerializer.Meta):
         fields = ['id', 'name']
-        read_only_fields = ['id']
 
-class RecipeSerializer(serializers.ModelSerializer):
+
+class RecipeTagSerializer(TagSerializer):
+    
+    class Meta(TagSerializer.Meta):
+        fields = ['id', 'name']
+
+
+class RecipeSerializer(TimedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer):
    
     # nested serializers are by default read only 
-    tags = TagSerializer(many=True, required=False)
-    ingredients = IngredientSerializer(many=True, required=False)
+    tags = RecipeTagSerializer(many=True, required=False)
+    ingredients = RecipeIngredientSerializer(many=True, required=False)
     class Meta:
         model = Recipe
         fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
         read_only_fields = ['id']
         
         
-    def _get_or_create_tags(self, tags, recipe):
+    def _get_or_create_tags(self, tags):
         auth_user = self.context['request'].user
+        return get_or_create_by_name(Tag, auth_user, tags)
         
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag
-            )
-            recipe.tags.add(tag_obj)
-        
-    def _get_or_create_ingredients(self, ingredients, recipe):
+    def _get_or_create_ingredients(self, ingredients):
         auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, create = Ingredient.objects.get_or_create(
-            user=auth_user,
-            **ingredient   
-            ) 
-            recipe.ingredients.add(ingredient_obj)
-            
+        return get_or_create_by_name(Ingredient, auth_user, ingredients)
     
     def create(self, validated_data):
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        if tags:
+            recipe.tags.add(*self._get_or_create_tags(tags))
+        if ingredients:
+            recipe.ingredients.add(*self._get_or_create_ingredients(ingredients))
         return recipe
     
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         
+        # set() diffs against the current links, so only the removed and
+        # added through rows are touched
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_tags(tags))
         
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(self._get_or_create_ingredients(ingredients))
             
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -76,16 +183,35 @@ class RecipeSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
         
-class RecipeDetailSerializer(RecipeSerializer):
+class ImageVariantsMixin(serializers.Serializer):
+    ''' absolute URLs of the resized copies of the recipe image '''
+    image_variants = serializers.SerializerMethodField()
+    
+    def get_image_variants(self, recipe) -> dict:
+        return variant_urls(recipe, self.context.get('request'))
+
+
+class RecipeDetailSerializer(ImageVariantsMixin, RecipeSerializer):
     
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_variants', 'created_at', 'updated_at',
+        ]
         
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeBulkSerializer(RecipeSerializer):
+    ''' one line of the NDJSON import and export '''
+    
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['description']
+
+
+class RecipeImageSerializer(
+    TimedSerializerMixin, ImageVariantsMixin, EagerLoadingMixin, serializers.ModelSerializer
+):
+    image = GuardedImageField()
+    
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields = ['id']
-        
-        extra_kwargs = {'image' : {'required' : 'True'}}
\ No newline at end of file
+        fields = ['id', 'image', 'image_variants']
+        read_only_fields = ['id']
\ No newline at end of file
@@ -0,0 +1,98 @@
+'''
+    invalidates cached recipe app responses on every model level write,
+    including admin edits and ORM writes outside the API, keeps the
+    recipe_count of tags and ingredients up to date (see recipe.counts)
+    and moves the updated_at of recipes whose tags or ingredients change
+'''
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_generation, mark_deleted
+from recipe.counts import COUNTED, add_links, through_column
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_owner(sender, instance, **kwargs):
+    bump_generation(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_links(sender, instance, action, **kwargs):
+    if action.startswith('post_'):
+        bump_generation(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def track_links(sender, instance, action, reverse, model, pk_set, **kwargs):
+    counted = type(instance) if reverse else model
+    _, column = through_column(counted)
+    own, other = (column, 'recipe_id') if reverse else ('recipe_id', column)
+
+    if action == 'post_add' and pk_set:
+        # pk_set holds only the links add() inserted
+        if reverse:
+            add_links(counted, [instance.pk], len(pk_set))
+            touch(pk_set)
+        else:
+            add_links(counted, pk_set)
+            touch([instance.pk])
+    elif action in ('pre_remove', 'pre_clear'):
+        # pk_set of remove() may name pks that aren't linked, the rows about
+        # to be deleted are counted instead. Locked, so a concurrent remove
+        # of the same links waits and finds them gone
+        links = sender.objects.filter(**{own: instance.pk})
+        if pk_set is not None:
+            links = links.filter(**{f'{other}__in': pk_set})
+        linked = list(links.select_for_update().values_list(other, flat=True))
+        if reverse:
+            add_links(counted, [instance.pk], -len(linked))
+            touch(linked)
+        elif linked:
+            add_links(counted, linked, -1)
+            touch([instance.pk])
+
+
+def touch(recipe_ids):
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_linked_recipes(sender, instance, created=False, **kwargs):
+    # a rename or delete changes the recipes that show the tag
+    if not created:
+        touch(instance.recipe_set.values('pk'))
+
+
+@receiver(pre_delete, sender=Recipe)
+def uncount_recipe(sender, instance, **kwargs):
+    # the cascade deletes the through rows without m2m_changed
+    for model in COUNTED:
+        through, column = through_column(model)
+        linked = through.objects.filter(recipe_id=instance.pk).select_for_update()
+        add_links(model, linked.values_list(column, flat=True), -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def record_delete(sender, instance, **kwargs):
+    # the list's Last-Modified, a deleted recipe has no updated_at left
+    mark_deleted(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_new_user(sender, instance, created, **kwargs):
+    # a new account never inherits responses cached under a reused id
+    if created:
+        bump_generation(instance.pk)
@@ -0,0 +1,193 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.views import RecipeViewSet
+
+BULK_URL = reverse('recipe:recipe-bulk')
+RECIPE_URL = reverse('recipe:recipe-list')
+NDJSON = 'application/x-ndjson'
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    return get_user_model().objects.create_user(email, password)
+
+
+def to_ndjson(rows):
+    return '\n'.join(json.dumps(row) for row in rows).encode()
+
+
+def from_ndjson(res):
+    body = b''.join(res.streaming_content).decode()
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def recipe_payload(i, **params):
+    payload = {
+        'title': f'recipe {i}',
+        'time_minutes': 10 + i,
+        'price': '4.50',
+        'description': f'description {i}',
+        'tags': [{'name': 'Dinner'}],
+        'ingredients': [{'name': f'ing {i}'}, {'name': 'Salt'}],
+    }
+    payload.update(params)
+    return payload
+
+
+class PublicBulkApiTests(TestCase):
+
+    def test_auth_required(self):
+        res = APIClient().get(BULK_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateBulkApiTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _import(self, rows, body=None):
+        return self.client.post(
+            BULK_URL, body if body is not None else to_ndjson(rows),
+            content_type=NDJSON, HTTP_ACCEPT=NDJSON
+        )
+
+    def test_import_recipes(self):
+        res = self._import([recipe_payload(i) for i in range(3)])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(from_ndjson(res), [{'created': 3, 'failed': 0}])
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 4)
+        recipe = recipes.get(title='recipe 1')
+        self.assertEqual(recipe.description, 'description 1')
+        self.assertEqual(recipe.price, Decimal('4.50'))
+        self.assertEqual(
+            set(recipe.ingredients.values_list('name', flat=True)),
+            {'ing 1', 'Salt'}
+        )
+
+    def test_import_reuses_existing_tags(self):
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+
+        from_ndjson(self._import([recipe_payload(0)]))
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(list(recipe.tags.all()), [tag])
+
+    def test_import_reports_errors_per_line(self):
+        rows = [
+            recipe_payload(0),
+            recipe_payload(1, time_minutes='soon'),
+            recipe_payload(2),
+        ]
+        body = to_ndjson(rows) + b'\n\n{not json}\n'
+
+        res = self._import(rows, body=body)
+
+        lines = from_ndjson(res)
+        self.assertEqual([line.get('line') for line in lines[:-1]], [2, 5])
+        self.assertIn('time_minutes', lines[0]['errors'])
+        self.assertEqual(lines[-1], {'created': 2, 'failed': 2})
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_import_runs_in_chunks(self):
+        chunk_size = RecipeViewSet.bulk_chunk_size
+        RecipeViewSet.bulk_chunk_size = 2
+        self.addCleanup(setattr, RecipeViewSet, 'bulk_chunk_size', chunk_size)
+
+        res = self._import([recipe_payload(i) for i in range(5)])
+
+        self.assertEqual(from_ndjson(res), [{'created': 5, 'failed': 0}])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+
+    def test_import_streams_errors_per_chunk(self):
+        chunk_size = RecipeViewSet.bulk_chunk_size
+        RecipeViewSet.bulk_chunk_size = 2
+        self.addCleanup(setattr, RecipeViewSet, 'bulk_chunk_size', chunk_size)
+        rows = [recipe_payload(i) for i in range(5)]
+        rows[1]['time_minutes'] = 'soon'
+
+        lines = self._import(rows).streaming_content
+
+        self.assertEqual(json.loads(next(lines))['line'], 2)
+        # the error of the first chunk is sent before the next one is read
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(json.loads(b''.join(lines)), {'created': 4, 'failed': 1})
+
+    def test_import_invalidates_cached_lists(self):
+        chunk_size = RecipeViewSet.bulk_chunk_size
+        RecipeViewSet.bulk_chunk_size = 2
+        self.addCleanup(setattr, RecipeViewSet, 'bulk_chunk_size', chunk_size)
+        Recipe.objects.create(user=self.user, title='old', time_minutes=1, price=Decimal('1.00'))
+        
+        lines = self._import([recipe_payload(i) for i in range(5)]).streaming_content
+        # read while the import is still to stream, the list is cached. The
+        # bulk insert sends no post_save, SQLite's row by row saves would
+        self.assertEqual(len(self.client.get(RECIPE_URL).data['results']), 1)
+        b''.join(lines)
+        
+        res = self.client.get(RECIPE_URL)
+        
+        self.assertEqual(len(res.data['results']), 6)
+    
+    def test_export_recipes(self):
+        from_ndjson(self._import([recipe_payload(i) for i in range(3)]))
+        other = create_user(email='other@example.com')
+        Recipe.objects.create(
+            user=other, title='other', time_minutes=1, price=Decimal('1.00')
+        )
+
+        res = self.client.get(BULK_URL, HTTP_ACCEPT=NDJSON)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], NDJSON)
+        lines = from_ndjson(res)
+        self.assertEqual(
+            [line['title'] for line in lines],
+            ['recipe 2', 'recipe 1', 'recipe 0']
+        )
+        self.assertEqual(lines[0]['description'], 'description 2')
+        self.assertEqual(lines[0]['tags'][0]['name'], 'Dinner')
+
+    def test_export_round_trips_through_import(self):
+        from_ndjson(self._import([recipe_payload(i) for i in range(2)]))
+        exported = b''.join(self.client.get(BULK_URL).streaming_content)
+
+        other = create_user(email='other@example.com')
+        self.client.force_authenticate(other)
+        res = self._import(None, body=exported)
+
+        self.assertEqual(from_ndjson(res), [{'created': 2, 'failed': 0}])
+        self.assertEqual(
+            set(Recipe.objects.filter(user=other).values_list('title', flat=True)),
+            {'recipe 0', 'recipe 1'}
+        )
+
+    def test_export_query_count_is_per_chunk(self):
+        chunk_size = RecipeViewSet.bulk_chunk_size
+        RecipeViewSet.bulk_chunk_size = 2
+        self.addCleanup(setattr, RecipeViewSet, 'bulk_chunk_size', chunk_size)
+        from_ndjson(self._import([recipe_payload(i) for i in range(4)]))
+
+        with CaptureQueriesContext(connection) as ctx:
+            b''.join(self.client.get(BULK_URL).streaming_content)
+
+        # three queries (recipes, tags, ingredients) per non empty chunk
+        # plus the final empty chunk read
+        self.assertEqual(len(ctx.captured_queries), 3 * 2 + 1)
@@ -0,0 +1,120 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    return get_user_model().objects.create_user(email, password)
+
+
+def create_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def test_repeat_list_served_from_cache(self):
+        first = self.client.get(RECIPE_URL)
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(RECIPE_URL, {'tags': '0'})
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_api_write_invalidates(self):
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        self.client.patch(detail_url(self.recipe.id), {'title': 'Renamed'})
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.data['results'][0]['title'], 'Renamed')
+
+    def test_orm_write_invalidates(self):
+        self.client.get(RECIPE_URL)
+
+        create_recipe(user=self.user, title='Added elsewhere')
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_tag_link_invalidates_recipe_list(self):
+        self.client.get(RECIPE_URL)
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'Vegan')
+
+    def test_tag_write_invalidates_tag_list(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+
+        self.client.patch(reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Vegetarian'})
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data['results'][0]['name'], 'Vegetarian')
+
+    def test_users_do_not_share_entries(self):
+        self.client.get(RECIPE_URL)
+        other = create_user(email='other@example.com')
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_response_not_publicly_cacheable(self):
+        res = self.client.get(RECIPE_URL)
+
+        self.assertIn('private', res['Cache-Control'])
+        self.assertIn('Authorization', res['Vary'])
@@ -0,0 +1,134 @@
+'''
+    tests the recipe timestamps and the Last-Modified / If-Modified-Since
+    handling of the recipe list and detail built on them
+'''
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.serializers import RecipeDetailSerializer
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.tag = Tag.objects.create(user=self.user, name='Dinner')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00')
+        )
+        self.recipe.tags.add(self.tag)
+        self.age()
+
+    def age(self):
+        ''' moves every recipe an hour back, the deletes out of the list's date '''
+        self.then = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        Recipe.objects.update(updated_at=self.then)
+        cache.clear()
+        cache.set(f'recipe-api:deleted:{self.user.pk}', 0, None)
+
+    def updated_at(self):
+        return Recipe.objects.get(pk=self.recipe.pk).updated_at
+
+    def get(self, url, since=None, **headers):
+        if since is not None:
+            headers['HTTP_IF_MODIFIED_SINCE'] = since
+        return self.client.get(url, **headers)
+
+    def test_timestamps_maintained(self):
+        self.assertLess(self.recipe.created_at - timezone.now(), timedelta(seconds=5))
+
+        self.client.patch(detail_url(self.recipe.id), {'title': 'Stew'})
+        self.assertGreater(self.updated_at(), self.then)
+
+        self.age()
+        self.recipe.tags.remove(self.tag)
+        self.assertGreater(self.updated_at(), self.then)
+
+        self.age()
+        self.tag.recipe_set.add(self.recipe)
+        self.assertGreater(self.updated_at(), self.then)
+
+        self.age()
+        self.tag.name = 'Supper'
+        self.tag.save()
+        self.assertGreater(self.updated_at(), self.then)
+
+    def test_detail_not_modified_without_serializer(self):
+        res = self.get(detail_url(self.recipe.id))
+        self.assertEqual(res['Last-Modified'], http_date(self.then.timestamp()))
+        self.assertEqual(res.data['updated_at'], self.then.isoformat().replace('+00:00', 'Z'))
+
+        cache.clear()
+        with patch.object(RecipeDetailSerializer, 'to_representation') as to_representation:
+            res = self.get(detail_url(self.recipe.id), res['Last-Modified'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        to_representation.assert_not_called()
+
+    def test_detail_modified(self):
+        since = http_date(self.then.timestamp())
+        self.client.patch(detail_url(self.recipe.id), {'title': 'Stew'})
+
+        res = self.get(detail_url(self.recipe.id), since)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Stew')
+        # changed within the second, the date couldn't tell a later change apart
+        self.assertNotIn('Last-Modified', res)
+
+    def test_if_none_match_takes_precedence(self):
+        res = self.get(detail_url(self.recipe.id), http_date(self.then.timestamp()),
+                       HTTP_IF_NONE_MATCH='"other"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_not_modified(self):
+        since = self.get(RECIPE_URL)['Last-Modified']
+
+        res = self.get(f'{RECIPE_URL}?tags={self.tag.id}', since)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_modified_by_recipe_leaving_a_filter(self):
+        since = http_date(self.then.timestamp())
+        self.recipe.tags.remove(self.tag)
+
+        res = self.get(f'{RECIPE_URL}?tags={self.tag.id}', since)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+    def test_list_modified_by_delete(self):
+        other = Recipe.objects.create(
+            user=self.user, title='Stew', time_minutes=5, price=Decimal('1.00')
+        )
+        self.age()
+        since = self.get(RECIPE_URL)['Last-Modified']
+
+        self.client.delete(detail_url(other.id))
+        res = self.get(RECIPE_URL, since)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
@@ -0,0 +1,145 @@
+'''
+    tests the values() based recipe list gives the serializer's JSON
+'''
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.fast import fast_list_serializer
+from recipe.serializers import RecipeSerializer
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class FastListTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        tags = [Tag.objects.create(user=self.user, name=f'tag {i}') for i in range(4)]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ingredient {i}') for i in range(3)
+        ]
+        prices = ['5', '5.5', '999.99', '0.01', '12.30']
+        for i, price in enumerate(prices * 3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe "{i}" ☃', time_minutes=i,
+                price=Decimal(price), link='' if i % 2 else f'http://example.com/{i}',
+            )
+            # linked out of id order
+            recipe.tags.add(*reversed(tags[:i % 5]))
+            recipe.ingredients.add(*ingredients[i % 3:])
+        other = get_user_model().objects.create_user('other@example.com', 'testpass123')
+        Recipe.objects.create(user=other, title='Not mine', time_minutes=1, price=Decimal('1'))
+        self.tags = tags
+
+    def _pages(self, params):
+        ''' the bytes of every page of the list '''
+        pages = []
+        res = self.client.get(RECIPE_URL, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.content)
+            if not res.data['next']:
+                return pages
+            res = self.client.get(res.data['next'])
+
+    def assertSameResponses(self, params):
+        cache.clear()
+        with override_settings(RECIPE_FAST_LIST=False):
+            expected = self._pages(params)
+        cache.clear()
+        with override_settings(RECIPE_FAST_LIST=True):
+            fast = self._pages(params)
+        self.assertEqual(fast, expected)
+        return expected
+
+    def test_same_json_as_serializer(self):
+        pages = self.assertSameResponses({})
+        self.assertEqual(len(pages), 1)
+
+    def test_same_pages(self):
+        pages = self.assertSameResponses({'page_size': 4})
+        self.assertEqual(len(pages), 4)
+
+    def test_same_filtered(self):
+        self.assertSameResponses({'tags': f'{self.tags[0].id},{self.tags[2].id}'})
+        self.assertSameResponses({'tags': f'{self.tags[1].id},{self.tags[3].id}',
+                                  'tags_match': 'all', 'page_size': 2})
+
+    def test_same_sparse_fields(self):
+        self.assertSameResponses({'fields': 'id,title,tags', 'page_size': 4})
+        self.assertSameResponses({'fields': 'price,ingredients', 'expand': 'ingredients'})
+
+    def test_sparse_fields_the_rows_cannot_render(self):
+        cache.clear()
+        with override_settings(RECIPE_FAST_LIST=True):
+            res = self.client.get(RECIPE_URL, {'fields': 'id,image_variants'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['image_variants'], {})
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL full text search')
+    def test_same_search_results(self):
+        self.assertSameResponses({'search': 'recipe', 'page_size': 3})
+
+    @override_settings(RECIPE_FAST_LIST=True)
+    def test_empty_list(self):
+        Recipe.objects.all().delete()
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+    def test_no_more_queries(self):
+        counts = {}
+        for fast in (False, True):
+            cache.clear()
+            with override_settings(RECIPE_FAST_LIST=fast), \
+                    CaptureQueriesContext(connection) as queries:
+                self.client.get(RECIPE_URL)
+            counts[fast] = len(queries)
+
+        self.assertLessEqual(counts[True], counts[False])
+
+    def test_serialize_matches_serializer_data(self):
+        queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+        fast = fast_list_serializer(RecipeSerializer)
+
+        data = fast.serialize(fast.values(queryset))
+
+        expected = RecipeSerializer(
+            RecipeSerializer.setup_eager_loading(queryset), many=True
+        ).data
+        self.assertEqual(data, [dict(item) for item in expected])
+
+
+class BenchmarkRecipeListTests(TestCase):
+
+    def test_reports_both_paths(self):
+        out = StringIO()
+
+        call_command('benchmark_recipe_list', recipes=[20, 40], repeat=1, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('serializer', output)
+        self.assertIn('values()', output)
+        self.assertNotIn('DIFFERENT', output)
+        self.assertEqual(Recipe.objects.count(), 0)
@@ -0,0 +1,152 @@
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.images import generate_variants, render_variants
+
+MEDIA_ROOT = tempfile.mkdtemp()
+VARIANTS = {'thumbnail': (20, 20), 'medium': (50, 50)}
+
+
+def upload_url(recipe_id):
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def jpeg_bytes(size=(120, 80), exif=None):
+    buffer = BytesIO()
+    image = Image.new('RGB', size, 'red')
+    image.save(buffer, format='JPEG', **({'exif': exif} if exif else {}))
+    return buffer.getvalue()
+
+
+def exif_with(orientation):
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x010f] = 'Camera maker'
+    return exif.tobytes()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    RECIPE_IMAGES={'WORKERS': 0, 'FORMAT': 'JPEG', 'VARIANTS': VARIANTS},
+)
+class ImageVariantTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Sample', time_minutes=5, price=Decimal('1.00')
+        )
+
+    def _upload(self, data=None):
+        image = SimpleUploadedFile('photo.jpg', data or jpeg_bytes(), 'image/jpeg')
+        return self.client.post(
+            upload_url(self.recipe.id), {'image': image}, format='multipart'
+        )
+
+    def test_variants_generated_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_variants'], {})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+        for callback in callbacks:
+            callback()
+        self.recipe.refresh_from_db()
+        self.assertEqual(set(self.recipe.image_variants), set(VARIANTS))
+        for name, path in self.recipe.image_variants.items():
+            with default_storage.open(path) as stored, Image.open(stored) as image:
+                self.assertEqual(image.format, 'JPEG')
+                self.assertLessEqual(max(image.size), max(VARIANTS[name]))
+
+    def test_detail_exposes_variant_urls(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload()
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(set(res.data['image_variants']), set(VARIANTS))
+        self.assertTrue(res.data['image_variants']['thumbnail'].startswith('http://'))
+
+    def test_new_upload_clears_stale_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload()
+
+        with self.captureOnCommitCallbacks():
+            res = self._upload()
+
+        self.assertEqual(res.data['image_variants'], {})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_superseded_image_not_recorded(self):
+        with self.captureOnCommitCallbacks():
+            self._upload()
+        old_name = Recipe.objects.get(id=self.recipe.id).image.name
+        with self.captureOnCommitCallbacks():
+            self._upload()
+
+        generate_variants(self.recipe.id, old_name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_backfill_command(self):
+        with self.captureOnCommitCallbacks():
+            self._upload()
+
+        call_command('generate_image_variants', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(set(self.recipe.image_variants), set(VARIANTS))
+
+
+class RenderVariantsTests(TestCase):
+
+    def test_metadata_stripped_and_orientation_applied(self):
+        # orientation 6 means the stored pixels must be turned 90 degrees
+        source = BytesIO(jpeg_bytes(size=(120, 80), exif=exif_with(6)))
+
+        rendered = dict(render_variants(source, VARIANTS, 'JPEG', 80))
+
+        with Image.open(BytesIO(rendered['medium'])) as image:
+            self.assertEqual(image.size, (33, 50))
+            self.assertNotIn('exif', image.info)
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_transparency_kept_for_webp(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (40, 40), (0, 0, 0, 0)).save(buffer, format='PNG')
+
+        rendered = dict(render_variants(buffer, VARIANTS, 'WEBP', 80))
+
+        with Image.open(BytesIO(rendered['thumbnail'])) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.mode, 'RGBA')
@@ -50,7 +50,7 @@ class PrivateIngredientApiTests(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
         
     def test_ingredients_limited_to_user(self):
         
@@ -61,9 +61,9 @@ class PrivateIngredientApiTests(TestCase):
         res = self.client.get(INGREDIENTS_URL)
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(res.data[0]['id'], ingredient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
         
         
     def test_update_ingredients(self):
@@ -78,6 +78,20 @@ class PrivateIngredientApiTests(TestCase):
         ingredient.refresh_from_db()
         self.assertEqual(ingredient.name, payload['name'])
         
+    def test_update_ingredient_to_existing_name(self):
+        ingredient = Ingredient.objects.create(user=self.user, name='cilantro')
+        Ingredient.objects.create(user=self.user, name='Coriander')
+        other = create_user(email='other@example.com', password='pass123')
+        Ingredient.objects.create(user=other, name='Parsley')
+        
+        res = self.client.patch(detail_url(ingredient.id), {'name': 'Coriander'})
+        
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        # only the user's own names are taken
+        res = self.client.patch(detail_url(ingredient.id), {'name': 'Parsley'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        
         
     def test_delete_ingredients(self):
         ingredient = Ingredient.objects.create(user=self.user, name='Lettuce')
@@ -101,12 +115,13 @@ class PrivateIngredientApiTests(TestCase):
             user=self.user
         )
         recipe.ingredients.add(ing1)
+        ing1.refresh_from_db()
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
         s1 = IngredientSerializer(ing1)
         s2 = IngredientSerializer(ing2)
         
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
         
     def test_filtered_ingredients_unique(self):
         ing = Ingredient.objects.create(user=self.user, name='ing1')
@@ -128,4 +143,4 @@ class PrivateIngredientApiTests(TestCase):
         recipe2.ingredients.add(ing)
         
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data['results']), 1)
\ No newline at end of file
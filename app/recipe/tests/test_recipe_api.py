@@ -1,18 +1,28 @@
 from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
 import tempfile, os
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 from core.models import Recipe, Tag, Ingredient
+from core.tests.utils import QueryCountMixin
 
-from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.pagination import RecipeCursorPagination
+from recipe.serializers import (
+    RecipeSerializer,
+    RecipeDetailSerializer,
+    get_or_create_by_name,
+)
 
 RECIPE_URL = reverse('recipe:recipe-list')
 
@@ -72,7 +82,7 @@ class PrivateRecipeApiTests(TestCase):
         recipe = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipe, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
     
     def test_recipe_list_limited_to_user(self):
         other_user = create_user(    
@@ -89,7 +99,7 @@ class PrivateRecipeApiTests(TestCase):
         
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
         
         
     def test_get_recipe_detail(self):
@@ -367,6 +377,72 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
     
+    def test_create_query_count_independent_of_nested_items(self):
+        def post(count):
+            payload = {
+                'title': 'many ingredients',
+                'time_minutes': 10,
+                'price': Decimal('1.00'),
+                'tags': [{'name': f'tag {count} {i}'} for i in range(count)],
+                'ingredients': [{'name': f'ing {count} {i}'} for i in range(count)],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPE_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+        
+        self.assertEqual(post(3), post(30))
+        
+    def test_create_recipe_with_duplicate_tag_names(self):
+        payload = {
+            'title': 'dup tags',
+            'time_minutes': 10,
+            'price': Decimal('1.00'),
+            'tags': [{'name': 'Thai'}, {'name': 'Thai'}],
+        }
+        
+        res = self.client.post(RECIPE_URL, payload, format='json')
+        
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 1)
+        
+    def test_get_or_create_tolerates_concurrent_insert(self):
+        bulk_create = Tag.objects.bulk_create
+        
+        def racing_bulk_create(objs, **kwargs):
+            # another writer inserts the same name between lookup and insert
+            Tag.objects.create(user=self.user, name='Racy')
+            return bulk_create(objs, **kwargs)
+        
+        with patch.object(Tag.objects, 'bulk_create', side_effect=racing_bulk_create):
+            tags = get_or_create_by_name(
+                Tag, self.user, [{'name': 'Racy'}, {'name': 'Calm'}]
+            )
+        
+        self.assertEqual([tag.name for tag in tags], ['Racy', 'Calm'])
+        self.assertTrue(all(tag.pk for tag in tags))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        
+    def test_update_tags_keeps_unchanged_links(self):
+        keep = Tag.objects.create(user=self.user, name='Keep')
+        drop = Tag.objects.create(user=self.user, name='Drop')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(keep, drop)
+        through = Recipe.tags.through
+        kept_link = through.objects.get(recipe=recipe, tag=keep)
+        
+        payload = {'tags': [{'name': 'Keep'}, {'name': 'New'}]}
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(through.objects.filter(id=kept_link.id).exists())
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Keep', 'New'}
+        )
+        
     def test_fileter_by_tags(self):
         r1 = create_recipe(
             user=self.user, title='titile 1'
@@ -391,9 +467,9 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
         
-        self.assertIn(s1.data, res.data) 
-        self.assertIn(s2.data, res.data) 
-        self.assertNotIn(s3.data, res.data) 
+        self.assertIn(s1.data, res.data['results']) 
+        self.assertIn(s2.data, res.data['results']) 
+        self.assertNotIn(s3.data, res.data['results']) 
 
     def test_filter_by_ingredient(self):
         r1 = create_recipe(
@@ -422,11 +498,139 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
         
-        self.assertIn(s1.data, res.data) 
-        self.assertIn(s2.data, res.data) 
-        self.assertNotIn(s3.data, res.data) 
+        self.assertIn(s1.data, res.data['results']) 
+        self.assertIn(s2.data, res.data['results']) 
+        self.assertNotIn(s3.data, res.data['results']) 
+        
+    def test_filter_by_tags_returns_each_recipe_once(self):
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        recipe.tags.add(tag1, tag2)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL, {'tags': f'{tag1.id},{tag2.id}'})
+        
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe.id])
+        self.assertNotIn('DISTINCT', ctx.captured_queries[0]['sql'].upper())
+        
+    def test_filter_by_all_tags(self):
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        both = create_recipe(user=self.user, title='both')
+        both.tags.add(tag1, tag2)
+        one = create_recipe(user=self.user, title='one')
+        one.tags.add(tag1)
+        
+        params = {'tags': f'{tag1.id},{tag2.id},{tag1.id}', 'tags_match': 'all'}
+        res = self.client.get(RECIPE_URL, params)
+        
+        self.assertEqual([r['id'] for r in res.data['results']], [both.id])
+        
+    def test_filter_by_all_ingredients_and_any_tag(self):
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        in1 = Ingredient.objects.create(user=self.user, name='Rice')
+        in2 = Ingredient.objects.create(user=self.user, name='Beans')
+        match = create_recipe(user=self.user, title='match')
+        match.tags.add(tag)
+        match.ingredients.add(in1, in2)
+        untagged = create_recipe(user=self.user, title='untagged')
+        untagged.ingredients.add(in1, in2)
+        partial = create_recipe(user=self.user, title='partial')
+        partial.tags.add(tag)
+        partial.ingredients.add(in1)
+        
+        params = {
+            'tags': f'{tag.id}',
+            'ingredients': f'{in1.id},{in2.id}',
+            'ingredients_match': 'all',
+        }
+        res = self.client.get(RECIPE_URL, params)
+        
+        self.assertEqual([r['id'] for r in res.data['results']], [match.id])
+        
+        
+@skipUnless(connection.vendor == 'postgresql', 'full text search needs PostgreSQL')
+class RecipeSearchTests(TestCase):
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        
+    def _search(self, **params):
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in res.data['results']]
+        
+    def test_search_title_and_description(self):
+        create_recipe(user=self.user, title='Lemon tart', description='sweet')
+        create_recipe(user=self.user, title='Fish', description='with lemons')
+        create_recipe(user=self.user, title='Beef stew', description='slow')
+        
+        titles = self._search(search='lemon')
         
+        # title matches are weighted above description matches
+        self.assertEqual(titles, ['Lemon tart', 'Fish'])
         
+    def test_search_tracks_updates(self):
+        recipe = create_recipe(user=self.user, title='Soup')
+        recipe.title = 'Tomato soup'
+        recipe.save()
+        
+        self.assertEqual(self._search(search='tomato'), ['Tomato soup'])
+        
+    def test_search_limited_to_user(self):
+        other = create_user(email='other@example.com', password='testpass123')
+        create_recipe(user=other, title='Lemon tart')
+        
+        self.assertEqual(self._search(search='lemon'), [])
+        
+    def test_search_combined_with_tag_filter(self):
+        tag = Tag.objects.create(user=self.user, name='Dessert')
+        tart = create_recipe(user=self.user, title='Lemon tart')
+        tart.tags.add(tag)
+        create_recipe(user=self.user, title='Lemon chicken')
+        
+        titles = self._search(search='lemon', tags=str(tag.id))
+        
+        self.assertEqual(titles, ['Lemon tart'])
+        
+    def test_search_results_paginate_by_rank(self):
+        for i in range(5):
+            create_recipe(user=self.user, title=f'Curry {i}', description='curry')
+        create_recipe(user=self.user, title='Rice', description='curry')
+        
+        res = self.client.get(RECIPE_URL, {'search': 'curry', 'page_size': 2})
+        titles = [r['title'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            titles += [r['title'] for r in res.data['results']]
+        
+        self.assertEqual(len(titles), 6)
+        self.assertEqual(len(set(titles)), 6)
+        self.assertEqual(titles[-1], 'Rice')
+        
+    def test_search_pages_over_tied_ranks_without_repeats(self):
+        # four distinct ranks, fifteen recipes sharing each
+        for i in range(60):
+            create_recipe(
+                user=self.user, title=f'Dish {i}', description='curry ' * (1 + i % 4)
+            )
+        
+        res = self.client.get(RECIPE_URL, {'search': 'curry', 'page_size': 7})
+        ids = [r['id'] for r in res.data['results']]
+        # bounded, repeats could page on forever
+        for _ in range(20):
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+            ids += [r['id'] for r in res.data['results']]
+        
+        self.assertEqual(len(ids), 60)
+        self.assertEqual(len(set(ids)), 60)
+
+
 class ImageUploadTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -462,4 +666,125 @@ class ImageUploadTests(TestCase):
         payload = {'image' : 'notanimg'}
         res = self.client.post(url, payload, format='multipart')
         
-        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipePaginationTests(QueryCountMixin, TestCase):
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        
+    def test_list_is_paginated(self):
+        for i in range(5):
+            create_recipe(user=self.user, title=f'recipe {i}')
+            
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+        
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+        self.assertIsNone(res.data['previous'])
+        
+    def test_walk_all_pages(self):
+        recipes = [create_recipe(user=self.user) for _ in range(7)]
+        
+        res = self.client.get(RECIPE_URL, {'page_size': 3})
+        seen = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            seen += [recipe['id'] for recipe in res.data['results']]
+            
+        self.assertEqual(seen, sorted([r.id for r in recipes], reverse=True))
+        
+    def test_page_size_is_capped(self):
+        max_page_size = RecipeCursorPagination.max_page_size
+        for _ in range(max_page_size + 1):
+            create_recipe(user=self.user)
+            
+        res = self.client.get(RECIPE_URL, {'page_size': max_page_size * 10})
+        
+        self.assertEqual(len(res.data['results']), max_page_size)
+        
+    def test_deep_page_costs_same_as_first_page(self):
+        for _ in range(10):
+            create_recipe(user=self.user)
+        
+        with CaptureQueriesContext(connection) as first:
+            res = self.client.get(RECIPE_URL, {'page_size': 2})
+        while res.data['next']:
+            with CaptureQueriesContext(connection) as last:
+                res = self.client.get(res.data['next'])
+        
+        self.assertEqual(len(first), len(last))
+        self.assertNotIn('OFFSET', last.captured_queries[0]['sql'].upper())
+
+
+class RecipeQueryCountTests(QueryCountMixin, TestCase):
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        
+    def _add_recipes(self, count=3):
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f'recipe {i}')
+            tag = Tag.objects.create(user=self.user, name=f'tag {recipe.id}')
+            ingredient = Ingredient.objects.create(
+                user=self.user, name=f'ing {recipe.id}'
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+            
+    def test_list_query_count_is_constant(self):
+        self.assertConstantQueries(
+            self._add_recipes,
+            lambda: self.client.get(RECIPE_URL)
+        )
+        
+    def test_filtered_list_query_count_is_constant(self):
+        tag = Tag.objects.create(user=self.user, name='shared')
+        
+        def add_rows():
+            self._add_recipes()
+            for recipe in Recipe.objects.filter(user=self.user):
+                recipe.tags.add(tag)
+        
+        self.assertConstantQueries(
+            add_rows,
+            lambda: self.client.get(RECIPE_URL, {'tags': str(tag.id)})
+        )
+        
+    def test_detail_query_count_is_constant(self):
+        recipe = create_recipe(user=self.user)
+        
+        def add_links():
+            for _ in range(3):
+                count = recipe.tags.count()
+                recipe.tags.add(
+                    Tag.objects.create(user=self.user, name=f't{count}')
+                )
+                recipe.ingredients.add(
+                    Ingredient.objects.create(user=self.user, name=f'i{count}')
+                )
+        
+        self.assertConstantQueries(
+            add_links,
+            lambda: self.client.get(detail_url(recipe.id))
+        )
+        
+    def test_list_loads_only_serialized_columns(self):
+        self._add_recipes(1)
+        
+        queryset = RecipeSerializer.setup_eager_loading(Recipe.objects.all())
+        recipe = queryset.get()
+        
+        loaded = {
+            field.attname for field in Recipe._meta.concrete_fields
+        } - recipe.get_deferred_fields()
+        self.assertEqual(
+            loaded,
+            {'id', 'user_id', 'title', 'time_minutes', 'price', 'link'}
+        )
\ No newline at end of file
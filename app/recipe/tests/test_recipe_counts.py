@@ -0,0 +1,150 @@
+'''
+    tests the recipe_count of tags and ingredients: its upkeep on link
+    changes, recipe deletes and bulk imports, the listings built on it and
+    the reconcile command
+'''
+import json
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RecipeCountTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tags = [Tag.objects.create(user=self.user, name=name) for name in 'abc']
+        self.recipes = [
+            Recipe.objects.create(
+                user=self.user, title=f'recipe {i}', time_minutes=5, price=Decimal('1.00')
+            ) for i in range(3)
+        ]
+
+    def counts(self, model=Tag):
+        return list(model.objects.order_by('name').values_list('recipe_count', flat=True))
+
+    def test_add_and_remove_from_recipe(self):
+        a, b, c = self.tags
+        self.recipes[0].tags.add(a, b)
+        self.recipes[1].tags.add(a)
+        self.recipes[1].tags.add(a)
+
+        self.assertEqual(self.counts(), [2, 1, 0])
+
+        # c isn't linked and must not be counted down
+        self.recipes[0].tags.remove(a, c)
+        self.assertEqual(self.counts(), [1, 1, 0])
+
+        self.recipes[0].tags.set([c])
+        self.assertEqual(self.counts(), [1, 0, 1])
+
+        self.recipes[1].tags.clear()
+        self.assertEqual(self.counts(), [0, 0, 1])
+
+    def test_add_and_remove_from_tag(self):
+        a = self.tags[0]
+        a.recipe_set.add(*self.recipes)
+        self.assertEqual(self.counts(), [3, 0, 0])
+
+        a.recipe_set.remove(self.recipes[0])
+        self.assertEqual(self.counts(), [2, 0, 0])
+
+        a.recipe_set.clear()
+        self.assertEqual(self.counts(), [0, 0, 0])
+
+    def test_recipe_delete(self):
+        a, b, _ = self.tags
+        for recipe in self.recipes:
+            recipe.tags.add(a)
+        self.recipes[0].tags.add(b)
+
+        self.recipes[0].delete()
+        self.assertEqual(self.counts(), [2, 0, 0])
+
+        Recipe.objects.all().delete()
+        self.assertEqual(self.counts(), [0, 0, 0])
+
+    def test_api_writes(self):
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Stew', 'time_minutes': 5, 'price': '1.00',
+            'tags': [{'name': 'a'}, {'name': 'new'}], 'ingredients': [{'name': 'Salt'}],
+        }, format='json')
+        self.assertEqual(self.counts(), [1, 0, 0, 1])
+        self.assertEqual(self.counts(Ingredient), [1])
+
+        url = reverse('recipe:recipe-detail', args=[res.data['id']])
+        self.client.patch(url, {'tags': [{'name': 'b'}]}, format='json')
+        self.assertEqual(self.counts(), [0, 1, 0, 0])
+
+    def test_bulk_import(self):
+        lines = '\n'.join(json.dumps({
+            'title': f'recipe {i}', 'time_minutes': 5, 'price': '1.00',
+            'tags': [{'name': 'a'}, {'name': 'b'}][:i + 1],
+        }) for i in range(2))
+
+        res = self.client.post(
+            reverse('recipe:recipe-bulk'), lines, content_type='application/x-ndjson'
+        )
+
+        b''.join(res.streaming_content)
+        self.assertEqual(self.counts(), [2, 1, 0])
+
+    def test_assigned_only_and_ordering(self):
+        a, b, c = self.tags
+        self.recipes[0].tags.add(a, b)
+        self.recipes[1].tags.add(b)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['b', 'a'])
+        self.assertEqual(res.data['results'][0]['recipe_count'], 2)
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count', 'page_size': 1})
+        names = [tag['name'] for tag in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            names += [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['b', 'a', 'c'])
+
+    def test_count_ordering_pages_over_ties(self):
+        Tag.objects.bulk_create(
+            Tag(user=self.user, name=f'tag {i:04}', recipe_count=int(i % 10 == 0))
+            for i in range(1300)
+        )
+
+        for ordering in ('recipe_count', '-recipe_count'):
+            res = self.client.get(TAGS_URL, {'ordering': ordering, 'page_size': 100})
+            pages = [res.data['results']]
+            # bounded, offsets past DRF's cutoff paged on forever
+            for _ in range(20):
+                if not res.data['next']:
+                    break
+                res = self.client.get(res.data['next'])
+                pages.append(res.data['results'])
+            tags = [(tag['recipe_count'], tag['name']) for page in pages for tag in page]
+
+            self.assertEqual(len(tags), 1303)
+            self.assertEqual(tags, sorted(tags, reverse=ordering.startswith('-')))
+
+    def test_reconcile_command(self):
+        self.recipes[0].tags.add(self.tags[0])
+        Tag.objects.filter(name='a').update(recipe_count=7)
+        Tag.objects.filter(name='c').update(recipe_count=1)
+        out = StringIO()
+
+        call_command('reconcile_recipe_counts', stdout=out)
+
+        self.assertEqual(self.counts(), [1, 0, 0])
+        self.assertIn('tags: fixed 2 of 3', out.getvalue())
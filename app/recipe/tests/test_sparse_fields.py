@@ -0,0 +1,96 @@
+'''
+    tests the ?fields= and ?expand= sparse fieldsets of the recipe list and
+    detail and the queries they narrow
+'''
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class SparseFieldsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+            description='hot',
+        )
+        self.tags = [Tag.objects.create(user=self.user, name=name) for name in ('b', 'a')]
+        self.recipe.tags.add(*self.tags)
+        self.recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Salt'))
+
+    def get(self, url=RECIPE_URL, **params):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.sql = [query['sql'] for query in queries]
+        return res
+
+    def test_list_fields(self):
+        res = self.get(fields='id,title,image')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'],
+                         [{'id': self.recipe.id, 'title': 'Soup', 'image': None}])
+        recipe_query = next(sql for sql in self.sql if 'FROM "core_recipe"' in sql)
+        self.assertNotIn('"price"', recipe_query)
+        self.assertNotIn('"description"', recipe_query)
+        self.assertFalse([sql for sql in self.sql if 'core_recipe_tags' in sql])
+
+    def test_relations_as_ids_unless_expanded(self):
+        res = self.get(fields='id,tags,ingredients', expand='ingredients')
+
+        item = res.data['results'][0]
+        self.assertEqual(item['tags'], sorted(tag.id for tag in self.tags))
+        self.assertEqual(item['ingredients'][0]['name'], 'Salt')
+        tag_queries = [sql for sql in self.sql if 'core_recipe_tags' in sql]
+        self.assertEqual(len(tag_queries), 1)
+        self.assertNotIn('"name"', tag_queries[0])
+
+    def test_expand_alone_keeps_the_default_fields(self):
+        res = self.get(expand='tags')
+
+        item = res.data['results'][0]
+        self.assertEqual(list(item), ['id', 'title', 'time_minutes', 'price', 'link', 'tags',
+                                      'ingredients'])
+        self.assertEqual([tag['name'] for tag in item['tags']], ['b', 'a'])
+        self.assertEqual(len(item['ingredients']), 1)
+        self.assertIsInstance(item['ingredients'][0], int)
+
+    def test_detail_fields(self):
+        url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+
+        res = self.get(url, fields='title,description')
+
+        self.assertEqual(res.data, {'title': 'Soup', 'description': 'hot'})
+
+    def test_unknown_names_rejected(self):
+        res = self.get(fields='id,secret', expand='title')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', res.data['fields'][0])
+        self.assertIn('expand', res.data)
+
+    def test_writes_ignore_fields(self):
+        res = self.client.post(
+            f'{RECIPE_URL}?fields=id', {'title': 'Stew', 'time_minutes': 5, 'price': '2.00'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn('price', res.data)
@@ -46,7 +46,7 @@ class PrivateTagsApiTests(TestCase):
         serializer = TagSerializer(tags, many=True)
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
         
     def test_tags_limited_to_user(self):
         user2 = create_user(email="user2@example.com")
@@ -56,9 +56,9 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
         
     def test_update_tag(self):
         
@@ -74,6 +74,21 @@ class PrivateTagsApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
         
+    def test_update_tag_to_existing_name(self):
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        Tag.objects.create(user=self.user, name='Dessert')
+        
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dessert'})
+        
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Dinner')
+        self.assertEqual(
+            self.client.patch(detail_url(tag.id), {'name': 'Dinner'}).status_code,
+            status.HTTP_200_OK
+        )
+        
     def test_delete_tag(self):
         tag = Tag.objects.create(user=self.user, name='Breakfast')
         url = detail_url(tag.id)
@@ -96,14 +111,15 @@ class PrivateTagsApiTests(TestCase):
         )
         
         recipe.tags.add(tag1)
+        tag1.refresh_from_db()
         
         res = self.client.get(TAGS_URL, {'assigned_only' : 1})
         
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
         
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
         
     def test_filter_tags_unique(self):
         tag = Tag.objects.create(user=self.user, name='tag1')
@@ -126,4 +142,17 @@ class PrivateTagsApiTests(TestCase):
         recipe2.tags.add(tag)
         
         res = self.client.get(TAGS_URL, {'assigned_only' : 1})
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_tags_paginated_by_name(self):
+        names = ['Breakfast', 'Dinner', 'Lunch', 'Snack', 'Vegan']
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+        
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        seen = [tag['name'] for tag in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            seen += [tag['name'] for tag in res.data['results']]
+        
+        self.assertEqual(seen, sorted(names, reverse=True))
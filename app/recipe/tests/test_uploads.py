@@ -0,0 +1,145 @@
+import re
+import shutil
+import struct
+import tempfile
+import zlib
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.uploads import GuardedUploadHandler, measure_upload
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def upload_url(recipe_id):
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def png_header(width, height):
+    '''
+        a PNG that claims the given size but carries a single empty row,
+        Pillow reads the size without decoding
+    '''
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body))
+
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    idat = chunk(b'IDAT', zlib.compress(b'\x00'))
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + idat + chunk(b'IEND', b'')
+
+
+def jpeg_bytes(size=(40, 40)):
+    buffer = BytesIO()
+    Image.new('RGB', size).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    RECIPE_IMAGES={'WORKERS': 0, 'MAX_UPLOAD_SIZE': 64 * 1024, 'MAX_PIXELS': 10000},
+)
+class GuardedUploadTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'pass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Sample', time_minutes=5, price=Decimal('1.00')
+        )
+
+    def _upload(self, data, name='photo.png'):
+        with self.assertLogs('recipe.uploads', 'DEBUG') as logs:
+            res = self.client.post(
+                upload_url(self.recipe.id),
+                {'image': SimpleUploadedFile(name, data)},
+                format='multipart'
+            )
+        self.logs = logs.output
+        return res
+
+    def test_image_within_limits_accepted(self):
+        res = self._upload(jpeg_bytes(), name='photo.jpg')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('accepted', self.logs[0])
+
+    def test_oversized_file_rejected(self):
+        data = jpeg_bytes() + b'\x00' * (64 * 1024)
+
+        res = self._upload(data, name='photo.jpg')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('at most 65536 bytes', str(res.data['image']))
+        self.assertIn(f'{len(data)} bytes', self.logs[0])
+        self.assertIn('rejected', self.logs[0])
+
+    def test_pixel_budget_checked_from_header(self):
+        with patch('PIL.ImageFile.ImageFile.load') as load:
+            res = self._upload(png_header(20000, 20000))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('at most 10000 pixels', str(res.data['image']))
+        load.assert_not_called()
+
+    def test_decompression_bomb_rejected(self):
+        # past twice Pillow's own limit Image.open refuses the file
+        res = self._upload(png_header(65535, 65535))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', str(res.data['image']))
+
+
+@override_settings(RECIPE_IMAGES={'MAX_UPLOAD_SIZE': 10})
+class GuardedUploadHandlerTests(TestCase):
+
+    def test_streams_to_temporary_file_up_to_limit(self):
+        handler = GuardedUploadHandler()
+        handler.new_file('image', 'photo.jpg', 'image/jpeg', None)
+
+        handler.receive_data_chunk(b'x' * 8, 0)
+        handler.receive_data_chunk(b'x' * 8, 8)
+        upload = handler.file_complete(16)
+
+        self.assertIsInstance(upload, TemporaryUploadedFile)
+        self.assertEqual(upload.size, 16)
+        self.assertEqual(upload.read(), b'x' * 8)
+        self.assertGreaterEqual(upload.upload_seconds, 0)
+        upload.close()
+
+
+class MeasureUploadTests(TestCase):
+
+    def _measure(self, allocate):
+        upload = SimpleUploadedFile('photo.jpg', b'x')
+        request = SimpleNamespace(FILES={'image': upload})
+        with self.assertLogs('recipe.uploads', 'DEBUG') as logs:
+            with measure_upload(request):
+                data = bytearray(allocate)
+                del data
+        return logs.output[0]
+
+    def test_peak_memory_reported_per_upload(self):
+        # a lifetime high-water mark would report +0 KB the second time
+        for _ in range(2):
+            output = self._measure(4 * 1024 * 1024)
+            peak_kb = int(re.search(r'peak memory \+(\d+) KB', output).group(1))
+            self.assertGreaterEqual(peak_kb, 4096)
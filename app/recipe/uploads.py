@@ -0,0 +1,168 @@
+'''
+    guards for image uploads: files are streamed to disk chunk by chunk,
+    cut off past the size limit and checked against a pixel budget from
+    their header alone, before Pillow decodes anything
+'''
+import logging
+import threading
+import time
+import tracemalloc
+import warnings
+from contextlib import contextmanager
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.translation import gettext_lazy as _
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.exceptions import Throttled
+
+from core import metrics
+from core.throttling import lease
+from recipe.images import image_options
+
+
+logger = logging.getLogger(__name__)
+
+
+class GuardedUploadHandler(TemporaryFileUploadHandler):
+    '''
+        writes every uploaded file to a temporary file, never to memory, and
+        stops writing once the file exceeds MAX_UPLOAD_SIZE. The rest of the
+        body is still read (and dropped) so the client gets a proper 400
+    '''
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.limit = image_options()['MAX_UPLOAD_SIZE']
+        self.received = 0
+        self.started = time.perf_counter()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= self.limit:
+            return super().receive_data_chunk(raw_data, start)
+        return None
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.upload_seconds = time.perf_counter() - self.started
+        return upload
+
+
+def image_dimensions(upload):
+    '''
+        (width, height) read from the image header, Image.open doesn't
+        decode pixel data
+    '''
+    upload.seek(0)
+    try:
+        with warnings.catch_warnings():
+            # the pixel budget is enforced by the caller
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(upload) as img:
+                return img.size
+    except Image.DecompressionBombError:
+        return None
+    except Exception:
+        # not an image, the ImageField validation reports it
+        return 0, 0
+    finally:
+        upload.seek(0)
+
+
+class GuardedImageField(serializers.ImageField):
+    '''
+        rejects uploads over MAX_UPLOAD_SIZE bytes or MAX_PIXELS pixels
+        before the ImageField validation lets Pillow loose on them
+    '''
+    default_error_messages = {
+        'too_large': _('Image files may be at most {max_size} bytes.'),
+        'too_many_pixels': _('Images may have at most {max_pixels} pixels.'),
+    }
+
+    def to_internal_value(self, data):
+        options = image_options()
+        size = getattr(data, 'size', None)
+        if size is not None and size > options['MAX_UPLOAD_SIZE']:
+            metrics.increment('app_upload_rejections_total', reason='too_large')
+            self.fail('too_large', max_size=options['MAX_UPLOAD_SIZE'])
+
+        if hasattr(data, 'seek'):
+            dimensions = image_dimensions(data)
+            if dimensions is None or dimensions[0] * dimensions[1] > options['MAX_PIXELS']:
+                metrics.increment('app_upload_rejections_total', reason='too_many_pixels')
+                self.fail('too_many_pixels', max_pixels=options['MAX_PIXELS'])
+
+        return super().to_internal_value(data)
+
+
+_tracing_lock = threading.Lock()
+_tracing_uploads = 0
+_started_tracing = False
+
+
+@contextmanager
+def _traced_memory():
+    # tracemalloc runs only while an upload is measured, it slows down every
+    # allocation. Uploads measured at the same time share its peak
+    global _tracing_uploads, _started_tracing
+    with _tracing_lock:
+        if _tracing_uploads == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_uploads += 1
+        tracemalloc.reset_peak()
+        started, _ = tracemalloc.get_traced_memory()
+    peak = {'bytes': 0}
+    try:
+        yield peak
+    finally:
+        with _tracing_lock:
+            peak['bytes'] = max(tracemalloc.get_traced_memory()[1] - started, 0)
+            _tracing_uploads -= 1
+            if _tracing_uploads == 0 and _started_tracing:
+                tracemalloc.stop()
+                _started_tracing = False
+
+
+@contextmanager
+def measure_upload(request):
+    '''
+        logs at DEBUG size, transfer and validation time and the peak memory
+        python allocated for the upload handled inside the block. The body
+        is parsed inside the block too, request.data is lazy
+    '''
+    started = time.perf_counter()
+    outcome = {'accepted': False}
+    try:
+        with _traced_memory() as peak:
+            yield outcome
+    finally:
+        for upload in request.FILES.values():
+            logger.debug(
+                'upload %s: %d bytes, received in %.3fs, handled in %.3fs, '
+                'peak memory +%d KB, %s',
+                upload.name, upload.size,
+                getattr(upload, 'upload_seconds', 0.0),
+                time.perf_counter() - started,
+                peak['bytes'] // 1024,
+                'accepted' if outcome['accepted'] else 'rejected',
+            )
+
+
+@contextmanager
+def upload_slot(request):
+    '''
+        holds one of the MAX_CONCURRENT_UPLOADS slots of the user for the
+        block, across all workers, or refuses the request with a 429. Take
+        it before request.data, the body is received while parsing it
+    '''
+    options = image_options()
+    with lease(
+        f'upload:{request.user.pk}',
+        options['MAX_CONCURRENT_UPLOADS'], options['UPLOAD_LEASE_SECONDS'],
+    ) as acquired:
+        if not acquired:
+            metrics.increment('app_throttled_total', scope='recipe_upload_concurrency')
+            raise Throttled(detail=_('Too many image uploads in progress.'))
+        yield
@@ -1,4 +1,12 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Exists, F, FloatField, Max, OuterRef
+from django.db.models.functions import Cast
+from django.http import StreamingHttpResponse
+
 from rest_framework import viewsets, mixins, status
+from rest_framework.serializers import ListSerializer
 
 from drf_spectacular.utils import (
     extend_schema_view, 
@@ -8,64 +16,252 @@ from drf_spectacular.utils import (
 )
 
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 from core.models import Recipe, Tag, Ingredient
+from core.throttling import UserActionRateThrottle
+from user.authentication import CachedTokenAuthentication
 from recipe import serializers
+from recipe.cache import CachedResponseMixin, last_deleted
+from recipe.fast import fast_list_serializer
+from recipe.images import schedule_variants
+from recipe.uploads import measure_upload, upload_slot
+from recipe.bulk import (
+    NDJSON_MEDIA_TYPE,
+    NDJSONParser,
+    NDJSONRenderer,
+    import_recipes,
+    export_recipes,
+)
+from recipe.pagination import (
+    RecipeCursorPagination,
+    RecipeAttrCursorPagination,
+)
+
+
+def _names(value):
+    ''' the distinct names of a comma separated query param, in order '''
+    return tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+
+
+SPARSE_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description=(
+            'comma separated fields to return, any field of the recipe detail. '
+            'With fields or expand, tags and ingredients are lists of IDs '
+            'unless expanded'
+        )
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description='comma separated relations (tags, ingredients) to return as objects'
+    ),
+]
 
 
 @extend_schema_view(
+    retrieve=extend_schema(parameters=SPARSE_PARAMETERS),
     list=extend_schema(
-        parameters=[
+        parameters=SPARSE_PARAMETERS + [
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description=(
+                    'full text search over title and description, results '
+                    'are ordered by relevance'
+                )
+            ),
             OpenApiParameter(
                 'tags',
                 OpenApiTypes.STR,
                 description='Comma separated list of IDs to filter' 
             ),
+            OpenApiParameter(
+                'tags_match',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='match recipes with any (default) or all of the tags'
+            ),
             OpenApiParameter(
                 'ingredients',
                 OpenApiTypes.STR,
                 description='comma seperated list of ingredient IDs to filter'
-            )
+            ),
+            OpenApiParameter(
+                'ingredients_match',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='match recipes with any (default) or all of the ingredients'
+            ),
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
+    pagination_class = RecipeCursorPagination
+    # recipes validated and inserted (or read and streamed) per transaction
+    bulk_chunk_size = 500
     
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserActionRateThrottle]
+    # rate limit scope of each write action, per user
+    throttle_scopes = {
+        'create': 'recipe_create',
+        'update': 'recipe_update',
+        'partial_update': 'recipe_update',
+        'upload_image': 'recipe_upload_image',
+        'bulk': 'recipe_bulk',
+    }
     
     def _params_to_ints(self, qs):
         return [int(str_id) for str_id in qs.split(',')]
     
-    def get_queryset(self):
-        # return self.queryset.filter(user=self.request.user).order_by('-id')
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
+    def _filter_related(self, queryset, field_name, ids, match_all):
+        '''
+            semi-join filter through the m2m table, no join on the recipe
+            rows so no DISTINCT is needed
+        '''
+        field = Recipe._meta.get_field(field_name)
+        recipe, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        links = field.remote_field.through.objects.filter(
+            **{f'{target}__in': ids}
+        )
+        
+        if match_all:
+            # relational division: recipes linked to every one of the ids
+            matching = links.values(recipe).annotate(
+                matched=Count(target)
+            ).filter(matched=len(ids)).values(recipe)
+            return queryset.filter(id__in=matching)
+        
+        return queryset.filter(Exists(links.filter(**{recipe: OuterRef('pk')})))
+    
+    def _search(self, queryset, text):
+        query = SearchQuery(text, config='english', search_type='websearch')
+        # ts_rank() is a real, the cursor gives the rank back as a double:
+        # compared as a real to it, ranks equal to the cursor's look lower
+        # and are read again on top of the offset among the ties
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+        )
+    
+    def _filtered_queryset(self):
+        ''' the user's recipes, filtered and ordered by the query params '''
+        params = self.request.query_params
         queryset = self.queryset
+        ordering = ['-id']
+        
+        search = params.get('search', '').strip()
+        if search:
+            queryset = self._search(queryset, search)
+            ordering = ['-search_rank', '-id']
+        
+        for field_name in ('tags', 'ingredients'):
+            ids = params.get(field_name)
+            if ids:
+                queryset = self._filter_related(
+                    queryset,
+                    field_name,
+                    set(self._params_to_ints(ids)),
+                    params.get(f'{field_name}_match') == 'all'
+                )
         
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-            
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
         return queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).order_by(*ordering)
     
-    def get_serializer_class(self):
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(self._filtered_queryset())
+    
+    def get_last_modified(self, request):
+        '''
+            the detail's updated_at, for the list the latest of every
+            updated_at and delete of the user's recipes, whatever the
+            filters: a recipe that left a filtered list moved its own
+        '''
+        recipes = Recipe.objects.filter(user=request.user)
+        if self.action == 'retrieve':
+            try:
+                updated = recipes.filter(pk=self.kwargs['pk']).values_list(
+                    'updated_at', flat=True
+                ).first()
+            except (TypeError, ValueError, DjangoValidationError):
+                return None
+            return updated and updated.timestamp()
+        
+        updated = recipes.aggregate(latest=Max('updated_at'))['latest']
+        return max(updated.timestamp() if updated else 0, last_deleted(request.user.pk))
+    
+    def _sparse_fields(self):
+        '''
+            (fields, expand) of the ?fields= and ?expand= params of list and
+            retrieve, None without either. Any recipe detail field may be
+            picked, relations not expanded are lists of ids
+        '''
+        params = self.request.query_params
+        if self.action not in ('list', 'retrieve') or not (
+            'fields' in params or 'expand' in params
+        ):
+            return None
+        
+        available = serializers.RecipeDetailSerializer.Meta.fields
+        relations = [
+            name for name in available
+            if isinstance(serializers.RecipeDetailSerializer._declared_fields.get(name),
+                          ListSerializer)
+        ]
+        expand = _names(params.get('expand', ''))
+        default = self._default_serializer_class().Meta.fields
+        fields = _names(params.get('fields', '')) or tuple(default)
+        # expanded relations are returned whether or not fields lists them
+        fields += tuple(name for name in expand if name not in fields)
+        
+        errors = {}
+        unknown = [name for name in fields if name not in available]
+        if unknown:
+            errors['fields'] = [f'Unknown fields: {", ".join(unknown)}.']
+        unknown = [name for name in expand if name not in relations]
+        if unknown:
+            errors['expand'] = [f'Only {", ".join(relations)} can be expanded.']
+        if errors:
+            raise ValidationError(errors)
+        # in the order of the detail serializer, one class per selection
+        return tuple(name for name in available if name in fields), tuple(sorted(expand))
+    
+    def list(self, request, *args, **kwargs):
+        fast = settings.RECIPE_FAST_LIST and fast_list_serializer(self.get_serializer_class())
+        if not fast:
+            return super().list(request, *args, **kwargs)
+        
+        queryset = self._filtered_queryset()
+        # the paginator reads the ordering columns off the rows
+        extra = ['search_rank'] if 'search_rank' in queryset.query.annotations else []
+        rows = fast.values(queryset, *extra)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast.serialize(page))
+        return Response(fast.serialize(rows))
+    
+    def _default_serializer_class(self):
         if self.action == 'list':
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
         
         return self.serializer_class
+    
+    def get_serializer_class(self):
+        sparse = self._sparse_fields()
+        if sparse is not None:
+            return serializers.sparse_serializer(serializers.RecipeDetailSerializer, *sparse)
+        return self._default_serializer_class()
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -74,28 +270,73 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def upload_image(self, request, pk=None):
         recipe = self.get_object()
         
-        serializer = self.get_serializer(recipe, data=request.data)
-        
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        # the slot covers receiving the body through storing the image
+        with upload_slot(request):
+            with measure_upload(request) as upload:
+                serializer = self.get_serializer(recipe, data=request.data)
+                upload['accepted'] = serializer.is_valid()
+            
+            if upload['accepted']:
+                # the variants of the previous image are stale until the
+                # worker has resized the new one
+                recipe = serializer.save(image_variants={})
+                schedule_variants(recipe)
+                return Response(serializer.data, status=status.HTTP_200_OK)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @extend_schema(
+        request={NDJSON_MEDIA_TYPE: serializers.RecipeBulkSerializer},
+        responses={(200, NDJSON_MEDIA_TYPE): serializers.RecipeBulkSerializer},
+        description=(
+            'GET streams every recipe as NDJSON, POST imports NDJSON and '
+            'answers with one line per invalid input line plus a summary line'
+        ),
+    )
+    @action(
+        methods=['GET', 'POST'], detail=False, url_path='bulk',
+        parser_classes=[NDJSONParser], renderer_classes=[NDJSONRenderer]
+    )
+    def bulk(self, request):
+        context = self.get_serializer_context()
+        
+        if request.method == 'GET':
+            lines = export_recipes(
+                self.get_queryset(), context, self.bulk_chunk_size
+            )
+            return StreamingHttpResponse(lines, content_type=NDJSON_MEDIA_TYPE)
+        
+        renderer = NDJSONRenderer()
+        lines = (
+            renderer.render(line) for line in import_recipes(
+                request.data, context, self.bulk_chunk_size
+            )
+        )
+        return StreamingHttpResponse(lines, content_type=NDJSON_MEDIA_TYPE)
+    
 @extend_schema_view(
     list=extend_schema(
         parameters=[
             OpenApiParameter(
-                'assigned only',
+                'assigned_only',
                 OpenApiTypes.INT, enum=[0,1],
                 description='filter by itesm assigned to recipe'
-            )
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR, enum=list(RecipeAttrCursorPagination.orderings),
+                description='sort by name (default -name) or by the number of recipes'
+            ),
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin, mixins.UpdateModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
-    authentication_classes = [TokenAuthentication]
+class BaseRecipeAttrViewSet(
+    CachedResponseMixin, mixins.DestroyModelMixin, mixins.UpdateModelMixin,
+    mixins.ListModelMixin, viewsets.GenericViewSet
+):
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]  
+    pagination_class = RecipeAttrCursorPagination
     
 
     def get_queryset(self):
@@ -104,10 +345,11 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin, mixins.UpdateModelMixin, m
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # covered by the partial (user, -name) index of assigned rows
+            queryset = queryset.filter(recipe_count__gt=0)
         return queryset.filter(
             user=self.request.user
-            ).order_by('-name').distinct()  
+            ).order_by('-name')
         
 class TagViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.TagSerializer
@@ -0,0 +1,169 @@
+'''
+    token authentication that keeps resolved tokens in a bounded in-process
+    LRU (and optionally a cache shared by all workers) so repeat requests
+    skip the authtoken_token JOIN core_user query
+'''
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+DEFAULTS = {
+    'MAX_SIZE': 10000,
+    'TTL': 30,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+    # alias of the per user versions the local entries are checked against,
+    # shared by all workers so a revocation reaches every worker's LRU
+    'VERSION_CACHE': 'default',
+}
+
+
+class LRUCache:
+    '''
+        thread safe, size bounded mapping whose entries expire `ttl` seconds
+        after they were stored
+    '''
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TokenCache:
+    '''
+        two level token -> (user, token) cache. Local entries carry the
+        version of their user when they were stored and are only used while
+        it is current: invalidate_user() bumps it in VERSION_CACHE, which
+        drops the entries of every worker's LRU, not just this one's
+    '''
+    prefix = 'auth-token:'
+    version_prefix = 'auth-token-version:'
+
+    def __init__(self):
+        self.configure()
+
+    def configure(self):
+        options = {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+        self.local = LRUCache(options['MAX_SIZE'], options['TTL'])
+        self.shared_alias = options['SHARED_CACHE']
+        self.shared_ttl = options['SHARED_TTL']
+        self.version_alias = options['VERSION_CACHE']
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def user_version(self, user_id):
+        versions = caches[self.version_alias]
+        key = f'{self.version_prefix}{user_id}'
+        version = versions.get(key)
+        if version is None:
+            # seeded from the clock so an evicted version can't come back
+            # at a value older entries were stored under
+            versions.add(key, time.time_ns(), None)
+            version = versions.get(key)
+        return version
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is not None:
+            version, value = entry
+            if version == self.user_version(value[0].pk):
+                return value
+            self.local.delete(key)
+        value = None
+        if self.shared is not None:
+            value = self.shared.get(self.prefix + key)
+            if value is not None:
+                self.local.set(key, (self.user_version(value[0].pk), value))
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, (self.user_version(value[0].pk), value))
+        if self.shared is not None:
+            self.shared.set(self.prefix + key, value, self.shared_ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self.prefix + key)
+
+    def invalidate_user(self, user_id):
+        ''' drops the cached tokens of the user in every worker '''
+        versions = caches[self.version_alias]
+        key = f'{self.version_prefix}{user_id}'
+        try:
+            versions.incr(key)
+        except ValueError:
+            versions.add(key, time.time_ns(), None)
+        for token_key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+            self.delete(token_key)
+
+
+token_cache = TokenCache()
+
+
+def _reconfigure(setting, **kwargs):
+    if setting == 'TOKEN_AUTH_CACHE':
+        token_cache.configure()
+
+
+setting_changed.connect(_reconfigure)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, (user, token))
+        else:
+            user, token = cached
+            if not user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        # every request gets its own copy, views may modify request.user
+        return copy.copy(user), token
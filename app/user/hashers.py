@@ -0,0 +1,54 @@
+'''
+    Django's password hashers with their cost read from PASSWORD_HASHING,
+    so each deployment tunes it to its CPUs. They keep Django's algorithm
+    names: stored hashes still verify, and one of another hasher or cost is
+    rehashed with the first of PASSWORD_HASHERS on the next login, as
+    Django's check_password() does for every must_update() hash
+'''
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+DEFAULTS = {
+    # the OWASP minimum for argon2id, a login costs a few milliseconds of
+    # CPU where PBKDF2 takes over a hundred
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 19 * 1024,
+    'ARGON2_PARALLELISM': 1,
+    'BCRYPT_ROUNDS': 12,
+    'PBKDF2_ITERATIONS': hashers.PBKDF2PasswordHasher.iterations,
+}
+
+
+def hashing_options():
+    return {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING', {})}
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+
+    @property
+    def time_cost(self):
+        return hashing_options()['ARGON2_TIME_COST']
+
+    @property
+    def memory_cost(self):
+        ''' in KiB '''
+        return hashing_options()['ARGON2_MEMORY_COST']
+
+    @property
+    def parallelism(self):
+        return hashing_options()['ARGON2_PARALLELISM']
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+
+    @property
+    def rounds(self):
+        return hashing_options()['BCRYPT_ROUNDS']
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return hashing_options()['PBKDF2_ITERATIONS']
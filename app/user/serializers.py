@@ -2,7 +2,9 @@ from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
-class UserSerializer(serializers.ModelSerializer):
+from core.metrics import TimedSerializerMixin
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     
     class Meta:
         model = get_user_model()
@@ -31,7 +33,7 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
         return user
         
-class AuthTokenSerializer(serializers.Serializer):
+class AuthTokenSerializer(TimedSerializerMixin, serializers.Serializer):
     
     email = serializers.EmailField()
     password = serializers.CharField(
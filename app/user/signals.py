@@ -0,0 +1,33 @@
+'''
+    keeps the token authentication cache in step with the database
+'''
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import token_cache
+
+
+def _invalidate(callback):
+    # drop now and again once the transaction commits, so a request that
+    # read the old row in between can't leave it cached
+    callback()
+    transaction.on_commit(callback)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    def invalidate():
+        token_cache.delete(instance.key)
+        token_cache.invalidate_user(instance.user_id)
+
+    _invalidate(invalidate)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_saved_user(sender, instance, created, **kwargs):
+    # covers password changes, is_active flips and profile updates
+    if not created:
+        _invalidate(lambda: token_cache.invalidate_user(instance.pk))
@@ -0,0 +1,174 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import LRUCache, token_cache
+
+ME_URL = reverse('user:me')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    return get_user_model().objects.create_user(email, password)
+
+
+class LRUCacheTests(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(max_size=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+        self.assertEqual(len(lru), 2)
+
+    @patch('user.authentication.time.monotonic')
+    def test_entries_expire(self, mock_monotonic):
+        lru = LRUCache(max_size=2, ttl=10)
+        mock_monotonic.return_value = 100
+        lru.set('a', 1)
+
+        mock_monotonic.return_value = 109
+        self.assertEqual(lru.get('a'), 1)
+        mock_monotonic.return_value = 110
+        self.assertIsNone(lru.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        token_cache.local.clear()
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _token_queries(self, url=RECIPE_URL):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        queries = [
+            q['sql'] for q in ctx.captured_queries if 'authtoken_token' in q['sql']
+        ]
+        return res, queries
+
+    def test_repeat_request_skips_token_query(self):
+        res, first = self._token_queries()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first), 1)
+
+        res, second = self._token_queries()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(second, [])
+
+    def test_invalid_token_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_invalidated(self):
+        self.client.get(RECIPE_URL)
+        self.token.delete()
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_invalidated(self):
+        self.client.get(RECIPE_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_invalidates(self):
+        self.client.get(ME_URL)
+        self.assertIsNotNone(token_cache.get(self.token.key))
+
+        res = self.client.patch(ME_URL, {'password': 'newpass123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpass123'))
+
+    def stale_in_other_worker(self, change):
+        ''' runs change, then puts back the LRU entry another worker still has '''
+        key = self.token.key
+        self.client.get(RECIPE_URL)
+        entry = token_cache.local.get(key)
+        self.assertIsNotNone(entry)
+        change()
+        token_cache.local.set(key, entry)
+        return self.client.get(RECIPE_URL)
+
+    def test_other_workers_see_deleted_token(self):
+        res = self.stale_in_other_worker(self.token.delete)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_workers_see_deactivated_user(self):
+        def deactivate():
+            self.user.is_active = False
+            self.user.save()
+
+        res = self.stale_in_other_worker(deactivate)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_workers_see_password_change(self):
+        def change_password():
+            self.user.set_password('newpass123')
+            self.user.save()
+
+        self.stale_in_other_worker(change_password)
+
+        # the entry was dropped and the user read again
+        self.assertTrue(token_cache.get(self.token.key)[0].check_password('newpass123'))
+
+    def test_profile_update_not_leaked_into_cache(self):
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'New name'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New name')
+
+    @override_settings(TOKEN_AUTH_CACHE={'SHARED_CACHE': 'default'})
+    def test_shared_cache_used_by_other_workers(self):
+        self.addCleanup(cache.clear)
+        self.client.get(RECIPE_URL)
+        # a fresh worker has an empty local cache
+        token_cache.local.clear()
+
+        res, queries = self._token_queries()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+
+    @override_settings(TOKEN_AUTH_CACHE={'SHARED_CACHE': 'default'})
+    def test_shared_cache_invalidated(self):
+        self.addCleanup(cache.clear)
+        self.client.get(RECIPE_URL)
+        self.token.delete()
+        token_cache.local.clear()
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,139 @@
+'''
+    tests the password hashers, rehashing on login and the login throttles
+'''
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user import serializers
+
+
+TOKEN_URL = reverse('user:token')
+
+BCRYPT_FIRST = [
+    'user.hashers.BCryptSHA256PasswordHasher',
+    'user.hashers.Argon2PasswordHasher',
+    'user.hashers.PBKDF2PasswordHasher',
+]
+
+
+class HasherTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+
+    def login(self, password='testpass123'):
+        return self.client.post(TOKEN_URL, {'email': 'user@example.com', 'password': password})
+
+    def stored_hash(self):
+        self.user.refresh_from_db()
+        return self.user.password
+
+    def test_argon2_by_default(self):
+        self.assertTrue(self.stored_hash().startswith('argon2$argon2id$v=19$m=19456,t=2,p=1$'))
+
+    def test_old_hash_rehashed_on_login(self):
+        self.user.password = make_password('testpass123', hasher='pbkdf2_sha256')
+        self.user.save()
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.stored_hash().startswith('argon2$'))
+
+    def test_not_rehashed_on_failed_login(self):
+        self.user.password = make_password('testpass123', hasher='pbkdf2_sha256')
+        self.user.save()
+
+        res = self.login('wrong password')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(self.stored_hash().startswith('pbkdf2_sha256$'))
+
+    def test_cost_change_rehashed_on_login(self):
+        with override_settings(PASSWORD_HASHING={'ARGON2_TIME_COST': 3,
+                                                 'ARGON2_MEMORY_COST': 8 * 1024}):
+            res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('$m=8192,t=3,p=1$', self.stored_hash())
+
+    @override_settings(PASSWORD_HASHERS=BCRYPT_FIRST, PASSWORD_HASHING={'BCRYPT_ROUNDS': 4})
+    def test_bcrypt_preferred(self):
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.stored_hash().startswith('bcrypt_sha256$$2b$04$'))
+        self.assertTrue(self.user.check_password('testpass123'))
+
+    @override_settings(PASSWORD_HASHING={'ARGON2_MEMORY_COST': 1024, 'BCRYPT_ROUNDS': 4,
+                                         'PBKDF2_ITERATIONS': 1000})
+    def test_benchmark_command(self):
+        out = StringIO()
+
+        call_command('benchmark_password_hashers', repeat=1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('argon2 (preferred)'))
+        self.assertEqual([line.split()[0] for line in lines],
+                         ['argon2', 'bcrypt_sha256', 'pbkdf2_sha256'])
+
+
+class LoginThrottleTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        get_user_model().objects.create_user('user@example.com', 'testpass123')
+
+    def login(self, email='user@example.com', password='testpass123', address='10.0.0.1',
+              **headers):
+        return self.client.post(
+            TOKEN_URL, {'email': email, 'password': password}, REMOTE_ADDR=address, **headers
+        )
+
+    def test_account_throttled_before_hashing(self):
+        for i in range(10):
+            self.assertEqual(self.login(password='wrong', address=f'10.0.1.{i}').status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+        with mock.patch.object(serializers, 'authenticate') as authenticate:
+            res = self.login(email=' USER@example.com', address='10.0.2.1')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+        authenticate.assert_not_called()
+
+    def test_address_throttled(self):
+        for i in range(30):
+            self.login(email=f'stuffed-{i}@example.com')
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login(address='10.0.0.2').status_code, status.HTTP_200_OK)
+
+    def test_forwarded_for_not_trusted(self):
+        for i in range(30):
+            self.login(email=f'stuffed-{i}@example.com', HTTP_X_FORWARDED_FOR=f'192.0.2.{i}')
+
+        res = self.login(HTTP_X_FORWARDED_FOR='192.0.2.200')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_body_without_email(self):
+        res = self.client.post(TOKEN_URL, [1, 2], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
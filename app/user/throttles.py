@@ -0,0 +1,34 @@
+'''
+    rate limits of CreateTokenView. DRF checks throttles before the view
+    runs, so a rejected login never reaches the password hasher
+'''
+import hashlib
+
+from rest_framework.throttling import SimpleRateThrottle
+
+from core.throttling import CountedThrottleMixin
+
+
+class LoginIPRateThrottle(CountedThrottleMixin, SimpleRateThrottle):
+    ''' login attempts per client address, whatever the account '''
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginAccountRateThrottle(CountedThrottleMixin, SimpleRateThrottle):
+    '''
+        login attempts per account, whatever the address, against
+        credential stuffing spread over many addresses
+    '''
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            # refused by the serializer before any hashing
+            return None
+        digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': digest}
@@ -1,9 +1,12 @@
 
-from rest_framework import generics, authentication, permissions
+from django.contrib.auth import get_user_model
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from user.authentication import CachedTokenAuthentication
 from user.serializers import UserSerializer, AuthTokenSerializer
+from user.throttles import LoginAccountRateThrottle, LoginIPRateThrottle
 
 # handles http post request and use serializer for validation and other required data
 class CreateUserView(generics.CreateAPIView):
@@ -13,12 +16,17 @@ class CreateUserView(generics.CreateAPIView):
 class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = [LoginIPRateThrottle, LoginAccountRateThrottle]
     
 class ManageUserView(generics.RetrieveUpdateAPIView):
     
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
\ No newline at end of file
+        # request.user may come from the token cache, updates are written
+        # over a fresh row so stale cached fields are never saved back
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+        return get_user_model().objects.get(pk=self.request.user.pk)
\ No newline at end of file
@@ -0,0 +1,34 @@
+upstream app {
+    server ${APP_HOST}:${APP_PORT};
+    keepalive 32;
+}
+
+server {
+    listen ${LISTEN_PORT};
+
+    proxy_http_version  1.1;
+    proxy_set_header    Connection "";
+    proxy_set_header    Host $host;
+    proxy_set_header    X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header    X-Forwarded-Proto $scheme;
+
+    location /static {
+        alias /vol/static;
+        # the .gz copies collectstatic wrote, API responses are compressed
+        # by the app
+        gzip_static on;
+        gzip_vary   on;
+    }
+
+    location /api/recipe/recipe/bulk/ {
+        proxy_pass              http://app;
+        client_max_body_size    100M;
+        # pass the NDJSON export through as it is produced
+        proxy_buffering         off;
+    }
+
+    location / {
+        proxy_pass              http://app;
+        client_max_body_size    10M;
+    }
+}
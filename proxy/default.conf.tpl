@@ -3,6 +3,18 @@ server {
 
     location /static {
         alias /vol/static;
+        # the .gz copies collectstatic wrote, API responses are compressed
+        # by the app
+        gzip_static on;
+        gzip_vary   on;
+    }
+
+    location /api/recipe/recipe/bulk/ {
+        uwsgi_pass              ${APP_HOST}:${APP_PORT};
+        include                 /etc/nginx/uwsgi_params;
+        client_max_body_size    100M;
+        # pass the NDJSON export through as it is produced
+        uwsgi_buffering         off;
     }
 
     location / {
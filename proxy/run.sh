@@ -2,5 +2,12 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
-nginx -g 'daemon off;'
\ No newline at end of file
+# the asgi server speaks HTTP rather than the uwsgi protocol
+TEMPLATE=/etc/nginx/default.conf.tpl
+if [ "$SERVER_MODE" = "asgi" ]; then
+    TEMPLATE=/etc/nginx/asgi.conf.tpl
+fi
+
+# only substitute our variables, the templates use nginx ones too
+envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT}' < $TEMPLATE > /etc/nginx/conf.d/default.conf
+nginx -g 'daemon off;'
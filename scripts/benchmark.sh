@@ -0,0 +1,30 @@
+#!/bin/sh
+#
+# seeds the deploy stack with users of 10 to 100k recipes (BENCHMARK_RECIPES)
+# and runs every scripts/loadtest.py scenario for each of them. The result
+# goes to benchmark-results/<time>.json and the run fails when it regressed
+# against benchmark-results/baseline.json, if there is one. Copy a result
+# over the baseline to accept it. Extra arguments go to loadtest.py:
+#
+#     scripts/benchmark.sh --concurrency 16 --duration 20 --threshold 0.1
+
+set -e
+
+COMPOSE="docker compose -f docker-compose-deploy.yml"
+OUT=${BENCHMARK_OUT:-benchmark-results}
+RECIPES=${BENCHMARK_RECIPES:-10 1000 100000}
+mkdir -p $OUT
+
+$COMPOSE up -d --build
+# run.sh migrates before it starts the server
+until $COMPOSE exec -T app python manage.py migrate --check > /dev/null 2>&1; do
+    sleep 2
+done
+$COMPOSE exec -T app python manage.py seed_benchmark_data --force --recipes $RECIPES > $OUT/seed.json
+
+RESULT=$OUT/$(date +%Y%m%d-%H%M%S).json
+if [ -f $OUT/baseline.json ]; then
+    set -- --baseline $OUT/baseline.json "$@"
+fi
+python3 scripts/loadtest.py --wait 120 --seed-file $OUT/seed.json --output $RESULT "$@"
+echo "stored $RESULT"
@@ -0,0 +1,29 @@
+#!/bin/sh
+#
+# runs scripts/loadtest.py against the deploy stack served by uwsgi and
+# then by uvicorn, with the same worker count and CPU limit (APP_CPUS), and
+# prints both results side by side. Both reuse their database connections:
+# uwsgi keeps one per worker, uvicorn, whose requests each run on a new
+# thread, checks them out of a pool of DB_POOL_SIZE (default 8) per worker.
+# Extra arguments go to loadtest.py:
+#
+#     scripts/compare_servers.sh --concurrency 64 --duration 60 --bypass-cache
+
+set -e
+
+COMPOSE="docker compose -f docker-compose-deploy.yml"
+OUT=${LOADTEST_OUT:-loadtest-results}
+mkdir -p $OUT
+
+ASGI_POOL_SIZE=${DB_POOL_SIZE:-8}
+
+for mode in uwsgi asgi; do
+    if [ $mode = asgi ]; then
+        export DB_POOL_SIZE=$ASGI_POOL_SIZE
+    fi
+    SERVER_MODE=$mode $COMPOSE up -d --build
+    python3 scripts/loadtest.py --wait 120 --label $mode --output $OUT/$mode.json "$@"
+    $COMPOSE down
+done
+
+python3 scripts/loadtest.py --compare $OUT/uwsgi.json $OUT/asgi.json
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+'''
+load test the recipe API through the proxy using only the standard library
+
+    python3 scripts/loadtest.py --url http://localhost:8000 --output uwsgi.json
+    python3 scripts/loadtest.py --compare uwsgi.json asgi.json
+
+every scenario runs --concurrency client threads with keep-alive
+connections for --duration seconds and reports throughput, latency
+percentiles and errors
+
+with --seed-file, the output of the seed_benchmark_data command, every
+scenario runs once per seeded user, that is per recipe volume, and the SQL
+queries per request are read from the metrics endpoint with the seeded
+admin's token. --baseline fails the run, or the result given to --check,
+when it regressed by more than --threshold against an earlier result
+
+    python3 scripts/loadtest.py --seed-file seed.json --output run.json \
+        --baseline baseline.json
+    python3 scripts/loadtest.py --check run.json --baseline baseline.json
+
+the login scenarios time the token endpoint, --attackers adds threads that
+send wrong logins alongside any scenario, as a credential stuffing burst.
+The legitimate scenario's results show what the attack costs it, the
+attack's statuses how much of it the throttles refused before hashing
+
+    python3 scripts/loadtest.py --scenarios login,list --attackers 64
+'''
+import argparse
+import http.client
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from urllib.parse import urlsplit
+
+
+# create and upload go through the per user write limits of the server,
+# raise RECIPE_THROTTLE_CREATE, RECIPE_THROTTLE_UPLOAD_IMAGE and
+# RECIPE_IMAGE_MAX_CONCURRENT_UPLOADS there to measure the endpoints alone
+SCENARIOS = ('list', 'filter', 'detail', 'create', 'upload')
+
+# a login with the user's credentials, and wrong passwords for the user and
+# for unknown accounts as in credential stuffing. Both go through the login
+# throttles, raise LOGIN_THROTTLE_IP and LOGIN_THROTTLE_ACCOUNT on the
+# server to measure password hashing alone
+LOGIN_SCENARIOS = ('login', 'login-attack')
+
+NDJSON = 'application/x-ndjson'
+
+# refused logins are what the attack scenario is made of
+EXPECTED_STATUSES = {'login-attack': (400, 429)}
+
+# lower is better for all but requests_per_second
+CHECKED = ('requests_per_second', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+# queries per request are averages, cached responses make no queries
+QUERY_SLACK = 0.5
+
+
+def png_bytes(width=256, height=256):
+    ''' a noisy PNG of roughly width * height * 3 bytes '''
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body))
+
+    rows = b''.join(b'\x00' + os.urandom(width * 3) for _ in range(height))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    idat = chunk(b'IDAT', zlib.compress(rows, 1))
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + idat + chunk(b'IEND', b'')
+
+
+def multipart(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        'Content-Type: image/png\r\n\r\n'
+    ).encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Client:
+
+    def __init__(self, url, token=None):
+        parts = urlsplit(url)
+        connection = (
+            http.client.HTTPSConnection if parts.scheme == 'https'
+            else http.client.HTTPConnection
+        )
+        self.connection = connection(parts.netloc, timeout=60)
+        self.token = token
+
+    def request(self, method, path, body=None, content_type='application/json'):
+        headers = {'Content-Type': content_type}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        if isinstance(body, dict):
+            body = json.dumps(body)
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+
+
+def setup(url, recipes):
+    ''' creates a fresh user with `recipes` recipes, returns it as a seeded user '''
+    client = Client(url)
+    email = f'loadtest-{uuid.uuid4().hex[:12]}@example.com'
+    client.request('POST', '/api/user/create/', {
+        'email': email, 'password': 'loadtest-pass', 'name': 'load test'
+    })
+    status, body = client.request('POST', '/api/user/token', {
+        'email': email, 'password': 'loadtest-pass'
+    })
+    if status != 200:
+        sys.exit(f'could not get a token: {status} {body[:200]!r}')
+    client.token = json.loads(body)['token']
+
+    # one bulk import, single creates are rate limited tighter per request
+    lines = ''.join(json.dumps({
+        'title': f'load test recipe {i}', 'time_minutes': 10 + i % 50,
+        'price': '5.00', 'tags': [{'name': f'tag {i % 10}'}],
+        'ingredients': [{'name': f'ingredient {i % 25}'}, {'name': 'Salt'}],
+    }) + '\n' for i in range(recipes))
+    status, body = client.request('POST', '/api/recipe/recipe/bulk/', lines, NDJSON)
+    if status != 200:
+        sys.exit(f'could not create the recipes: {status} {body[:200]!r}')
+    status, body = client.request('GET', '/api/recipe/recipe/bulk/', None, NDJSON)
+    if status != 200:
+        sys.exit(f'could not read the recipes: {status} {body[:200]!r}')
+    ids = [json.loads(line)['id'] for line in body.splitlines() if line]
+
+    user = {
+        'email': email, 'password': 'loadtest-pass', 'token': client.token,
+        'recipes': recipes, 'recipe_ids': ids,
+    }
+    for name in ('tag', 'ingredient'):
+        status, body = client.request('GET', f'/api/recipe/{name}/')
+        if status != 200:
+            sys.exit(f'could not list the {name}s: {status} {body[:200]!r}')
+        listed = json.loads(body)
+        listed = listed['results'] if isinstance(listed, dict) else listed
+        user[f'{name}_ids'] = [item['id'] for item in listed]
+    return user
+
+
+def request_for(scenario, user, n, bypass_cache, image):
+    ''' (method, path, body, content type) of the n-th request of a scenario '''
+    query = f'nocache={n}&' if bypass_cache else ''
+    if scenario == 'list':
+        return 'GET', f'/api/recipe/recipe/?{query}', None, 'application/json'
+    if scenario == 'filter':
+        tags, ingredients = user['tag_ids'], user['ingredient_ids']
+        query += f'tags={tags[n % len(tags)]},{tags[(n + 1) % len(tags)]}'
+        query += f'&ingredients={ingredients[n % len(ingredients)]}'
+        return 'GET', f'/api/recipe/recipe/?{query}', None, 'application/json'
+    if scenario == 'create':
+        return 'POST', '/api/recipe/recipe/', {
+            'title': f'load test recipe {n}', 'time_minutes': 10 + n % 50, 'price': '5.00',
+            'tags': [{'name': f'load test {n % 10}'}],
+            'ingredients': [{'name': f'load test {n % 25}'}, {'name': 'Salt'}],
+        }, 'application/json'
+    if scenario == 'login':
+        return 'POST', '/api/user/token', {
+            'email': user['email'], 'password': user['password'],
+        }, 'application/json'
+    if scenario == 'login-attack':
+        email = user['email'] if n % 2 else f'stuffed-{n}@example.com'
+        return 'POST', '/api/user/token', {
+            'email': email, 'password': f'guess-{n}',
+        }, 'application/json'
+    ids = user['recipe_ids']
+    recipe_id = ids[n % len(ids)]
+    if scenario == 'detail':
+        return 'GET', f'/api/recipe/recipe/{recipe_id}/?{query}', None, 'application/json'
+    body, content_type = multipart('image', 'load.png', image)
+    return 'POST', f'/api/recipe/recipe/{recipe_id}/upload-image/', body, content_type
+
+
+def query_totals(url, admin_token):
+    '''
+        SQL queries and requests recorded by the metrics endpoint, summed
+        over every view but the endpoint itself
+    '''
+    status, body = Client(url, admin_token).request('GET', '/api/health/metrics/')
+    if status != 200:
+        sys.exit(f'could not read the metrics: {status} {body[:200]!r}')
+    totals = {'sum': 0.0, 'count': 0.0}
+    for line in body.decode().splitlines():
+        for kind in totals:
+            prefix = f'app_request_db_queries_{kind}{{'
+            if line.startswith(prefix) and 'view="metrics"' not in line:
+                totals[kind] += float(line.rsplit(' ', 1)[1])
+    return totals
+
+
+class Tally:
+    ''' latencies, errors and response statuses of the threads of a load '''
+
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.latencies, self.errors, self.statuses = [], [], {}
+        self.lock = threading.Lock()
+
+    def add(self, latencies, errors, statuses):
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.errors.extend(errors)
+            for status, count in statuses.items():
+                self.statuses[status] = self.statuses.get(status, 0) + count
+
+
+def run_scenario(url, user, scenario, concurrency, duration, bypass_cache, admin_token=None,
+                 attackers=0):
+    image = png_bytes() if scenario == 'upload' else None
+    lock = threading.Lock()
+    counter = iter(range(sys.maxsize))
+    deadline = time.perf_counter() + duration
+    load, attack = Tally(scenario), Tally('login-attack')
+
+    def worker(tally):
+        # the token endpoint takes credentials, not a token
+        client = Client(url, None if tally.scenario in LOGIN_SCENARIOS else user['token'])
+        expected = EXPECTED_STATUSES.get(tally.scenario, ())
+        mine, failed, statuses = [], [], {}
+        while time.perf_counter() < deadline:
+            with lock:
+                n = next(counter)
+            method, path, body, content_type = request_for(
+                tally.scenario, user, n, bypass_cache, image
+            )
+            started = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body, content_type)
+            except (OSError, http.client.HTTPException) as exc:
+                failed.append(type(exc).__name__)
+                continue
+            mine.append(time.perf_counter() - started)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status >= 400 and status not in expected:
+                failed.append(str(status))
+        tally.add(mine, failed, statuses)
+
+    threads = [threading.Thread(target=worker, args=(load,)) for _ in range(concurrency)]
+    threads += [threading.Thread(target=worker, args=(attack,)) for _ in range(attackers)]
+    before = query_totals(url, admin_token) if admin_token else None
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    queries = None
+    if admin_token:
+        after = query_totals(url, admin_token)
+        requests = after['count'] - before['count']
+        if requests:
+            queries = round((after['sum'] - before['sum']) / requests, 2)
+
+    latencies = sorted(load.latencies)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2)
+
+    result = {
+        'requests': len(latencies),
+        'errors': len(load.errors),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'queries_per_request': queries,
+        'statuses': load.statuses,
+    }
+    if attackers:
+        result['attack'] = {
+            'attackers': attackers,
+            'requests_per_second': round(len(attack.latencies) / elapsed, 1),
+            'statuses': attack.statuses,
+        }
+    return result
+
+
+def wait_until_up(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            Client(url).request('GET', '/api/schema/')
+            return
+        except (OSError, http.client.HTTPException):
+            time.sleep(1)
+    sys.exit(f'{url} did not come up within {timeout}s')
+
+
+def compare(paths):
+    runs = []
+    for path in paths:
+        with open(path) as fp:
+            runs.append(json.load(fp))
+
+    header = f'{"scenario":<16}' + ''.join(f'{run["label"]:>28}' for run in runs)
+    print(header)
+    print('-' * len(header))
+    for scenario in runs[0]['results']:
+        for metric in (*CHECKED, 'errors'):
+            values = ''.join(
+                f'{str(run["results"].get(scenario, {}).get(metric)):>28}' for run in runs
+            )
+            print(f'{scenario:<16}{values}  {metric}')
+
+
+def regressions(result, baseline, threshold):
+    ''' what got worse by more than threshold, as printable lines '''
+    found = []
+    for scenario, base in baseline['results'].items():
+        current = result['results'].get(scenario)
+        if current is None:
+            continue
+        for metric in CHECKED:
+            old, new = base.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            if metric == 'requests_per_second':
+                worse = new < old * (1 - threshold)
+            elif metric == 'queries_per_request':
+                worse = new > old + QUERY_SLACK
+            else:
+                worse = new > old * (1 + threshold)
+            if worse:
+                found.append(f'{scenario} {metric}: {old} -> {new}')
+        if current['errors'] and not base['errors']:
+            found.append(f'{scenario} errors: 0 -> {current["errors"]}')
+    return found
+
+
+def check(result, baseline_path, threshold):
+    with open(baseline_path) as fp:
+        baseline = json.load(fp)
+    found = regressions(result, baseline, threshold)
+    for line in found:
+        print(f'regression {line}', file=sys.stderr)
+    if found:
+        sys.exit(1)
+    print(f'no regression over {threshold:.0%} against {baseline_path}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--label', default=None,
+                        help='name of the run in --compare output, defaults to --output')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f'of {", ".join(SCENARIOS + LOGIN_SCENARIOS)}')
+    parser.add_argument('--attackers', type=int, default=0,
+                        help='extra threads sending wrong logins during every scenario')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--recipes', type=int, default=100,
+                        help='recipes created for the load test user')
+    parser.add_argument('--bypass-cache', action='store_true',
+                        help='vary the query string so reads miss the response cache')
+    parser.add_argument('--wait', type=int, default=0,
+                        help='seconds to wait for the server to come up')
+    parser.add_argument('--seed-file',
+                        help='users from the seed_benchmark_data command instead of --recipes')
+    parser.add_argument('--output')
+    parser.add_argument('--compare', nargs='+', metavar='RESULT')
+    parser.add_argument('--baseline', help='result to check this run or --check against')
+    parser.add_argument('--check', metavar='RESULT', help='check a stored result, no run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative regression that fails --baseline (default 0.2)')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+    if args.check:
+        if not args.baseline:
+            parser.error('--check needs --baseline')
+        with open(args.check) as fp:
+            check(json.load(fp), args.baseline, args.threshold)
+        return
+
+    if args.wait:
+        wait_until_up(args.url, args.wait)
+    if args.seed_file:
+        with open(args.seed_file) as fp:
+            seeded = json.load(fp)
+        users, admin_token = seeded['users'], seeded['admin']['token']
+    else:
+        users, admin_token = [setup(args.url, args.recipes)], None
+
+    results = {}
+    for user in users:
+        for scenario in args.scenarios.split(','):
+            name = f'{scenario}@{user["recipes"]}' if args.seed_file else scenario
+            print(f'{name}: {args.concurrency} clients for {args.duration}s', file=sys.stderr)
+            results[name] = run_scenario(
+                args.url, user, scenario, args.concurrency, args.duration,
+                args.bypass_cache, admin_token, args.attackers
+            )
+            print(json.dumps(results[name]), file=sys.stderr)
+
+    report = {
+        'label': args.label or args.output or args.url,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'bypass_cache': args.bypass_cache,
+        'attackers': args.attackers,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        check(report, args.baseline, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,27 @@ set -e
 
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
+python manage.py generate_schema
 python manage.py migrate
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# metrics of the workers of an earlier run, see METRICS in app/settings.py
+if [ -n "$METRICS_DIR" ]; then
+    rm -rf "$METRICS_DIR"
+    mkdir -p "$METRICS_DIR"
+fi
+
+# same worker count in both modes so they compare at equal CPU
+WORKERS=${SERVER_WORKERS:-4}
+
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # every request runs on a thread of its own, which can't keep a
+    # connection for the next one: reuse needs the pool or PgBouncer
+    if [ "${DB_POOL_SIZE:-0}" -eq 0 ] && [ "$DB_HOST" != "pgbouncer" ]; then
+        echo "SERVER_MODE=asgi needs DB_POOL_SIZE > 0 or DB_HOST=pgbouncer" >&2
+        exit 1
+    fi
+    uvicorn app.asgi:application --host 0.0.0.0 --port 9000 --workers $WORKERS \
+        --proxy-headers --forwarded-allow-ips '*'
+else
+    uwsgi --socket :9000 --workers $WORKERS --master --enable-threads --module app.wsgi
+fi